@@ -1,27 +1,116 @@
 import argparse
 import json
+import os
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
-import fitz  # PyMuPDF
 import requests
+from requests.adapters import HTTPAdapter
 
+from visitassist_rag.rag.pdf_extract import PDF_EXTRACT_WORKERS, iter_extracted_ranges, page_count, page_ranges
 
-def _load_progress(path: Path) -> dict:
-    if not path.exists():
-        return {"completed": {}, "failed": {}, "meta": {}}
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return {"completed": {}, "failed": {}, "meta": {}}
 
+class Progress:
+    """Resume state in a JSON file; every save is atomic (tmp file + os.replace).
+
+    Ingest threads record results concurrently, so all access goes through a lock.
+    An interrupted run therefore never leaves a truncated progress file behind.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = self._load()
+        for k in ("completed", "failed", "meta"):
+            self.data.setdefault(k, {})
+
+    def _load(self) -> dict:
+        if not self.path.exists():
+            return {"completed": {}, "failed": {}, "meta": {}}
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            return {"completed": {}, "failed": {}, "meta": {}}
+
+    def _save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def is_completed(self, key: str) -> bool:
+        with self.lock:
+            return key in self.data["completed"]
+
+    def set_meta(self, meta: dict) -> None:
+        with self.lock:
+            self.data["meta"].update(meta)
+            self._save()
+
+    def completed(self, key: str, doc_id, status: str = "ok") -> None:
+        with self.lock:
+            self.data["completed"][key] = {"doc_id": doc_id, "status": status, "ts": time.time()}
+            # If this range previously failed, clear it.
+            self.data["failed"].pop(key, None)
+            self._save()
 
-def _save_progress(path: Path, data: dict) -> None:
-    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    def failed(self, key: str, error: str) -> None:
+        with self.lock:
+            self.data["failed"][key] = {"error": error, "ts": time.time()}
+            self._save()
 
 
-def _range_key(start_page: int, end_page: int) -> str:
-    return f"{start_page}-{end_page}"
+def _http_ingest(session: requests.Session, ingest_url: str, timeout, args):
+    """Returns ingest(key, payload) -> (doc_id, error) posting to the ingest API with retries."""
+
+    def ingest(key: str, payload: dict):
+        last_err = None
+        for attempt in range(0, int(args.retries) + 1):
+            try:
+                resp = session.post(ingest_url, json=payload, timeout=timeout)
+                if resp.status_code >= 400:
+                    # Server rejected; don't spam retries unless explicitly desired.
+                    try:
+                        detail = resp.json()
+                    except Exception:
+                        detail = resp.text[:500]
+                    print(f"Batch {key}: HTTP {resp.status_code} {detail}")
+                    return None, f"http_{resp.status_code}"
+                data = resp.json()
+                print(f"Batch {key}: Status {resp.status_code} {data}")
+                return data.get("doc_id"), None
+            except requests.exceptions.ReadTimeout as e:
+                last_err = f"read_timeout: {e}"
+            except requests.exceptions.ConnectTimeout as e:
+                last_err = f"connect_timeout: {e}"
+            except requests.exceptions.ConnectionError as e:
+                last_err = f"connection_error: {e}"
+            except Exception as e:
+                last_err = f"error: {e}"
+
+            if attempt < int(args.retries):
+                wait_s = float(args.backoff) * (2 ** attempt)
+                print(f"Batch {key}: attempt {attempt+1} failed ({last_err}). Retrying in {wait_s:.1f}s...")
+                time.sleep(wait_s)
+        return None, last_err
+
+    return ingest
+
+
+def _direct_ingest(kb_id: str):
+    """Returns ingest(key, payload) -> (doc_id, error) calling the pipeline in-process."""
+    from visitassist_rag.rag.ingest import ingest_text_document
+
+    def ingest(key: str, payload: dict):
+        try:
+            resp = ingest_text_document(kb_id=kb_id, **payload)
+        except Exception as e:
+            return None, f"error: {e}"
+        print(f"Batch {key}: ingested doc_id={resp.doc_id}")
+        return resp.doc_id, None
+
+    return ingest
 
 
 def main() -> int:
@@ -35,7 +124,14 @@ def main() -> int:
     parser.add_argument("--timeout", type=int, default=900, help="Read timeout seconds (embedding can be slow).")
     parser.add_argument("--retries", type=int, default=2)
     parser.add_argument("--backoff", type=float, default=5.0, help="Base backoff seconds between retries")
-    parser.add_argument("--sleep-between", type=float, default=0.5, help="Sleep seconds between successful batches")
+    parser.add_argument("--sleep-between", type=float, default=0.0, help="Sleep seconds after each successful batch (per ingest thread)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max ingest requests in flight.")
+    parser.add_argument("--extract-workers", type=int, default=PDF_EXTRACT_WORKERS, help="Processes extracting page text (0 = in-process).")
+    parser.add_argument(
+        "--direct",
+        action="store_true",
+        help="Call the ingest pipeline in-process instead of the HTTP API (needs the service env vars).",
+    )
     parser.add_argument("--language", default="pt")
     parser.add_argument("--source-type", default="pdf")
     parser.add_argument("--title-prefix", default="itaipu.pdf")
@@ -55,26 +151,20 @@ def main() -> int:
     args = parser.parse_args()
 
     pdf_path = str(args.pdf_path)
-    progress_path = Path(args.progress_file)
-    progress = _load_progress(progress_path)
-    progress.setdefault("completed", {})
-    progress.setdefault("failed", {})
-    progress.setdefault("meta", {})
-    progress["meta"].update({
+    progress = Progress(Path(args.progress_file))
+    progress.set_meta({
         "pdf": pdf_path,
         "kb_id": args.kb_id,
-        "url": args.url,
+        "url": "direct" if args.direct else args.url,
         "batch_size": args.batch_size,
         "language": args.language,
         "doc_date": args.doc_date,
         "doc_year": args.doc_year,
         "title_prefix": args.title_prefix,
     })
-    _save_progress(progress_path, progress)
 
     try:
-        doc = fitz.open(pdf_path)
-        num_pages = doc.page_count
+        num_pages = page_count(pdf_path)
         print(f"Opened PDF: {pdf_path} with {num_pages} pages.")
     except Exception as e:
         print(f"Error opening PDF: {e}")
@@ -87,110 +177,83 @@ def main() -> int:
         print(f"Invalid range: start_page={start_page} > end_page={end_page}")
         return 1
 
-    session = requests.Session()
-    ingest_url = f"{args.url.rstrip('/')}/kb/{args.kb_id}/ingest/text"
-
-    # requests timeout can be (connect, read)
-    timeout = (10, int(args.timeout))
+    ranges = []
+    for r in page_ranges(start_page, end_page, args.batch_size):
+        if progress.is_completed(r.key):
+            print(f"Skipping pages {r.key} (already completed)")
+        else:
+            ranges.append(r)
 
-    # Iterate 1-based pages, convert to 0-based indices for PyMuPDF.
-    p = start_page
-    while p <= end_page:
-        batch_start = p
-        batch_end = min(p + int(args.batch_size) - 1, end_page)
-        key = _range_key(batch_start, batch_end)
+    concurrency = max(1, int(args.concurrency))
+    if args.direct:
+        ingest = _direct_ingest(args.kb_id)
+    else:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        ingest_url = f"{args.url.rstrip('/')}/kb/{args.kb_id}/ingest/text"
+        # requests timeout can be (connect, read)
+        ingest = _http_ingest(session, ingest_url, (10, int(args.timeout)), args)
 
-        if key in progress.get("completed", {}):
-            print(f"Skipping pages {key} (already completed)")
-            p = batch_end + 1
-            continue
-
-        print(f"Processing pages {batch_start} to {batch_end}...")
-
-        try:
-            batch_text = "\n\n".join(doc[i - 1].get_text() for i in range(batch_start, batch_end + 1))
-        except Exception as e:
-            print(f"Error reading pages {key}: {e}")
-            progress.setdefault("failed", {})[key] = {"error": f"read_error: {e}"}
-            _save_progress(progress_path, progress)
-            if args.continue_on_error:
-                p = batch_end + 1
-                continue
-            return 1
-
-        if not batch_text.strip():
-            print(f"No text found in pages {key}, skipping.")
-            progress.setdefault("completed", {})[key] = {"doc_id": None, "status": "empty"}
-            _save_progress(progress_path, progress)
-            p = batch_end + 1
-            continue
-
-        payload = {
-            "title": f"{args.title_prefix} (pages {batch_start}-{batch_end})",
-            "text": batch_text,
-            "source_type": args.source_type,
-            "source_uri": pdf_path,
-            "language": args.language,
-            "doc_date": args.doc_date,
-            "doc_year": args.doc_year,
-        }
+    stop = threading.Event()
 
-        last_err = None
-        for attempt in range(0, int(args.retries) + 1):
-            try:
-                resp = session.post(ingest_url, json=payload, timeout=timeout)
-                if resp.status_code >= 400:
-                    # Server rejected; don't spam retries unless explicitly desired.
-                    print(f"Batch {key}: HTTP {resp.status_code}")
-                    try:
-                        print(resp.json())
-                    except Exception:
-                        print(resp.text[:500])
-                    last_err = f"http_{resp.status_code}"
-                    break
+    def run(key: str, payload: dict) -> None:
+        doc_id, err = ingest(key, payload)
+        if err:
+            print(f"Error processing pages {key}: {err}")
+            progress.failed(key, err)
+            if not args.continue_on_error:
+                stop.set()
+            return
+        progress.completed(key, doc_id)
+        if args.sleep_between:
+            time.sleep(float(args.sleep_between))
 
-                data = resp.json()
-                print(f"Batch {key}: Status {resp.status_code}")
-                print(data)
-                progress.setdefault("completed", {})[key] = {
-                    "doc_id": data.get("doc_id"),
-                    "status": "ok",
-                    "ts": time.time(),
-                }
-                # If this range previously failed, clear it.
-                progress.setdefault("failed", {}).pop(key, None)
-                _save_progress(progress_path, progress)
-                last_err = None
+    # Page text is extracted ahead in a process pool while up to `concurrency`
+    # ingest calls run; extraction pauses whenever all ingest slots are busy.
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="pdf-ingest") as pool:
+        for ext in iter_extracted_ranges(pdf_path, ranges, workers=int(args.extract_workers), max_pending=concurrency * 2):
+            if stop.is_set():
                 break
-            except requests.exceptions.ReadTimeout as e:
-                last_err = f"read_timeout: {e}"
-            except requests.exceptions.ConnectTimeout as e:
-                last_err = f"connect_timeout: {e}"
-            except requests.exceptions.ConnectionError as e:
-                last_err = f"connection_error: {e}"
-            except Exception as e:
-                last_err = f"error: {e}"
+            key = ext.range.key
+            if ext.error:
+                print(f"Error reading pages {key}: {ext.error}")
+                progress.failed(key, ext.error)
+                if not args.continue_on_error:
+                    stop.set()
+                    break
+                continue
+            if not ext.text.strip():
+                print(f"No text found in pages {key}, skipping.")
+                progress.completed(key, None, status="empty")
+                continue
 
-            if attempt < int(args.retries):
-                wait = float(args.backoff) * (2 ** attempt)
-                print(f"Batch {key}: attempt {attempt+1} failed ({last_err}). Retrying in {wait:.1f}s...")
-                time.sleep(wait)
-
-        if last_err:
-            print(f"Error processing pages {key}: {last_err}")
-            progress.setdefault("failed", {})[key] = {"error": last_err, "ts": time.time()}
-            _save_progress(progress_path, progress)
-            if not args.continue_on_error:
-                print("Stopping due to error. Re-run with --continue-on-error to keep going.")
-                return 1
+            while len(in_flight) >= concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            print(f"Processing pages {ext.range.start} to {ext.range.end}...")
+            payload = {
+                "title": f"{args.title_prefix} (pages {ext.range.start}-{ext.range.end})",
+                "text": ext.text,
+                "source_type": args.source_type,
+                "source_uri": pdf_path,
+                "language": args.language,
+                "doc_date": args.doc_date,
+                "doc_year": args.doc_year,
+            }
+            in_flight.add(pool.submit(run, key, payload))
+        wait(in_flight)
 
-        time.sleep(float(args.sleep_between))
-        p = batch_end + 1
+    if stop.is_set():
+        print("Stopping due to error. Re-run with --continue-on-error to keep going.")
+        print(f"Progress saved to: {progress.path}")
+        return 1
 
     print("Done.")
-    print(f"Progress saved to: {progress_path}")
+    print(f"Progress saved to: {progress.path}")
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
\ No newline at end of file
+    raise SystemExit(main())
@@ -1,5 +1,139 @@
-from fastapi import APIRouter
+import hmac
 
-router = APIRouter()
+import anyio.to_thread
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from visitassist_rag import memory, profiling, tracing
+from visitassist_rag.metrics import gauge, render_prometheus
+from visitassist_rag.models.schemas import JobAcceptedResponse, ProfileStartRequest
+from visitassist_rag.rag.url_refresh import refresh_status, schedule_refresh
+from visitassist_rag.settings import settings
+
+
+def require_admin(authorization: str | None = Header(default=None)) -> None:
+    """Bearer VISITASSIST_ADMIN_TOKEN; without a token, open only when VISITASSIST_ENV=dev is set."""
+    token = settings.ADMIN_TOKEN
+    if not token:
+        if settings.ENV == "dev":
+            return
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (VISITASSIST_ADMIN_TOKEN is not set)")
+    scheme, _, given = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(given.strip(), token):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
 
 # Optional: add admin endpoints for KB listing, stats, etc.
+
+# Sync routes (queries, ingest) run on anyio's thread pool; when it is exhausted,
+# requests queue before any stage timer starts.
+THREADPOOL_BUSY = gauge("visitassist_threadpool_busy", "Request threads in use (sync routes).")
+THREADPOOL_SIZE = gauge("visitassist_threadpool_size", "Request thread pool size (sync routes).")
+
+
+@router.get("/admin/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of this process's metrics."""
+    # The limiter belongs to the event loop, so read it here rather than at render time.
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/admin/url-refresh")
+def url_refresh_status():
+    """URL refresh registry counts, the last run's result and the scheduler settings."""
+    return refresh_status()
+
+
+@router.post("/admin/url-refresh/run", response_model=JobAcceptedResponse, status_code=202)
+def url_refresh_run():
+    job_id = schedule_refresh()
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="A URL refresh run is already queued or running")
+    return JobAcceptedResponse(job_id=job_id, status_url=f"/v1/jobs/{job_id}")
+
+
+@router.get("/admin/traces")
+def traces(limit: int = 50, slow: bool = False):
+    """Kept traces in this process, newest first (summaries)."""
+    return {"traces": tracing.recent_traces(max(1, min(limit, 500)), slow_only=slow)}
+
+
+@router.get("/admin/traces/{request_id}")
+def trace_by_request_id(request_id: str):
+    """Span tree, candidate ids and prompt hashes of one kept trace."""
+    trace = tracing.get_trace(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (not sampled, evicted, or served by another worker)")
+    return trace
+
+
+@router.get("/admin/profile")
+def profile_status():
+    return profiling.profile_status()
+
+
+@router.post("/admin/profile/start")
+def profile_start(req: ProfileStartRequest):
+    try:
+        return profiling.start_profile(
+            mode=req.mode, duration_s=req.duration_s, interval_ms=req.interval_ms, rate=req.rate, kinds=tuple(req.kinds)
+        )
+    except profiling.ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/admin/profile/stop")
+def profile_stop():
+    status = profiling.stop_profile()
+    if status is None:
+        raise HTTPException(status_code=409, detail="No profiling session is running")
+    return status
+
+
+@router.get("/admin/profile/collapsed", response_class=PlainTextResponse)
+def profile_collapsed():
+    """Collapsed stacks (flamegraph.pl / speedscope input) of the current or last session."""
+    stacks = profiling.collapsed_stacks()
+    if stacks is None:
+        raise HTTPException(status_code=404, detail="No profiling session yet")
+    return PlainTextResponse(stacks, headers={"Content-Disposition": 'attachment; filename="visitassist-profile.folded"'})
+
+
+@router.get("/admin/memory")
+def memory_report():
+    """RSS, allocation tracing state and the sizes of in-process caches."""
+    return memory.memory_report()
+
+
+@router.post("/admin/memory/tracing/start")
+def memory_tracing_start(frames: int = memory.TRACEMALLOC_FRAMES):
+    return memory.start_tracing(max(1, min(frames, 50)))
+
+
+@router.post("/admin/memory/tracing/stop")
+def memory_tracing_stop():
+    return memory.stop_tracing()
+
+
+@router.post("/admin/memory/snapshots")
+def memory_snapshot():
+    try:
+        return memory.take_snapshot()
+    except memory.MemorySnapshotError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/admin/memory/diff")
+def memory_diff(base: str, current: str | None = None, top: int = 25, group_by: str = "lineno"):
+    """Allocation sites that grew most from snapshot `base` to `current` (default: a new snapshot)."""
+    try:
+        return memory.diff_snapshots(base, current, top=max(1, min(top, 200)), group_by=group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except memory.MemorySnapshotError as e:
+        raise HTTPException(status_code=404 if "Unknown" in str(e) else 409, detail=str(e))
@@ -1,14 +1,32 @@
-from fastapi import APIRouter, HTTPException
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from visitassist_rag.models.schemas import (
+    BulkIngestRequest,
+    BulkIngestResponse,
+    CrawlRequest,
     IngestResponse,
     IngestTextRequest,
     IngestUrlConfirmRequest,
     IngestUrlPasteRequest,
     IngestUrlPreviewRequest,
     IngestUrlPreviewResponse,
+    JobAcceptedResponse,
+)
+from visitassist_rag.rag.crawler import CRAWL_MAX_PAGES_LIMIT, scope_for
+from visitassist_rag.rag.ingest import ingest_text_document, ingest_text_documents
+from visitassist_rag.rag.jobs import submit
+from visitassist_rag.rag.pdf_ingest import PDF_MAX_UPLOAD_BYTES, PDF_UPLOAD_DIR
+from visitassist_rag.rag.url_ingest import UrlIngestError, build_url_preview_cached, resolve_confirmed_preview
+from visitassist_rag.rag.url_refresh import (
+    record_url_sources,
+    registered_url_sources,
+    retire_replaced_document,
+    unchanged_source_row,
+    url_source_row,
 )
-from visitassist_rag.rag.ingest import ingest_text_document
-from visitassist_rag.rag.url_ingest import UrlIngestError, build_url_preview
 
 
 def _normalize_source_url(url: str) -> str:
@@ -29,8 +47,111 @@ def _normalize_source_url(url: str) -> str:
 router = APIRouter()
 
 @router.post("/kb/{kb_id}/ingest/text", response_model=IngestResponse)
-def ingest_text(kb_id: str, req: IngestTextRequest):
-    return ingest_text_document(kb_id=kb_id, **req.dict())
+def ingest_text(kb_id: str, req: IngestTextRequest, memory: bool = False):
+    return ingest_text_document(kb_id=kb_id, **req.dict(), measure_memory=memory)
+
+
+INGEST_BULK_MAX_DOCUMENTS = 5000
+
+
+@router.post("/kb/{kb_id}/ingest/bulk", response_model=BulkIngestResponse)
+def ingest_bulk(kb_id: str, req: BulkIngestRequest, memory: bool = False):
+    if not req.documents:
+        raise HTTPException(status_code=400, detail="Missing documents")
+    if len(req.documents) > INGEST_BULK_MAX_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"Too many documents (max {INGEST_BULK_MAX_DOCUMENTS})")
+    return ingest_text_documents(kb_id, [d.dict() for d in req.documents], measure_memory=memory)
+
+
+def _accepted(job_id: str) -> JobAcceptedResponse:
+    return JobAcceptedResponse(job_id=job_id, status_url=f"/v1/jobs/{job_id}")
+
+
+@router.post("/kb/{kb_id}/ingest/text/async", response_model=JobAcceptedResponse, status_code=202)
+def ingest_text_async(kb_id: str, req: IngestTextRequest):
+    return _accepted(submit("ingest_text", kb_id, req.dict()))
+
+
+@router.post("/kb/{kb_id}/ingest/bulk/async", response_model=JobAcceptedResponse, status_code=202)
+def ingest_bulk_async(kb_id: str, req: BulkIngestRequest):
+    if not req.documents:
+        raise HTTPException(status_code=400, detail="Missing documents")
+    if len(req.documents) > INGEST_BULK_MAX_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"Too many documents (max {INGEST_BULK_MAX_DOCUMENTS})")
+    return _accepted(submit("ingest_bulk", kb_id, {"documents": [d.dict() for d in req.documents]}))
+
+
+def _spool_upload(upload: UploadFile, max_bytes: int) -> str:
+    """Copy an upload to PDF_UPLOAD_DIR in 1 MB blocks; returns the file path."""
+    os.makedirs(PDF_UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=PDF_UPLOAD_DIR)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            head = upload.file.read(5)
+            if head != b"%PDF-":
+                raise HTTPException(status_code=400, detail="File is not a PDF")
+            out.write(head)
+            written = len(head)
+            while True:
+                block = upload.file.read(1024 * 1024)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"PDF is larger than {max_bytes} bytes")
+                out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+@router.post("/kb/{kb_id}/ingest/pdf", response_model=JobAcceptedResponse, status_code=202)
+def ingest_pdf(
+    kb_id: str,
+    file: UploadFile = File(...),
+    title: Optional[str] = Form(None),
+    language: str = Form("pt"),
+    doc_date: Optional[str] = Form(None),
+    doc_year: Optional[int] = Form(None),
+    pages_per_doc: int = Form(10),
+    incremental: bool = Form(True),
+    memory: bool = False,
+):
+    # Sync route: the copy runs in the threadpool, and the request body was already
+    # spooled to a temp file by the multipart parser, so nothing is held in memory.
+    if not 1 <= pages_per_doc <= 100:
+        raise HTTPException(status_code=400, detail="pages_per_doc must be between 1 and 100")
+    path = _spool_upload(file, PDF_MAX_UPLOAD_BYTES)
+    filename = os.path.basename(file.filename or "") or "upload.pdf"
+    payload = {
+        "path": path,
+        "title": (title or "").strip() or filename,
+        "source_uri": filename,
+        "language": language,
+        "doc_date": doc_date,
+        "doc_year": doc_year,
+        "pages_per_doc": pages_per_doc,
+        "incremental": incremental,
+        "measure_memory": memory,
+    }
+    return _accepted(submit("ingest_pdf", kb_id, payload))
+
+
+@router.post("/kb/{kb_id}/ingest/crawl", response_model=JobAcceptedResponse, status_code=202)
+def ingest_crawl(kb_id: str, req: CrawlRequest):
+    seed = (req.seed_url or "").strip()
+    if not seed.lower().startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="seed_url must start with http:// or https://")
+    if not 1 <= req.max_pages <= CRAWL_MAX_PAGES_LIMIT:
+        raise HTTPException(status_code=400, detail=f"max_pages must be between 1 and {CRAWL_MAX_PAGES_LIMIT}")
+    if not 0 <= req.max_depth <= 10:
+        raise HTTPException(status_code=400, detail="max_depth must be between 0 and 10")
+    scope = scope_for(seed, allowed_domains=req.allowed_domains, include_subdomains=req.include_subdomains, path_prefix=req.path_prefix)
+    if not scope.allows(seed):
+        raise HTTPException(status_code=400, detail="seed_url is outside allowed_domains/path_prefix")
+    return _accepted(submit("crawl", kb_id, {**req.dict(), "seed_url": seed}))
 
 
 @router.post("/kb/{kb_id}/ingest/url/preview", response_model=IngestUrlPreviewResponse)
@@ -38,7 +159,7 @@ def ingest_url_preview(kb_id: str, req: IngestUrlPreviewRequest):
     # kb_id is kept in the route for symmetry/audit, but preview does not ingest.
     _ = kb_id
     try:
-        preview = build_url_preview(req.url)
+        preview, token = build_url_preview_cached(req.url)
     except UrlIngestError as e:
         raise HTTPException(status_code=400, detail=str(e))
     max_preview_chars = 5000
@@ -54,32 +175,55 @@ def ingest_url_preview(kb_id: str, req: IngestUrlPreviewRequest):
         link_count=preview.link_count,
         link_density=preview.link_density,
         warnings=preview.warnings,
+        preview_token=token,
+        debug={"fetch": preview.fetch_stats} if preview.fetch_stats else None,
     )
 
 
 @router.post("/kb/{kb_id}/ingest/url/confirm", response_model=IngestResponse)
-def ingest_url_confirm(kb_id: str, req: IngestUrlConfirmRequest):
-    # Re-fetch + re-extract on the server for a deterministic, auditable ingest.
+def ingest_url_confirm(kb_id: str, req: IngestUrlConfirmRequest, memory: bool = False):
+    # Ingest the server-side extraction the client previewed (same content_hash);
+    # without a valid token, re-fetch + re-extract for a deterministic, auditable ingest.
     try:
-        preview = build_url_preview(req.url)
+        preview, _source = resolve_confirmed_preview(
+            req.url,
+            preview_token=req.preview_token,
+            content_hash=req.content_hash,
+            revalidate=req.revalidate,
+        )
     except UrlIngestError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
     title = (req.title or "").strip() or preview.title
-    return ingest_text_document(
+    language = req.language or "pt"
+    row = url_source_row(kb_id, None, preview, title=title, language=language, doc_date=req.doc_date, doc_year=req.doc_year)
+    # A registered URL keeps one live document: unchanged text is not ingested
+    # again, changed text replaces the old document.
+    existing = registered_url_sources(kb_id, [preview.final_url]).get(preview.final_url)
+    kept = unchanged_source_row(existing, row)
+    if kept is not None:
+        record_url_sources([kept])
+        return IngestResponse(success=True, doc_id=kept["doc_id"], message="Page unchanged since the last ingest; kept the existing document")
+
+    resp = ingest_text_document(
         kb_id=kb_id,
         title=title,
         text=preview.text,
         source_type="url",
         source_uri=preview.final_url,
-        language=req.language or "pt",
+        language=language,
         doc_date=req.doc_date,
         doc_year=req.doc_year,
+        measure_memory=memory,
     )
+    if resp.success and resp.doc_id:
+        record_url_sources([{**row, "doc_id": resp.doc_id}])
+        retire_replaced_document(kb_id, preview.final_url, (existing or {}).get("doc_id"))
+    return resp
 
 
 @router.post("/kb/{kb_id}/ingest/url/paste", response_model=IngestResponse)
-def ingest_url_paste(kb_id: str, req: IngestUrlPasteRequest):
+def ingest_url_paste(kb_id: str, req: IngestUrlPasteRequest, memory: bool = False):
     url = (req.url or "").strip()
     if not url:
         raise HTTPException(status_code=400, detail="Missing url")
@@ -102,4 +246,5 @@ def ingest_url_paste(kb_id: str, req: IngestUrlPasteRequest):
         language=req.language or "pt",
         doc_date=req.doc_date,
         doc_year=req.doc_year,
+        measure_memory=memory,
     )
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException
+
+from visitassist_rag.models.schemas import JobStatusResponse
+from visitassist_rag.stores.job_store import get_job
+
+router = APIRouter()
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("payload", None)
+    job.pop("lease_until", None)
+    return JobStatusResponse(**job)
@@ -1,27 +1,35 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+import json
 
-from visitassist_rag.models.schemas import AnswerOnlyResponse, QueryRequest, QueryResponse
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from visitassist_rag.models.schemas import AnswerOnlyResponse, BatchQueryRequest, QueryRequest, QueryResponse
+from visitassist_rag.rag.batch_query import BATCH_QUERY_MAX_ITEMS, iter_batch_answers
 from visitassist_rag.rag.engine import rag_query
+from visitassist_rag.rag.query_load import track_query
 
 router = APIRouter()
 
-try:
-    # openai>=1.x
-    from openai import AuthenticationError  # type: ignore
-except Exception:  # pragma: no cover
-    AuthenticationError = None  # type: ignore
+def _is_openai_auth_error(e: Exception) -> bool:
+    # Imported lazily: the OpenAI SDK is heavy and only needed once a call failed.
+    try:
+        # openai>=1.x
+        from openai import AuthenticationError  # type: ignore
+    except Exception:  # pragma: no cover
+        return False
+    return isinstance(e, AuthenticationError)
 
 
 def _rag_query_with_nice_errors(*, kb_id: str, req: QueryRequest, answer_style: str | None = None):
     try:
         extra = {} if answer_style is None else {"answer_style": answer_style}
-        return rag_query(kb_id=kb_id, **req.dict(), **extra)
+        with track_query():
+            return rag_query(kb_id=kb_id, **req.dict(), **extra)
     except RuntimeError as e:
         # Usually missing env vars like OPENAI_API_KEY.
         raise RuntimeError(str(e))
     except Exception as e:
-        if AuthenticationError is not None and isinstance(e, AuthenticationError):
+        if _is_openai_auth_error(e):
             raise RuntimeError(
                 "OpenAI authentication failed. Check that OPENAI_API_KEY is set to a valid key in the server environment."
             )
@@ -48,3 +56,23 @@ def query_kb_answer_only(kb_id: str, req: QueryRequest):
         return AnswerOnlyResponse(answer=resp.answer)
     except RuntimeError as e:
         return JSONResponse(status_code=500, content={"answer": str(e)})
+
+
+@router.post("/kb/{kb_id}/query/batch")
+def query_kb_batch(kb_id: str, req: BatchQueryRequest):
+    """Answer many questions for one kb; streams NDJSON lines in completion order.
+
+    Each line is `{"index", "ok", "result" | "error", "elapsed_ms"}`; `index` is the
+    item's position in the request.
+    """
+    if not req.items:
+        raise HTTPException(status_code=400, detail="Missing items")
+    if len(req.items) > BATCH_QUERY_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {BATCH_QUERY_MAX_ITEMS})")
+
+    def lines():
+        with track_query():
+            for row in iter_batch_answers(kb_id, req.items, answer_style=req.answer_style, max_concurrency=req.max_concurrency):
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -3,8 +3,27 @@ from fastapi.responses import HTMLResponse
 from visitassist_rag.api.routes_ingest import router as ingest_router
 from visitassist_rag.api.routes_query import router as query_router
 from visitassist_rag.api.routes_admin import router as admin_router
+from visitassist_rag.api.routes_jobs import router as jobs_router
+from visitassist_rag.rag.jobs import start_workers, stop_workers
+from visitassist_rag.rag.query_load import enable_shared_activity
+from visitassist_rag.rag.url_refresh import start_scheduler, stop_scheduler
+from visitassist_rag.tracing import RequestIdMiddleware
 
 app = FastAPI(title="VisitAssist RAG Engine")
+app.add_middleware(RequestIdMiddleware)
+
+
+@app.on_event("startup")
+def _start_job_workers():
+	enable_shared_activity()
+	start_workers()
+	start_scheduler()
+
+
+@app.on_event("shutdown")
+def _stop_job_workers():
+	stop_scheduler()
+	stop_workers()
 
 
 @app.get("/health")
@@ -108,3 +127,4 @@ def test_ui():
 app.include_router(ingest_router, prefix="/v1")
 app.include_router(query_router, prefix="/v1")
 app.include_router(admin_router, prefix="/v1")
+app.include_router(jobs_router, prefix="/v1")
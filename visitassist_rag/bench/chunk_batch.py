@@ -0,0 +1,111 @@
+"""Allocation benchmark: per-chunk dynamic classes vs the columnar ChunkBatch.
+
+Run from the repo root:
+
+    python -m visitassist_rag.bench.chunk_batch --pages 1000
+
+Chunk spans are cut once up front (tokenization is not what is measured); each
+variant then materializes the same chunks, and tracemalloc reports the memory
+retained by the result and the peak during construction (timed separately).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from visitassist_rag.rag.chunk_batch import ChunkBatch
+from visitassist_rag.rag.chunking import build_sections, cut_section, normalize_ws
+
+
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def synthetic_pdf_text(pages: int) -> str:
+    """PDF-like text: FAQ prose pages interleaved with table-ish numeric pages."""
+    items = []
+    for name in ("FAQ01.json", "FAQ02.json"):
+        path = _REPO_ROOT / name
+        if path.exists():
+            items += json.loads(path.read_text(encoding="utf-8"))
+    if not items:
+        items = [{"question": "Qual é a altura da barragem?", "answer": "A barragem tem 196 metros de altura."}]
+    out = []
+    for p in range(pages):
+        if p % 5 == 4:
+            rows = "\n".join(f"{10 + (p + r) % 90},{r:02d}\nInstrumento {r}\n{(p * r) % 997}" for r in range(12))
+            out.append(f"Tabela {p}\n{rows}")
+        else:
+            chunk = items[(p * 3) % len(items):(p * 3) % len(items) + 3] or items[:3]
+            out.append("\n\n".join(f"{it['question']} {it['answer']}" for it in chunk))
+    return "\n\n".join(out)
+
+
+def _legacy(sections, cuts_by_section):
+    doc_id = str(uuid.uuid4())
+    out = []
+    for (spath, stext), cuts in zip(sections, cuts_by_section):
+        section_id = str(uuid.uuid4())
+        typed = [("summary", [cuts.summary] if cuts.summary else []), ("section", cuts.section), ("fine", cuts.fine)]
+        for chunk_type, spans in typed:
+            for j, sp in enumerate(spans):
+                out.append(type("Chunk", (), {
+                    "doc_id": doc_id,
+                    "section_id": section_id,
+                    "chunk_type": chunk_type,
+                    "chunk_index": j,
+                    "chunk_text": stext[sp.start:sp.end],
+                    "section_path": spath,
+                    "start_char": sp.start,
+                    "end_char": sp.end,
+                }))
+    return out
+
+
+def _columnar(sections, cuts_by_section):
+    batch = ChunkBatch()
+    doc = batch.add_doc(str(uuid.uuid4()), {})
+    for (spath, stext), cuts in zip(sections, cuts_by_section):
+        batch.add_cuts(batch.add_section(doc, str(uuid.uuid4()), spath, stext), cuts)
+    return batch
+
+
+def _measure(fn, *args) -> dict:
+    # Time an untraced run (tracemalloc distorts timings), then trace a second run.
+    t0 = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    result = fn(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"chunks": len(result), "ms": round(elapsed * 1000.0, 2), "retained_kb": round(current / 1024.0, 1), "peak_kb": round(peak / 1024.0, 1)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare chunk container allocations on a large synthetic PDF batch.")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--pages-per-doc", type=int, default=10, help="Mirrors pdf_ingestor --batch-size.")
+    args = parser.parse_args()
+
+    text = synthetic_pdf_text(args.pages)
+    # Split like pdf_ingestor does (one document per page range), then cut once.
+    pages = text.split("\n\n")
+    sections = []
+    for i in range(0, len(pages), args.pages_per_doc):
+        sections += build_sections(normalize_ws("\n\n".join(pages[i:i + args.pages_per_doc])))
+    cuts = [cut_section(st) for _p, st in sections]
+
+    legacy = _measure(_legacy, sections, cuts)
+    columnar = _measure(_columnar, sections, cuts)
+    print(json.dumps({"pages": args.pages, "sections": len(sections), "legacy_type_per_chunk": legacy, "chunk_batch": columnar}, indent=2))
+    if columnar["retained_kb"]:
+        print(f"retained memory reduction: x{legacy['retained_kb'] / columnar['retained_kb']:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,373 @@
+"""In-process stand-ins for OpenAI, Pinecone and Supabase (load tests, no network).
+
+Each service call sleeps for a latency drawn from a lognormal distribution (given
+by its median and p95) and fails with probability `failure_rate`, raising
+FakeServiceError. The fakes only implement the calls this package makes:
+
+- OpenAI: `embeddings.create` (base64 float32, deterministic hashed bag-of-words
+  vectors, so questions still retrieve the chunks that share their words) and
+  `chat.completions.create` (rerank: the candidate ids in listed order;
+  grounding: the first sentence of source [S1] with a citation footer).
+- Pinecone index: `upsert`, `query` (cosine over the namespace, equality and
+  `$in` metadata filters) and `delete`.
+- Supabase: `table(...)` with insert/upsert/select/delete and the eq/in_/lte/
+  order/limit filters, `count="exact"` included.
+
+`install_fakes()` registers them through `clients.set_client`.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import numpy as np
+
+from visitassist_rag import clients
+
+EMBED_DIM = 3072
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_RERANK_ID_RE = re.compile(r"^\d+\) id=(\S+) \|", re.MULTILINE)
+_SOURCE_RE = re.compile(r"^\[S(\d+)\] [^\n]*\n(.*?)(?=^\[S\d+\] |\n\nQuestion:|\Z)", re.MULTILINE | re.DOTALL)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s")
+
+# Primary keys of the tables written by supabase_store (upsert replaces on these).
+TABLE_KEYS = {
+    "rag_docs": ("doc_id",),
+    "rag_sections": ("section_id",),
+    "rag_chunks": ("chunk_id",),
+    "rag_pdf_ranges": ("kb_id", "source_uri", "range_key"),
+    "rag_url_sources": ("kb_id", "source_uri"),
+}
+
+
+class FakeServiceError(RuntimeError):
+    pass
+
+
+@dataclass
+class ServiceProfile:
+    """Latency (lognormal through median_ms and p95_ms) and failure rate of one service."""
+
+    median_ms: float
+    p95_ms: float
+    failure_rate: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "ServiceProfile":
+        """"median_ms:p95_ms[:failure_rate]", e.g. "150:400:0.01"."""
+        parts = [float(p) for p in spec.split(":")]
+        if len(parts) not in (2, 3) or parts[0] < 0 or parts[1] < parts[0]:
+            raise ValueError(f"Expected median_ms:p95_ms[:failure_rate] with p95 >= median, got {spec!r}")
+        return cls(parts[0], parts[1], parts[2] if len(parts) == 3 else 0.0)
+
+    def sample_s(self, rng: random.Random, scale: float = 1.0) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        sigma = math.log(self.p95_ms / self.median_ms) / 1.645 if self.p95_ms > self.median_ms else 0.0
+        return rng.lognormvariate(math.log(self.median_ms), sigma) * scale / 1000.0
+
+
+# Rough production figures (ms); override per run.
+DEFAULT_PROFILES = {
+    "embeddings": ServiceProfile(120, 400),
+    "rerank": ServiceProfile(700, 1800),
+    "grounding": ServiceProfile(1800, 4500),
+    "pinecone": ServiceProfile(40, 120),
+    "supabase": ServiceProfile(30, 90),
+}
+
+
+class FakeBackend:
+    """Shared latency/failure model and per-service call counters."""
+
+    def __init__(self, profiles: Optional[dict[str, ServiceProfile]] = None, *, time_scale: float = 1.0, seed: int = 0):
+        self.profiles = {**DEFAULT_PROFILES, **(profiles or {})}
+        self.time_scale = time_scale
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: dict[str, int] = {}
+        self.failures: dict[str, int] = {}
+
+    def call(self, service: str) -> None:
+        profile = self.profiles[service]
+        with self._lock:
+            delay = profile.sample_s(self._rng, self.time_scale)
+            fail = self._rng.random() < profile.failure_rate
+            self.calls[service] = self.calls.get(service, 0) + 1
+            if fail:
+                self.failures[service] = self.failures.get(service, 0) + 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeServiceError(f"injected {service} failure")
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {s: {"calls": n, "failures": self.failures.get(s, 0)} for s, n in sorted(self.calls.items())}
+
+
+def hashed_embedding(text: str, dim: int = EMBED_DIM) -> np.ndarray:
+    """Unit float32 vector: each lowercased word adds +-1 to a hashed dimension."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in _WORD_RE.findall(text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        vec[zlib.crc32(text.encode("utf-8")) % dim] = 1.0
+        return vec
+    return vec / norm
+
+
+# --- OpenAI ---------------------------------------------------------------
+
+
+class _FakeEmbeddings:
+    def __init__(self, backend: FakeBackend, dim: int):
+        self._backend = backend
+        self._dim = dim
+
+    def create(self, *, model: str, input, encoding_format: str = "float", **_: Any):
+        self._backend.call("embeddings")
+        texts = [input] if isinstance(input, str) else list(input)
+        data = []
+        for i, text in enumerate(texts):
+            vec = hashed_embedding(text, self._dim)
+            emb = base64.b64encode(vec.astype("<f4").tobytes()).decode("ascii") if encoding_format == "base64" else vec.tolist()
+            data.append(SimpleNamespace(index=i, embedding=emb, object="embedding"))
+        tokens = sum(len(t) // 4 for t in texts)
+        return SimpleNamespace(data=data, model=model, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+class _FakeCompletions:
+    def __init__(self, backend: FakeBackend):
+        self._backend = backend
+
+    def create(self, *, model: str, messages: list[dict], temperature: float = 0.0, **_: Any):
+        system = messages[0]["content"] if messages else ""
+        user = messages[-1]["content"] if messages else ""
+        if "reranking retrieval candidates" in system:
+            self._backend.call("rerank")
+            content = json.dumps(_RERANK_ID_RE.findall(user))
+        else:
+            self._backend.call("grounding")
+            content = _grounded_text(user)
+        usage = SimpleNamespace(
+            prompt_tokens=sum(len(m.get("content") or "") for m in messages) // 4,
+            completion_tokens=len(content) // 4,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+        )
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")], model=model, usage=usage)
+
+
+def _grounded_text(user: str) -> str:
+    for m in _SOURCE_RE.finditer(user):
+        body = " ".join(m.group(2).split())
+        if body:
+            sentence = _SENTENCE_RE.split(body, 1)[0]
+            return f"{sentence}\n\nFonte: [S{m.group(1)}]"
+    return "Não encontrei essa informação nas fontes disponíveis."
+
+
+class FakeOpenAI:
+    def __init__(self, backend: FakeBackend, *, dim: int = EMBED_DIM):
+        self.embeddings = _FakeEmbeddings(backend, dim)
+        self.chat = SimpleNamespace(completions=_FakeCompletions(backend))
+
+
+# --- Pinecone -------------------------------------------------------------
+
+
+def _matches_filter(md: dict, flt: Optional[dict]) -> bool:
+    for key, cond in (flt or {}).items():
+        value = md.get(key)
+        if isinstance(cond, dict):
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+            if "$eq" in cond and value != cond["$eq"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class FakePineconeIndex:
+    def __init__(self, backend: FakeBackend):
+        self._backend = backend
+        self._lock = threading.Lock()
+        # namespace -> id -> (vector, metadata)
+        self._ns: dict[str, dict[str, tuple[np.ndarray, dict]]] = {}
+
+    def upsert(self, vectors, namespace: str = "", **_: Any):
+        self._backend.call("pinecone")
+        with self._lock:
+            space = self._ns.setdefault(namespace, {})
+            for vid, values, md in vectors:
+                space[vid] = (np.asarray(values, dtype=np.float32), dict(md or {}))
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector, top_k: int = 10, include_metadata: bool = False, filter=None, namespace: str = "", **_: Any):
+        self._backend.call("pinecone")
+        with self._lock:
+            items = [(vid, vec, md) for vid, (vec, md) in self._ns.get(namespace, {}).items() if _matches_filter(md, filter)]
+        if not items:
+            return {"matches": [], "namespace": namespace}
+        matrix = np.stack([vec for _, vec, _ in items])
+        q = np.asarray(vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (float(np.linalg.norm(q)) or 1.0)
+        scores = (matrix @ q) / np.where(norms == 0, 1.0, norms)
+        order = np.argsort(-scores)[:top_k]
+        matches = [
+            {"id": items[i][0], "score": float(scores[i]), "metadata": dict(items[i][2]) if include_metadata else None}
+            for i in order
+        ]
+        return {"matches": matches, "namespace": namespace}
+
+    def delete(self, ids=None, namespace: str = "", **_: Any):
+        self._backend.call("pinecone")
+        with self._lock:
+            space = self._ns.get(namespace, {})
+            for vid in ids or []:
+                space.pop(vid, None)
+        return {}
+
+    def vector_count(self, namespace: Optional[str] = None) -> int:
+        with self._lock:
+            if namespace is not None:
+                return len(self._ns.get(namespace, {}))
+            return sum(len(s) for s in self._ns.values())
+
+
+# --- Supabase -------------------------------------------------------------
+
+
+class _FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self._db = db
+        self._table = table
+        self._op = "select"
+        self._payload: list[dict] = []
+        self._columns: Optional[list[str]] = None
+        self._count: Optional[str] = None
+        self._filters: list = []
+        self._order: Optional[tuple[str, bool]] = None
+        self._limit: Optional[int] = None
+
+    def insert(self, rows):
+        self._op, self._payload = "insert", [rows] if isinstance(rows, dict) else list(rows)
+        return self
+
+    def upsert(self, rows, **_: Any):
+        self._op, self._payload = "upsert", [rows] if isinstance(rows, dict) else list(rows)
+        return self
+
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self._op = "select"
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        self._count = count
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self._filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def in_(self, column: str, values):
+        allowed = set(values)
+        self._filters.append(lambda r: r.get(column) in allowed)
+        return self
+
+    def lte(self, column: str, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) <= value)
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def execute(self):
+        self._db.backend.call("supabase")
+        return self._db.run(self)
+
+
+class FakeSupabase:
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.tables: dict[str, list[dict]] = {}
+
+    def table(self, name: str) -> _FakeQuery:
+        return _FakeQuery(self, name)
+
+    def run(self, q: _FakeQuery):
+        with self._lock:
+            rows = self.tables.setdefault(q._table, [])
+            if q._op == "insert":
+                rows.extend(dict(r) for r in q._payload)
+                return SimpleNamespace(data=q._payload, count=None)
+            if q._op == "upsert":
+                key = TABLE_KEYS.get(q._table)
+                if key:
+                    new = {tuple(r.get(k) for k in key): dict(r) for r in q._payload}
+                    rows[:] = [r for r in rows if tuple(r.get(k) for k in key) not in new]
+                    rows.extend(new.values())
+                else:
+                    rows.extend(dict(r) for r in q._payload)
+                return SimpleNamespace(data=q._payload, count=None)
+            hit = [r for r in rows if all(f(r) for f in q._filters)]
+            if q._op == "delete":
+                rows[:] = [r for r in rows if not all(f(r) for f in q._filters)]
+                return SimpleNamespace(data=hit, count=None)
+        count = len(hit) if q._count else None
+        if q._order is not None:
+            col, desc = q._order
+            hit.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+        if q._limit is not None:
+            hit = hit[: q._limit]
+        if q._columns is not None:
+            hit = [{c: r.get(c) for c in q._columns} for r in hit]
+        else:
+            hit = [dict(r) for r in hit]
+        return SimpleNamespace(data=hit, count=count)
+
+
+@dataclass
+class FakeServices:
+    backend: FakeBackend
+    openai: FakeOpenAI
+    pinecone_index: FakePineconeIndex
+    supabase: FakeSupabase
+
+
+def install_fakes(
+    profiles: Optional[dict[str, ServiceProfile]] = None,
+    *,
+    time_scale: float = 1.0,
+    seed: int = 0,
+    dim: int = EMBED_DIM,
+) -> FakeServices:
+    """Create the three fakes and install them as this process's clients."""
+    backend = FakeBackend(profiles, time_scale=time_scale, seed=seed)
+    services = FakeServices(backend, FakeOpenAI(backend, dim=dim), FakePineconeIndex(backend), FakeSupabase(backend))
+    clients.set_client("openai", services.openai)
+    clients.set_client("pinecone_index", services.pinecone_index)
+    clients.set_client("supabase", services.supabase)
+    return services
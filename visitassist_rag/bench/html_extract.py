@@ -0,0 +1,94 @@
+"""Speed benchmark: BeautifulSoup main-text extraction vs the single-pass extractor.
+
+Run from the repo root:
+
+    python -m visitassist_rag.bench.html_extract --corpus path/to/saved_pages
+    python -m visitassist_rag.bench.html_extract --pages 50
+
+With --corpus, every *.html / *.htm file under the directory is used (save pages
+with the browser's "Save page as… HTML only"). Without it, synthetic tourism pages
+with typical noise (menus, cookie banners, scripts, footers) are generated. Both
+extractors must return identical output for every page; mismatches are reported.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from visitassist_rag.rag.html_extract import extract_main_text_stream
+from visitassist_rag.rag.url_ingest import extract_main_text_bs4
+
+
+def synthetic_page(i: int, paragraphs: int = 120) -> str:
+    menu = "".join(f"<li class='menu-item'><a href='/p/{k}'>Atração {k}</a></li>" for k in range(40))
+    body = "".join(
+        f"<section id='s{p}'><h2>Seção {p}</h2><p>O Parque {i} recebe visitantes de terça a domingo, das 9h às 17h. "
+        f"Ingressos custam R$ {20 + p % 30},00 &amp; crianças até 6 anos não pagam. "
+        f"<a href='/info/{p}'>Saiba mais</a></p><table><tr><td>Horário</td><td>{8 + p % 10}h</td></tr></table></section>"
+        for p in range(paragraphs)
+    )
+    return (
+        f"<!doctype html><html><head><title>Página {i} — Visit</title>"
+        "<script>window.dataLayer=[];function gtag(){dataLayer.push(arguments)}</script>"
+        "<style>body{font-family:sans-serif}.x{color:red}</style></head><body>"
+        f"<header class='site-header'><nav><ul>{menu}</ul></nav></header>"
+        "<div id='cookie-consent' class='modal'><p>Usamos cookies.</p><button>OK</button></div>"
+        f"<main><article><h1>Página {i}</h1>{body}</article>"
+        "<aside class='sidebar'><div class='newsletter'>Assine</div></aside></main>"
+        "<footer><p>© Visit</p><a href='/privacidade'>Privacidade</a></footer>"
+        "<script src='/app.js'></script></body></html>"
+    )
+
+
+def _load_corpus(path: Path) -> list[str]:
+    files = sorted(p for p in path.rglob("*") if p.suffix.lower() in (".html", ".htm"))
+    return [f.read_text(encoding="utf-8", errors="replace") for f in files]
+
+
+def _time(fn, pages: list[str], repeat: int) -> list[float]:
+    per_page = []
+    for html in pages:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(html)
+            best = min(best, time.perf_counter() - t0)
+        per_page.append(best * 1000.0)
+    return per_page
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare HTML main-text extractors.")
+    parser.add_argument("--corpus", type=Path, default=None, help="Directory of saved .html pages.")
+    parser.add_argument("--pages", type=int, default=30, help="Synthetic pages when --corpus is not given.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per page; the best is kept.")
+    args = parser.parse_args()
+
+    pages = _load_corpus(args.corpus) if args.corpus else [synthetic_page(i) for i in range(args.pages)]
+    if not pages:
+        print("No pages found.")
+        return 1
+
+    mismatches = [i for i, html in enumerate(pages) if extract_main_text_bs4(html) != extract_main_text_stream(html)]
+    bs4_ms = _time(extract_main_text_bs4, pages, args.repeat)
+    stream_ms = _time(extract_main_text_stream, pages, args.repeat)
+
+    def summary(ms: list[float]) -> dict:
+        return {"total_ms": round(sum(ms), 1), "median_ms": round(statistics.median(ms), 2), "max_ms": round(max(ms), 2)}
+
+    print(json.dumps({
+        "pages": len(pages),
+        "avg_kb": round(sum(len(p) for p in pages) / len(pages) / 1024.0, 1),
+        "bs4": summary(bs4_ms),
+        "stream": summary(stream_ms),
+        "mismatches": mismatches,
+    }, indent=2))
+    print(f"speedup: x{sum(bs4_ms) / max(sum(stream_ms), 1e-9):.1f}")
+    return 0 if not mismatches else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
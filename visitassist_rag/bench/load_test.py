@@ -0,0 +1,295 @@
+"""Load test of the FastAPI app against in-process OpenAI/Pinecone/Supabase fakes.
+
+Run from the repo root:
+
+    python -m visitassist_rag.bench.load_test --concurrency 16 --requests 400
+    python -m visitassist_rag.bench.load_test --mix query=6,answer=3,ingest=1 --time-scale 0.25
+    python -m visitassist_rag.bench.load_test --save-baseline bench_baseline.json
+    python -m visitassist_rag.bench.load_test --baseline bench_baseline.json --max-regression 0.15
+
+No network and no API keys: `fakes.install_fakes` replaces the three clients, with
+per-service latency distributions and failure rates (`--embeddings 120:400:0.01`
+is median ms, p95 ms and failure rate). `--time-scale` multiplies every fake
+latency, so a run can be shortened without changing the shape of the load.
+
+A knowledge base is first ingested from FAQ01.json and FAQ02.json through the
+bulk endpoint; then `--requests` requests are sent through an in-process ASGI
+transport with at most `--concurrency` in flight, drawn from `--mix`:
+
+- query:  POST /v1/kb/{kb}/query with debug=true (per-stage timings)
+- answer: POST /v1/kb/{kb}/query/answer
+- ingest: POST /v1/kb/{kb}-ingest/ingest/text (one FAQ entry)
+- bulk:   POST /v1/kb/{kb}-ingest/ingest/bulk (`--bulk-docs` FAQ entries)
+
+The report gives throughput and p50/p95/p99 per endpoint, per query stage
+(from `debug.timings_ms.stages`) and per ingest stage (bulk `timings_ms`).
+Sync routes run in AnyIO's thread pool (40 threads unless `--threadpool`), as
+under uvicorn. With --baseline, a throughput drop or p95 increase beyond
+--max-regression on any endpoint exits with status 1.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from visitassist_rag.bench.fakes import DEFAULT_PROFILES, ServiceProfile, install_fakes
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_FAQS = (REPO_ROOT / "FAQ01.json", REPO_ROOT / "FAQ02.json")
+ENDPOINTS = ("query", "answer", "ingest", "bulk")
+LANGUAGE = "en"
+
+
+def load_faq(paths) -> list[dict[str, Any]]:
+    items = []
+    for path in paths:
+        path = Path(path)
+        for item in json.loads(path.read_text(encoding="utf-8")):
+            items.append({**item, "source": path.stem})
+    return items
+
+
+def faq_document(item: dict[str, Any], suffix: str = "") -> dict[str, Any]:
+    return {
+        "title": item["question"],
+        "text": f"{item['question']}\n\n{item['answer']}\n\n{item.get('category', '')} — {item.get('discipline', '')}",
+        "source_type": "faq",
+        "source_uri": f"faq://{item['source']}/{item['id']}{suffix}",
+        "language": LANGUAGE,
+    }
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r} (expected one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not any(w > 0 for w in mix.values()):
+        raise ValueError("The mix needs at least one positive weight")
+    return mix
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    s = sorted(values)
+    return {
+        "count": len(s),
+        "mean_ms": round(sum(s) / len(s), 2) if s else 0.0,
+        "p50_ms": round(percentile(s, 50), 2),
+        "p95_ms": round(percentile(s, 95), 2),
+        "p99_ms": round(percentile(s, 99), 2),
+        "max_ms": round(s[-1], 2) if s else 0.0,
+    }
+
+
+def build_requests(n: int, mix: dict[str, float], faq: list[dict[str, Any]], kb_id: str, bulk_docs: int, rng: random.Random):
+    names = [k for k, w in mix.items() if w > 0]
+    weights = [mix[k] for k in names]
+    out = []
+    for i in range(n):
+        endpoint = rng.choices(names, weights)[0]
+        item = rng.choice(faq)
+        if endpoint in ("query", "answer"):
+            path = f"/v1/kb/{kb_id}/query" + ("/answer" if endpoint == "answer" else "")
+            body: dict[str, Any] = {"question": item["question"], "language": LANGUAGE, "debug": endpoint == "query"}
+        elif endpoint == "ingest":
+            path = f"/v1/kb/{kb_id}-ingest/ingest/text"
+            body = faq_document(item, f"?r={i}")
+        else:
+            path = f"/v1/kb/{kb_id}-ingest/ingest/bulk"
+            body = {"documents": [faq_document(d, f"?r={i}") for d in rng.sample(faq, min(bulk_docs, len(faq)))]}
+        out.append((endpoint, path, body))
+    return out
+
+
+async def _run(args, services, faq: list[dict[str, Any]]) -> dict[str, Any]:
+    import anyio.to_thread
+    import httpx
+
+    from visitassist_rag.app import app
+
+    if args.threadpool:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = args.threadpool
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        t0 = time.perf_counter()
+        seed = await client.post(f"/v1/kb/{args.kb}/ingest/bulk", json={"documents": [faq_document(it) for it in faq]})
+        seed.raise_for_status()
+        seed_body = seed.json()
+        seed_info = {
+            "documents": len(faq),
+            "chunks": seed_body.get("chunks"),
+            "ms": round((time.perf_counter() - t0) * 1000.0, 2),
+            "failed": sum(1 for r in seed_body.get("results", []) if not r.get("success")),
+        }
+
+        rng = random.Random(args.seed)
+        plan = build_requests(args.warmup + args.requests, args.mix, faq, args.kb, args.bulk_docs, rng)
+        warmup, plan = plan[: args.warmup], plan[args.warmup:]
+        sem = asyncio.Semaphore(args.concurrency)
+        results: list[dict[str, Any]] = []
+
+        async def send(endpoint: str, path: str, body: dict[str, Any], record: bool) -> None:
+            async with sem:
+                start = time.perf_counter()
+                try:
+                    resp = await client.post(path, json=body)
+                    status, payload = resp.status_code, (resp.json() if resp.content else None)
+                except Exception as e:  # transport errors count as failures
+                    status, payload = 0, {"error": repr(e)}
+                ms = (time.perf_counter() - start) * 1000.0
+            if record:
+                results.append({"endpoint": endpoint, "status": status, "ms": ms, "payload": payload})
+
+        await asyncio.gather(*(send(*r, record=False) for r in warmup))
+        calls_before = services.backend.stats()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(send(*r, record=True) for r in plan))
+        elapsed = time.perf_counter() - t0
+
+    return _report(args, results, elapsed, seed_info, calls_before, services.backend.stats())
+
+
+def _stage_samples(r: dict[str, Any]) -> dict[str, float]:
+    payload = r["payload"] if isinstance(r["payload"], dict) else {}
+    if r["endpoint"] == "query":
+        timings = ((payload.get("debug") or {}).get("timings_ms") or {}).get("stages") or {}
+        return {f"query.{k}": v for k, v in timings.items()}
+    if r["endpoint"] == "bulk":
+        return {f"ingest.{k}": v for k, v in (payload.get("timings_ms") or {}).items()}
+    return {}
+
+
+def _report(args, results, elapsed: float, seed_info, calls_before, calls_after) -> dict[str, Any]:
+    endpoints: dict[str, Any] = {}
+    stages: dict[str, list[float]] = {}
+    for name in ENDPOINTS:
+        rows = [r for r in results if r["endpoint"] == name]
+        if not rows:
+            continue
+        errors = [r for r in rows if not 200 <= r["status"] < 300]
+        endpoints[name] = {
+            "requests": len(rows),
+            "errors": len(errors),
+            "error_rate": round(len(errors) / len(rows), 4),
+            "throughput_rps": round((len(rows) - len(errors)) / elapsed, 2) if elapsed else 0.0,
+            **summarize([r["ms"] for r in rows]),
+        }
+        for r in rows:
+            if not 200 <= r["status"] < 300:
+                continue
+            for stage, ms in _stage_samples(r).items():
+                stages.setdefault(stage, []).append(ms)
+    ok = sum(e["requests"] - e["errors"] for e in endpoints.values())
+    services = {}
+    for name, after in calls_after.items():
+        before = calls_before.get(name, {"calls": 0, "failures": 0})
+        services[name] = {k: after[k] - before[k] for k in ("calls", "failures")}
+    return {
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "mix": args.mix,
+            "bulk_docs": args.bulk_docs,
+            "time_scale": args.time_scale,
+            "threadpool": args.threadpool,
+            "profiles": {k: [p.median_ms, p.p95_ms, p.failure_rate] for k, p in args.profiles.items()},
+            "seed": args.seed,
+        },
+        "seed_kb": seed_info,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "endpoints": endpoints,
+        "stages": {k: summarize(v) for k, v in sorted(stages.items())},
+        "service_calls": services,
+    }
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], max_regression: float) -> dict[str, Any]:
+    """Relative change per endpoint; a regression is a throughput drop or p95 rise beyond max_regression."""
+    rows = {}
+    regressions = []
+
+    def rel(new: float, old: float) -> Optional[float]:
+        return round((new - old) / old, 4) if old else None
+
+    pairs = [("total", report, baseline)] + [
+        (name, ep, baseline.get("endpoints", {}).get(name)) for name, ep in report["endpoints"].items()
+    ]
+    for name, new, old in pairs:
+        if not old:
+            continue
+        d_tput = rel(new["throughput_rps"], old["throughput_rps"])
+        row: dict[str, Any] = {"throughput_rps": [old["throughput_rps"], new["throughput_rps"], d_tput]}
+        if d_tput is not None and d_tput < -max_regression:
+            regressions.append(f"{name}: throughput {d_tput:+.1%}")
+        if "p95_ms" in new:
+            d_p95 = rel(new["p95_ms"], old["p95_ms"])
+            row["p95_ms"] = [old["p95_ms"], new["p95_ms"], d_p95]
+            if d_p95 is not None and d_p95 > max_regression:
+                regressions.append(f"{name}: p95 {d_p95:+.1%}")
+        rows[name] = row
+    warnings = []
+    if report["config"] != baseline.get("config"):
+        warnings.append("run configuration differs from the baseline's; the comparison may not be meaningful")
+    return {"max_regression": max_regression, "changes": rows, "regressions": regressions, "warnings": warnings}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    ap.add_argument("--requests", type=int, default=400, help="measured requests (after warmup)")
+    ap.add_argument("--warmup", type=int, default=20)
+    ap.add_argument("--mix", type=parse_mix, default=parse_mix("query=6,answer=3,ingest=1"))
+    ap.add_argument("--bulk-docs", type=int, default=10, help="documents per bulk request")
+    ap.add_argument("--kb", default="loadtest")
+    ap.add_argument("--faq", type=Path, nargs="+", default=list(DEFAULT_FAQS))
+    ap.add_argument("--time-scale", type=float, default=1.0, help="multiplier on every fake latency")
+    ap.add_argument("--threadpool", type=int, default=None, help="AnyIO worker threads for sync routes")
+    ap.add_argument("--seed", type=int, default=0)
+    for name, p in DEFAULT_PROFILES.items():
+        ap.add_argument(
+            f"--{name}",
+            type=ServiceProfile.parse,
+            default=p,
+            metavar="MEDIAN:P95[:FAIL]",
+            help=f"fake {name} latency (ms) and failure rate (default {p.median_ms:g}:{p.p95_ms:g}:{p.failure_rate:g})",
+        )
+    ap.add_argument("--baseline", type=Path, default=None, help="compare with a report saved by --save-baseline")
+    ap.add_argument("--max-regression", type=float, default=0.15, help="allowed relative throughput drop / p95 rise")
+    ap.add_argument("--save-baseline", type=Path, default=None, help="write this run's report as the new baseline")
+    args = ap.parse_args()
+    args.profiles = {name: getattr(args, name) for name in DEFAULT_PROFILES}
+
+    services = install_fakes(args.profiles, time_scale=args.time_scale, seed=args.seed)
+    report = asyncio.run(_run(args, services, load_faq(args.faq)))
+
+    status = 0
+    if args.baseline:
+        comparison = compare(report, json.loads(args.baseline.read_text(encoding="utf-8")), args.max_regression)
+        report["baseline"] = {"path": str(args.baseline), **comparison}
+        status = 1 if comparison["regressions"] else 0
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps({k: v for k, v in report.items() if k != "baseline"}, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
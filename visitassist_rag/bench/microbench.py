@@ -0,0 +1,238 @@
+"""Microbenchmarks of the pure-Python functions on the query and ingest hot paths.
+
+Run from the repo root:
+
+    python -m visitassist_rag.bench.microbench
+    python -m visitassist_rag.bench.microbench --filter guard --min-time 0.5
+    python -m visitassist_rag.bench.microbench --save-baseline microbench_baseline.json
+    python -m visitassist_rag.bench.microbench --baseline microbench_baseline.json --max-regression 0.2
+
+Fixtures are built from FAQ01.json and FAQ02.json (prose chunks, markdown
+documents, rerank candidates, grounded answers with citations), PDF-like table
+and table-of-contents text, and synthetic HTML pages. Each case runs its fixture
+set in a loop for at least --min-time, --repeat times; the best run gives
+ops/sec (one op = one fixture item). A separate pass under tracemalloc gives
+the peak of traced allocations while the pass runs (tracing slows the code, so
+that pass is not timed).
+
+With --baseline, a case whose ops/sec dropped by more than --max-regression
+exits with status 1. Compare runs on the same machine and Python version.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+from visitassist_rag.bench.chunk_batch import synthetic_pdf_text
+from visitassist_rag.bench.html_extract import synthetic_page
+from visitassist_rag.rag import engine
+from visitassist_rag.rag.chunking import build_sections, chunk_by_tokens
+from visitassist_rag.rag.dedupe import dedupe_snippets
+from visitassist_rag.rag.url_ingest import extract_main_text
+
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def load_faq() -> list[dict[str, Any]]:
+    items = []
+    for name in ("FAQ01.json", "FAQ02.json"):
+        items += json.loads((_REPO_ROOT / name).read_text(encoding="utf-8"))
+    return items
+
+
+def table_texts(pages: int = 40) -> list[str]:
+    """Table-like PDF pages (numeric cells, short labels) plus a table of contents."""
+    tables = [p for p in synthetic_pdf_text(pages).split("\n\n") if p.startswith("Tabela")]
+    toc = "SUMÁRIO\n" + "\n".join(f"{i}. Seção {i} ........ {3 + i * 4}" for i in range(1, 25))
+    totals = "10,00\nPiezômetros instalados na fundação\nda barragem principal,\nno bloco F\nTotal de instrumentos\n2.218"
+    return tables + [toc, totals]
+
+
+def candidates(faq: list[dict[str, Any]], tables: list[str]) -> list[dict[str, Any]]:
+    """Rerank output: FAQ prose chunks with table chunks mixed in, scores descending."""
+    out = []
+    texts = [(f"{it['question']} {it['answer']}", "fine") for it in faq] + [(t, "fine") for t in tables]
+    for i, (text, chunk_type) in enumerate(texts):
+        if i % 7 == 0:
+            chunk_type = "section"
+        out.append({
+            "id": f"c{i}",
+            "score": round(0.92 - 0.004 * i, 4),
+            "metadata": {
+                "chunk_text": text,
+                "chunk_type": chunk_type,
+                "section_id": f"s{i // 3}",
+                "doc_title": "Itaipu FAQ",
+                "section_path": "Document",
+                "doc_year": 2000 + i % 24,
+            },
+        })
+    return out
+
+
+def answer_cases(faq: list[dict[str, Any]], cands: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Guard inputs: definition questions, questions with years/names, and answers with hedging words."""
+    cases = []
+    for i, it in enumerate(faq):
+        snippets = cands[i:i + 4]
+        year = 1974 + i % 40
+        if i % 3 == 0:
+            question = f"O que é {it['category'].lower()} em Itaipu Binacional?"
+        elif i % 3 == 1:
+            question = f"Em {year}, {it['question']}"
+        else:
+            question = it["question"]
+        answer = (
+            f"{it['answer']} [S1]\n"
+            f"Em {year}, isso era fundamental na Itaipu Binacional e garante a operação segura, "
+            "portanto consiste em monitorar a barragem. [S2]\n\n"
+            "Fonte: [S1], [S2]"
+        )
+        cases.append({"question": question, "answer": answer, "snippets": snippets, "language": "pt"})
+    return cases
+
+
+def build_cases(faq: list[dict[str, Any]], html_pages: int) -> dict[str, tuple[Callable[[], Any], int]]:
+    """name -> (one pass over the fixtures, ops per pass)."""
+    tables = table_texts()
+    cands = candidates(faq, tables)
+    answers = answer_cases(faq, cands)
+    paragraphs = [f"{it['question']}\n{it['answer']}" for it in faq]
+    docs = [
+        "\n".join(
+            f"# {it['category']}\n## {it['question']}\n{it['answer']}\n\nDisciplina: {it['discipline']}."
+            for it in faq[i:i + 10]
+        )
+        for i in range(0, len(faq), 10)
+    ]
+    previews = [(it["question"], t) for it, t in zip(faq, tables * (len(faq) // len(tables) + 1))]
+    dup_snippets = cands + [
+        {**c, "metadata": {**c["metadata"], "chunk_text": "  " + c["metadata"]["chunk_text"].upper().replace(" ", "\n")}}
+        for c in cands[::2]
+    ]
+    pages = [synthetic_page(i, paragraphs=40) for i in range(html_pages)]
+    questions = [it["question"] for it in faq]
+    chunk_texts = [c["metadata"]["chunk_text"] for c in cands]
+
+    def each(fn, items):
+        def run():
+            for args in items:
+                fn(*args)
+        return run
+
+    return {
+        "chunk_by_tokens": (lambda: chunk_by_tokens(paragraphs, 180, 30), 1),
+        "build_sections": (each(build_sections, [(d,) for d in docs]), len(docs)),
+        "pick_grounding_candidates": (each(engine._pick_grounding_candidates, [(q, cands[i % 20:i % 20 + 30]) for i, q in enumerate(questions)]), len(questions)),
+        "looks_like_pdf_table_or_toc": (each(engine._looks_like_pdf_table_or_toc, [(t,) for t in chunk_texts]), len(chunk_texts)),
+        "clean_pdf_table_preview": (each(engine._clean_pdf_table_preview, previews), len(previews)),
+        "strict_inference_guard": (
+            each(lambda a: engine._strict_inference_guard(a["answer"], a["snippets"], a["language"]), [(a,) for a in answers]),
+            len(answers),
+        ),
+        "definition_guard": (
+            each(lambda a: engine._definition_guard(answer_style="strict", **a), [(a,) for a in answers]),
+            len(answers),
+        ),
+        "question_constraint_guard": (
+            each(lambda a: engine._question_constraint_guard(answer_style="strict", **a), [(a,) for a in answers]),
+            len(answers),
+        ),
+        "ensure_citation_footer": (each(engine._ensure_citation_footer, [(a["answer"], a["language"]) for a in answers]), len(answers)),
+        "dedupe_snippets": (lambda: dedupe_snippets(dup_snippets), 1),
+        "extract_main_text": (each(extract_main_text, [(p,) for p in pages]), len(pages)),
+    }
+
+
+def _best_seconds_per_pass(run: Callable[[], Any], min_time: float, repeat: int) -> float:
+    # Calibrate the loop count so one timing covers at least min_time.
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)) + 1)
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            run()
+        best = min(best, (time.perf_counter() - t0) / loops)
+    return best
+
+
+def _peak_bytes(run: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - start)
+
+
+def measure(run: Callable[[], Any], ops: int, *, min_time: float, repeat: int) -> dict[str, Any]:
+    run()  # warm caches (tokenizer, compiled regexes)
+    per_pass = _best_seconds_per_pass(run, min_time, repeat)
+    peak = _peak_bytes(run)
+    return {
+        "ops_per_pass": ops,
+        "ops_per_sec": round(ops / per_pass, 1),
+        "us_per_op": round(per_pass / ops * 1e6, 2),
+        "peak_alloc_kb_per_pass": round(peak / 1024.0, 1),
+    }
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], max_regression: float) -> dict[str, Any]:
+    changes = {}
+    regressions = []
+    for name, new in results.items():
+        old = baseline.get(name)
+        if not old or not old.get("ops_per_sec"):
+            continue
+        delta = round((new["ops_per_sec"] - old["ops_per_sec"]) / old["ops_per_sec"], 4)
+        changes[name] = {"ops_per_sec": [old["ops_per_sec"], new["ops_per_sec"], delta]}
+        if delta < -max_regression:
+            regressions.append(f"{name}: ops/sec {delta:+.1%}")
+    return {"max_regression": max_regression, "changes": changes, "regressions": regressions}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ops/sec and allocations of the pure-Python hot paths.")
+    parser.add_argument("--filter", default=None, help="Regex; only cases whose name matches.")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing run.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per case; the best is kept.")
+    parser.add_argument("--html-pages", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative ops/sec drop.")
+    parser.add_argument("--save-baseline", type=Path, default=None)
+    args = parser.parse_args()
+
+    cases = build_cases(load_faq(), args.html_pages)
+    if args.filter:
+        cases = {k: v for k, v in cases.items() if re.search(args.filter, k)}
+    results = {name: measure(run, ops, min_time=args.min_time, repeat=max(1, args.repeat)) for name, (run, ops) in cases.items()}
+
+    report: dict[str, Any] = {"cases": results}
+    status = 0
+    if args.baseline:
+        report["baseline"] = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")).get("cases", {}), args.max_regression)
+        status = 1 if report["baseline"]["regressions"] else 0
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps({"cases": results}, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,125 @@
+"""Process-wide, lazily created service clients.
+
+Nothing here connects at import time: each client is built on first use, once
+per worker process, and then shared (including its HTTP connection pool) by every
+module. Missing credentials surface as RuntimeError at first use rather than as
+an import failure.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable
+
+from visitassist_rag.settings import settings
+
+
+_lock = threading.Lock()
+_clients: dict[str, Any] = {}
+
+
+def _require_env(name: str) -> str:
+    value = os.getenv(name)
+    if not value:
+        raise RuntimeError(f"Missing environment variable {name}. Set it in the server environment or .env.")
+    return value
+
+
+def _get(name: str, factory: Callable[[], Any]) -> Any:
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def _make_openai():
+    from openai import OpenAI
+
+    kwargs: dict[str, Any] = {
+        "api_key": _require_env("OPENAI_API_KEY"),
+        "timeout": settings.OPENAI_TIMEOUT_S,
+        "max_retries": settings.OPENAI_MAX_RETRIES,
+    }
+    try:
+        import httpx
+        from openai import DefaultHttpxClient
+
+        kwargs["http_client"] = DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_S,
+            ),
+        )
+    except Exception:
+        # Older SDKs: fall back to the SDK's default pool.
+        pass
+    return OpenAI(**kwargs)
+
+
+def _make_pinecone_index():
+    from pinecone import Pinecone
+
+    pc = Pinecone(api_key=_require_env("PINECONE_API_KEY"), pool_threads=settings.PINECONE_POOL_THREADS)
+    # With PINECONE_INDEX_HOST set, skip the describe_index round trip.
+    host = os.getenv("PINECONE_INDEX_HOST")
+    if host:
+        return pc.Index(host=host)
+    return pc.Index(_require_env("PINECONE_INDEX"))
+
+
+def _make_supabase():
+    from supabase import create_client
+
+    url = _require_env("SUPABASE_URL")
+    key = _require_env("SUPABASE_SERVICE_ROLE_KEY")
+    try:
+        from supabase import ClientOptions
+
+        options = ClientOptions(postgrest_client_timeout=settings.SUPABASE_TIMEOUT_S)
+    except Exception:
+        options = None
+    return create_client(url, key, options=options) if options is not None else create_client(url, key)
+
+
+def _make_http_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=settings.HTTP_POOL_HOSTS, pool_maxsize=settings.HTTP_POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_openai():
+    return _get("openai", _make_openai)
+
+
+def get_pinecone_index():
+    return _get("pinecone_index", _make_pinecone_index)
+
+
+def get_supabase():
+    return _get("supabase", _make_supabase)
+
+
+def get_http_session():
+    """Shared requests.Session for outbound page fetches (keep-alive across fetches)."""
+    return _get("http", _make_http_session)
+
+
+def set_client(name: str, client: Any) -> None:
+    """Install a client explicitly (tests, local stand-ins). Names: openai, pinecone_index, supabase, http."""
+    with _lock:
+        _clients[name] = client
+
+
+def reset_clients() -> None:
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,234 @@
+"""Memory instrumentation: process RSS, tracemalloc snapshots and cache sizes.
+
+- Allocation tracing (tracemalloc) is off by default; an admin starts it, takes
+  snapshots and diffs two of them to see which source lines gained memory.
+- Modules with in-process caches register a size callback (`register_cache`),
+  reported by `cache_sizes()`.
+- `measure_peak()` reports the peak of traced Python allocations during a block
+  (used for the optional per-ingest memory report). It turns tracemalloc on for
+  the duration if nobody else has. Only one measurement runs per process at a
+  time; the others report nothing.
+
+tracemalloc only sees allocations made through Python's allocator; NumPy arrays
+are included, buffers allocated by C libraries (PyMuPDF, tiktoken) are not. The
+RSS figures cover everything.
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+TRACEMALLOC_FRAMES = int(os.getenv("VISITASSIST_TRACEMALLOC_FRAMES", "10"))
+# Snapshots are large (one entry per live allocation site); keep only a few.
+MEMORY_MAX_SNAPSHOTS = int(os.getenv("VISITASSIST_MEMORY_MAX_SNAPSHOTS", "4"))
+
+_lock = threading.Lock()
+_admin_tracing = False
+_peak_running = False
+_snapshots: "OrderedDict[str, tuple[float, tracemalloc.Snapshot]]" = OrderedDict()
+_caches: dict[str, Callable[[], dict[str, Any]]] = {}
+
+# Allocations of the tracing machinery itself.
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemorySnapshotError(RuntimeError):
+    pass
+
+
+def process_memory() -> dict[str, Optional[int]]:
+    """Current and peak resident set size in bytes (Linux /proc; peak only elsewhere)."""
+    out: dict[str, Optional[int]] = {"rss_bytes": None, "rss_peak_bytes": None}
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    out["rss_bytes"] = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    out["rss_peak_bytes"] = int(line.split()[1]) * 1024
+    except OSError:
+        try:
+            import resource
+
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # kilobytes on Linux, bytes on macOS
+            out["rss_peak_bytes"] = peak if os.uname().sysname == "Darwin" else peak * 1024
+        except Exception:
+            pass
+    return out
+
+
+def register_cache(name: str, size_fn: Callable[[], dict[str, Any]]) -> None:
+    """size_fn returns at least {"items": n}; add "approx_bytes" where cheap to estimate."""
+    _caches[name] = size_fn
+
+
+def cache_sizes() -> dict[str, Any]:
+    out: dict[str, Any] = {}
+    for name, fn in sorted(_caches.items()):
+        try:
+            out[name] = fn()
+        except Exception as e:
+            out[name] = {"error": repr(e)}
+    return out
+
+
+def start_tracing(frames: int = TRACEMALLOC_FRAMES) -> dict[str, Any]:
+    global _admin_tracing
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, frames))
+        _admin_tracing = True
+    return tracing_status()
+
+
+def stop_tracing() -> dict[str, Any]:
+    """Stop admin tracing and drop its snapshots (tracing stays on while a peak measurement runs)."""
+    global _admin_tracing
+    with _lock:
+        _admin_tracing = False
+        _snapshots.clear()
+        if not _peak_running and tracemalloc.is_tracing():
+            tracemalloc.stop()
+    return tracing_status()
+
+
+def tracing_status() -> dict[str, Any]:
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    with _lock:
+        snaps = [
+            {"snapshot_id": sid, "taken_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))}
+            for sid, (ts, _) in _snapshots.items()
+        ]
+    return {
+        "tracing": tracing,
+        "admin_session": _admin_tracing,
+        "frames": tracemalloc.get_traceback_limit() if tracing else None,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+        "snapshots": snaps,
+    }
+
+
+def take_snapshot() -> dict[str, Any]:
+    if not _admin_tracing:
+        raise MemorySnapshotError("Allocation tracing is not started")
+    snap = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    sid = uuid.uuid4().hex[:12]
+    with _lock:
+        _snapshots[sid] = (time.time(), snap)
+        while len(_snapshots) > MEMORY_MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return {"snapshot_id": sid, "traced_bytes": sum(t.size for t in snap.traces)}
+
+
+def _get_snapshot(sid: str) -> tracemalloc.Snapshot:
+    with _lock:
+        entry = _snapshots.get(sid)
+    if entry is None:
+        raise MemorySnapshotError(f"Unknown snapshot: {sid}")
+    return entry[1]
+
+
+def diff_snapshots(
+    base_id: str,
+    current_id: Optional[str] = None,
+    *,
+    top: int = 25,
+    group_by: str = "lineno",
+) -> dict[str, Any]:
+    """Top allocation sites by size growth from `base_id` to `current_id` (a new snapshot if omitted)."""
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise ValueError("group_by must be lineno, filename or traceback")
+    base = _get_snapshot(base_id)
+    if current_id is None:
+        current_id = take_snapshot()["snapshot_id"]
+    current = _get_snapshot(current_id)
+    stats = current.compare_to(base, group_by)
+    sites = []
+    for st in stats[: max(1, top)]:
+        frames = [f"{fr.filename}:{fr.lineno}" for fr in st.traceback]
+        sites.append({
+            "site": frames[0] if frames else "?",
+            "traceback": frames if group_by == "traceback" else None,
+            "size_diff_bytes": st.size_diff,
+            "count_diff": st.count_diff,
+            "size_bytes": st.size,
+            "count": st.count,
+        })
+    return {
+        "base": base_id,
+        "current": current_id,
+        "group_by": group_by,
+        "total_diff_bytes": sum(st.size_diff for st in stats),
+        "sites": sites,
+    }
+
+
+class PeakMeasurement:
+    def __init__(self) -> None:
+        self.peak_traced_delta_bytes: Optional[int] = None
+        self.rss_delta_bytes: Optional[int] = None
+
+    def result(self) -> Optional[dict[str, Optional[int]]]:
+        if self.peak_traced_delta_bytes is None:
+            return None
+        return {"peak_traced_delta_bytes": self.peak_traced_delta_bytes, "rss_delta_bytes": self.rss_delta_bytes}
+
+
+@contextmanager
+def measure_peak(enabled: bool = True) -> Iterator[PeakMeasurement]:
+    """Peak traced allocations above the starting level during the block.
+
+    tracemalloc has one peak counter per process, reset at the start of each
+    measurement, so measurements are serialized: if one is already running,
+    this block is not measured and `result()` is None. The counter still covers
+    every thread, so allocations (and frees) by concurrent work in the same
+    worker move the figure in either direction; it is not a bound.
+    """
+    global _peak_running
+    m = PeakMeasurement()
+    if not enabled:
+        yield m
+        return
+    with _lock:
+        if _peak_running:
+            busy = True
+        else:
+            busy = False
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(1)
+            _peak_running = True
+            tracemalloc.reset_peak()
+    if busy:
+        yield m
+        return
+    start, _ = tracemalloc.get_traced_memory()
+    rss0 = process_memory()["rss_bytes"]
+    try:
+        yield m
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        rss1 = process_memory()["rss_bytes"]
+        m.peak_traced_delta_bytes = max(0, peak - start)
+        m.rss_delta_bytes = rss1 - rss0 if rss0 is not None and rss1 is not None else None
+        with _lock:
+            _peak_running = False
+            if not _admin_tracing and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+
+def memory_report() -> dict[str, Any]:
+    return {"process": process_memory(), "tracemalloc": tracing_status(), "caches": cache_sizes()}
@@ -0,0 +1,230 @@
+"""In-process metrics with Prometheus text exposition (no client library needed).
+
+Histograms and gauges live in this worker process; scrape every worker (or run a
+single worker per container). Observing a value is a dict lookup, a bisect and
+a few additions under a lock, cheap enough to stay on in production.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from visitassist_rag.memory import register_cache
+from visitassist_rag.tracing import span
+
+# Seconds. Covers a 2 ms cache hit up to a 30 s grounding call.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: dict[str, "Metric"] = {}
+_registry_lock = threading.Lock()
+
+
+def _label_str(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            series = {k: (list(c), s[0]) for k, (c, s) in self._series.items()}
+        out = []
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = 'le="%s"' % _fmt(bound)
+                out.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_label_str(self.labels, key)} {total!r}")
+            out.append(f"{self.name}_count{_label_str(self.labels, key)} {cumulative}")
+        return out
+
+
+class Gauge(Metric):
+    """A value set by the code, or computed at scrape time by `fn` (then unlabeled)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> list[str]:
+        if self.fn is not None:
+            try:
+                return [f"{self.name} {_fmt(self.fn())}"]
+            except Exception:
+                return []
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_label_str(self.labels, k)} {_fmt(v)}" for k, v in sorted(values.items())]
+
+
+class LabeledGaugeFn(Metric):
+    """Gauge computed at scrape time as {label value: number} for one label."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, label: str, fn: Callable[[], dict[str, float]]):
+        super().__init__(name, help_text, (label,))
+        self.fn = fn
+
+    def _samples(self) -> list[str]:
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        return [f"{self.name}{_label_str(self.labels, (k,))} {_fmt(v)}" for k, v in sorted(values.items())]
+
+
+def register(metric: Metric) -> Metric:
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def histogram(name: str, help_text: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+    return register(Histogram(name, help_text, labels, buckets))  # type: ignore[return-value]
+
+
+def gauge(name: str, help_text: str, labels: tuple[str, ...] = (), fn: Optional[Callable[[], float]] = None) -> Gauge:
+    return register(Gauge(name, help_text, labels, fn))  # type: ignore[return-value]
+
+
+def gauge_fn(name: str, help_text: str, label: str, fn: Callable[[], dict[str, float]]) -> LabeledGaugeFn:
+    return register(LabeledGaugeFn(name, help_text, label, fn))  # type: ignore[return-value]
+
+
+def _series_count() -> dict[str, int]:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {"items": sum(len(getattr(m, "_series", None) or getattr(m, "_values", None) or ()) for m in metrics)}
+
+
+register_cache("metric_series", _series_count)
+
+
+def render_prometheus() -> str:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines: list[str] = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+QUERY_STAGE_SECONDS = histogram(
+    "visitassist_query_stage_seconds",
+    "Latency of each rag_query stage.",
+    ("stage", "kb_id", "mode", "answer_style"),
+)
+INGEST_STAGE_SECONDS = histogram(
+    "visitassist_ingest_stage_seconds",
+    "Latency of each ingest pipeline stage (per ingest call).",
+    ("stage",),
+)
+
+
+class StageTimer:
+    """Times the stages of one request into a histogram and keeps the ms per stage.
+
+    Each stage is also a tracing span when the request is traced.
+    """
+
+    def __init__(self, hist: Histogram, **labels: str):
+        self.hist = hist
+        self.labels = labels
+        self.ms: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def record(self, name: str, seconds: float) -> None:
+        # Repeated stages (e.g. three retrieval passes under one name) add up.
+        self.ms[name] = round(self.ms.get(name, 0.0) + seconds * 1000.0, 2)
+        self.hist.observe(seconds, stage=name, **self.labels)
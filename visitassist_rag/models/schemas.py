@@ -14,6 +14,52 @@ class IngestResponse(BaseModel):
     success: bool
     doc_id: Optional[str]
     message: Optional[str] = None
+    # With ?memory=true: peak_traced_delta_bytes (tracemalloc) and rss_delta_bytes.
+    memory: Optional[Dict[str, Optional[int]]] = None
+
+
+class BulkIngestRequest(BaseModel):
+    documents: List[IngestTextRequest]
+
+
+class BulkIngestItemResult(BaseModel):
+    index: int
+    success: bool
+    doc_id: Optional[str]
+    title: str = ""
+    chunks: int = 0
+    chunk_ms: float = 0.0
+    message: Optional[str] = None
+
+
+class BulkIngestResponse(BaseModel):
+    results: List[BulkIngestItemResult]
+    chunks: int = 0
+    embedding_requests: int = 0
+    upsert_batches: int = 0
+    timings_ms: Dict[str, float] = {}
+    memory: Optional[Dict[str, Optional[int]]] = None
+
+
+class JobAcceptedResponse(BaseModel):
+    job_id: str
+    status: str = "queued"
+    status_url: str
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    kb_id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    attempts: int = 0
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # {"stage": last completed stage, "stages_ms": {...}, counters such as done/total, "total_ms"}
+    progress: Dict[str, Any] = {}
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
 
 
 class IngestUrlPreviewRequest(BaseModel):
@@ -32,6 +78,10 @@ class IngestUrlPreviewResponse(BaseModel):
     link_count: int
     link_density: float
     warnings: List[str] = []
+    # Pass back to /ingest/url/confirm to ingest this exact extraction without re-fetching.
+    preview_token: Optional[str] = None
+    # {"fetch_ms": ..., "bytes": ..., "truncated": ...}
+    debug: Optional[Dict[str, Any]] = None
 
 
 class IngestUrlConfirmRequest(BaseModel):
@@ -40,6 +90,38 @@ class IngestUrlConfirmRequest(BaseModel):
     language: str = "pt"
     doc_date: Optional[str] = None
     doc_year: Optional[int] = None
+    preview_token: Optional[str] = None
+    content_hash: Optional[str] = None
+    # With a preview_token: confirm with a conditional GET that the page is unchanged.
+    revalidate: bool = False
+
+
+class CrawlRequest(BaseModel):
+    seed_url: str
+    max_pages: int = 100
+    # Link hops from the seed (0 = only the seed page).
+    max_depth: int = 3
+    # Hosts the crawl may visit (www. is optional); empty = the seed's host.
+    allowed_domains: List[str] = []
+    include_subdomains: bool = False
+    # Only URLs whose path starts with this, e.g. "/roteiros/".
+    path_prefix: Optional[str] = None
+    respect_robots: bool = True
+    # Also ingest link-heavy index/category pages (their links are followed either way).
+    include_index_pages: bool = False
+    min_chars: int = 500
+    language: str = "pt"
+    doc_date: Optional[str] = None
+    doc_year: Optional[int] = None
+
+
+class ProfileStartRequest(BaseModel):
+    # "window": every thread for duration_s; "requests": a `rate` fraction of calls of `kinds`.
+    mode: Literal["window", "requests"] = "window"
+    duration_s: float = 30.0
+    interval_ms: float = 10.0
+    rate: float = 0.1
+    kinds: List[Literal["query", "ingest"]] = ["query", "ingest"]
 
 
 class IngestUrlPasteRequest(BaseModel):
@@ -58,6 +140,11 @@ class QueryRequest(BaseModel):
     debug_no_filter: Optional[bool] = False
     less_strict: Optional[bool] = False
 
+class BatchQueryRequest(BaseModel):
+    items: List[QueryRequest]
+    answer_style: Literal["explicative", "strict"] = "explicative"
+    max_concurrency: Optional[int] = None
+
 class Snippet(BaseModel):
     type: str  # Allow any chunk_type (e.g., 'section', 'fine', etc.)
     title: Optional[str]
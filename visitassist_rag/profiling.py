@@ -0,0 +1,246 @@
+"""On-demand sampling profiler for a live worker process.
+
+A profiling session runs a sampler thread that reads the Python stacks of other
+threads (`sys._current_frames`) every `interval_ms` and counts identical stacks.
+The result is in collapsed-stack format ("frame;frame;frame count" per line),
+which flamegraph.pl, speedscope and inferno read directly.
+
+Two modes:
+- "window": every thread of the process is sampled until the session ends.
+- "requests": only threads running a profiled call (`rag_query` is "query",
+  document ingestion is "ingest") are sampled, and only a `rate` fraction of
+  those calls is picked. Stacks are rooted at the call kind.
+
+With no session running there is no sampler thread, and a profiled call costs
+one global read.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from visitassist_rag.memory import register_cache
+
+PROFILE_MAX_DURATION_S = float(os.getenv("VISITASSIST_PROFILE_MAX_DURATION_S", "300"))
+PROFILE_MIN_INTERVAL_MS = 1.0
+# Distinct stacks kept per session; further new stacks are counted as "[truncated]".
+PROFILE_MAX_STACKS = 20000
+PROFILE_KINDS = ("query", "ingest")
+
+_PKG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+@dataclass
+class ProfileSession:
+    mode: str
+    duration_s: float
+    interval_ms: float
+    rate: float = 1.0
+    kinds: tuple[str, ...] = PROFILE_KINDS
+    started_at: float = field(default_factory=time.time)
+    ended_at: Optional[float] = None
+    samples: int = 0
+    profiled_calls: int = 0
+    stacks: Counter = field(default_factory=Counter)
+    # thread id -> call kind, for threads inside a sampled call ("requests" mode).
+    threads: dict[int, str] = field(default_factory=dict)
+    _stop: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def status(self) -> dict[str, Any]:
+        end = self.ended_at or time.time()
+        return {
+            "mode": self.mode,
+            "running": self.ended_at is None,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started_at)),
+            "elapsed_s": round(end - self.started_at, 2),
+            "duration_s": self.duration_s,
+            "interval_ms": self.interval_ms,
+            "rate": self.rate if self.mode == "requests" else None,
+            "kinds": list(self.kinds) if self.mode == "requests" else None,
+            "samples": self.samples,
+            "profiled_calls": self.profiled_calls if self.mode == "requests" else None,
+            "distinct_stacks": len(self.stacks),
+        }
+
+
+_lock = threading.Lock()
+_session: Optional[ProfileSession] = None
+_last: Optional[ProfileSession] = None
+_labels: dict[Any, str] = {}
+
+
+def _profile_size() -> dict[str, int]:
+    session = _session or _last
+    return {"items": len(session.stacks) if session else 0, "frame_labels": len(_labels)}
+
+
+register_cache("profile_stacks", _profile_size)
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(_PKG_ROOT):
+            path = os.path.relpath(path, _PKG_ROOT)
+        else:
+            marker = path.rfind("site-packages" + os.sep)
+            if marker >= 0:
+                path = path[marker + len("site-packages") + 1:]
+        label = f"{code.co_name} ({path.replace(os.sep, '/')}:{code.co_firstlineno})".replace(";", ",")
+        _labels[code] = label
+    return label
+
+
+def _collapse(frame, root: Optional[str] = None) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    if root:
+        names.append(root)
+    return ";".join(reversed(names))
+
+
+def _sample_loop(session: ProfileSession) -> None:
+    me = threading.get_ident()
+    interval = session.interval_ms / 1000.0
+    deadline = time.monotonic() + session.duration_s
+    while not session._stop.wait(interval):
+        if time.monotonic() >= deadline:
+            break
+        frames = sys._current_frames()
+        if session.mode == "requests":
+            targets = list(session.threads.copy().items())
+        else:
+            targets = [(tid, None) for tid in frames if tid != me]
+        for tid, kind in targets:
+            frame = frames.get(tid)
+            if frame is None:
+                continue
+            stack = _collapse(frame, kind)
+            if stack not in session.stacks and len(session.stacks) >= PROFILE_MAX_STACKS:
+                stack = "[truncated]"
+            session.stacks[stack] += 1
+            session.samples += 1
+        del frames
+    _end(session)
+
+
+def _end(session: ProfileSession) -> None:
+    global _session, _last
+    with _lock:
+        if session.ended_at is None:
+            session.ended_at = time.time()
+        if _session is session:
+            _session = None
+            _last = session
+
+
+def start_profile(
+    *,
+    mode: str = "window",
+    duration_s: float = 30.0,
+    interval_ms: float = 10.0,
+    rate: float = 0.1,
+    kinds: tuple[str, ...] = PROFILE_KINDS,
+) -> dict[str, Any]:
+    """Start a session (one per process); raises ProfilerBusyError if one is running."""
+    global _session
+    if mode not in ("window", "requests"):
+        raise ValueError("mode must be 'window' or 'requests'")
+    unknown = [k for k in kinds if k not in PROFILE_KINDS]
+    if unknown:
+        raise ValueError(f"Unknown kinds: {unknown}")
+    session = ProfileSession(
+        mode=mode,
+        duration_s=min(max(duration_s, 0.1), PROFILE_MAX_DURATION_S),
+        interval_ms=max(interval_ms, PROFILE_MIN_INTERVAL_MS),
+        rate=min(max(rate, 0.0), 1.0),
+        kinds=tuple(kinds) or PROFILE_KINDS,
+    )
+    with _lock:
+        if _session is not None:
+            raise ProfilerBusyError("A profiling session is already running")
+        _session = session
+    threading.Thread(target=_sample_loop, args=(session,), name="profile-sampler", daemon=True).start()
+    return session.status()
+
+
+def stop_profile() -> Optional[dict[str, Any]]:
+    """Stop the running session early; returns its status (None if none was running)."""
+    with _lock:
+        session = _session
+    if session is None:
+        return None
+    session._stop.set()
+    _end(session)
+    return session.status()
+
+
+def profile_status() -> dict[str, Any]:
+    with _lock:
+        running, last = _session, _last
+    return {"running": running.status() if running else None, "last": last.status() if last else None}
+
+
+def collapsed_stacks() -> Optional[str]:
+    """Collapsed stacks of the running session, or else of the last one."""
+    with _lock:
+        session = _session or _last
+    if session is None:
+        return None
+    items = sorted(session.stacks.copy().items(), key=lambda kv: -kv[1])
+    return "".join(f"{stack} {n}\n" for stack, n in items)
+
+
+def current() -> Optional[tuple[ProfileSession, str]]:
+    """(session, kind) when this thread is inside a sampled call; pass to `attach`."""
+    session = _session
+    if session is None:
+        return None
+    kind = session.threads.get(threading.get_ident())
+    return (session, kind) if kind else None
+
+
+@contextmanager
+def attach(token: Optional[tuple[ProfileSession, str]]) -> Iterator[None]:
+    """Sample this (pool) thread as part of the call that produced `token`."""
+    if token is None:
+        yield
+        return
+    session, kind = token
+    tid = threading.get_ident()
+    session.threads[tid] = kind
+    try:
+        yield
+    finally:
+        session.threads.pop(tid, None)
+
+
+@contextmanager
+def profiled(kind: str) -> Iterator[None]:
+    session = _session
+    if session is None or session.mode != "requests" or kind not in session.kinds:
+        yield
+        return
+    tid = threading.get_ident()
+    if tid in session.threads or random.random() >= session.rate:
+        yield
+        return
+    session.threads[tid] = kind
+    session.profiled_calls += 1
+    try:
+        yield
+    finally:
+        session.threads.pop(tid, None)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Iterator
+
+from visitassist_rag import tracing
+from visitassist_rag.metrics import gauge
+from visitassist_rag.rag.embeddings import embed_texts
+from visitassist_rag.rag.engine import rag_query
+
+
+BATCH_QUERY_MAX_ITEMS = int(os.getenv("VISITASSIST_BATCH_QUERY_MAX_ITEMS", "100"))
+BATCH_QUERY_CONCURRENCY = int(os.getenv("VISITASSIST_BATCH_QUERY_CONCURRENCY", "4"))
+_BATCH_QUERY_CONCURRENCY_CAP = 16
+
+BATCH_QUERY_ITEMS_RUNNING = gauge("visitassist_batch_query_items_running", "Batch query items being answered.")
+BATCH_QUERY_ITEMS_WAITING = gauge("visitassist_batch_query_items_waiting", "Batch query items waiting for a batch thread.")
+
+
+def iter_batch_answers(
+    kb_id: str,
+    items: list,
+    *,
+    answer_style: str = "explicative",
+    max_concurrency: int | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Answer many questions against one kb; yields one result per item in completion order.
+
+    All questions are embedded in a single `embed_texts` call; retrieval, rerank and
+    grounding then run per item with bounded concurrency. An item that fails yields
+    `{"ok": False, "error": ...}` and never affects the others. If the shared
+    embedding call fails, each item falls back to embedding its own question.
+    """
+    # Pool threads start without the request's context; item i is traced as "<request id>.<i>".
+    parent_id = tracing.current_request_id() or tracing.new_request_id()
+    vectors = None
+    try:
+        if items:
+            vectors = embed_texts([it.question for it in items])
+    except Exception:
+        vectors = None
+
+    def run(i: int, item) -> dict[str, Any]:
+        BATCH_QUERY_ITEMS_WAITING.dec()
+        BATCH_QUERY_ITEMS_RUNNING.inc()
+        t0 = time.perf_counter()
+        try:
+            with tracing.request_context(f"{parent_id}.{i}"):
+                resp = rag_query(
+                    kb_id=kb_id,
+                    **item.dict(),
+                    answer_style=answer_style,
+                    query_vector=None if vectors is None else vectors[i],
+                )
+            row: dict[str, Any] = {"index": i, "ok": True, "result": resp.dict()}
+        except Exception as e:
+            row = {"index": i, "ok": False, "error": str(e) or repr(e)}
+        finally:
+            BATCH_QUERY_ITEMS_RUNNING.dec()
+        row["elapsed_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        return row
+
+    workers = max(1, min(max_concurrency or BATCH_QUERY_CONCURRENCY, _BATCH_QUERY_CONCURRENCY_CAP, len(items) or 1))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-query")
+    BATCH_QUERY_ITEMS_WAITING.inc(len(items))
+    futures = []
+    try:
+        futures = [pool.submit(run, i, item) for i, item in enumerate(items)]
+        for fut in as_completed(futures):
+            yield fut.result()
+    finally:
+        # If the client goes away mid-stream, don't start the remaining items.
+        pool.shutdown(wait=False, cancel_futures=True)
+        cancelled = sum(1 for f in futures if f.cancelled()) + len(items) - len(futures)
+        if cancelled:
+            BATCH_QUERY_ITEMS_WAITING.dec(cancelled)
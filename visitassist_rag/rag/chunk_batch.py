@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import uuid
+from array import array
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+from visitassist_rag.rag.chunking import SectionCuts
+
+
+CHUNK_TYPES = ("summary", "section", "fine")
+_CHUNK_TYPE_CODE = {t: i for i, t in enumerate(CHUNK_TYPES)}
+
+
+@dataclass(slots=True)
+class Chunk:
+    """Row view of a single chunk (same fields `insert_chunk` reads)."""
+
+    doc_id: str
+    section_id: Optional[str]
+    chunk_type: str  # summary|section|fine
+    chunk_index: int
+    chunk_text: str
+    section_path: Optional[str] = None
+    start_char: Optional[int] = None
+    end_char: Optional[int] = None
+    chunk_id: Optional[str] = None
+    token_count: Optional[int] = None
+
+
+class ChunkBatch:
+    """Columnar storage for the chunks of one or more documents.
+
+    Chunk text is never copied at build time: each chunk is a (section, start_char,
+    end_char) reference into its section text, and the per-chunk columns are
+    parallel arrays. `Chunk` rows are materialized only on demand.
+    """
+
+    __slots__ = (
+        "doc_ids",
+        "doc_meta",
+        "section_ids",
+        "section_paths",
+        "section_texts",
+        "section_doc",
+        "chunk_ids",
+        "chunk_section",
+        "chunk_type",
+        "chunk_index",
+        "start_char",
+        "end_char",
+        "token_count",
+    )
+
+    def __init__(self) -> None:
+        # Documents.
+        self.doc_ids: list[str] = []
+        self.doc_meta: list[dict[str, Any]] = []
+        # Sections.
+        self.section_ids: list[str] = []
+        self.section_paths: list[str] = []
+        self.section_texts: list[str] = []
+        self.section_doc = array("I")
+        # Chunks.
+        self.chunk_ids: list[str] = []
+        self.chunk_section = array("I")
+        self.chunk_type = array("B")
+        self.chunk_index = array("I")
+        self.start_char = array("I")
+        self.end_char = array("I")
+        self.token_count = array("I")
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def add_doc(self, doc_id: str, meta: Optional[dict[str, Any]] = None) -> int:
+        """Register a document; `meta` is the Pinecone metadata shared by its chunks."""
+        self.doc_ids.append(doc_id)
+        self.doc_meta.append(meta or {})
+        return len(self.doc_ids) - 1
+
+    def add_section(self, doc: int, section_id: str, section_path: str, section_text: str) -> int:
+        self.section_ids.append(section_id)
+        self.section_paths.append(section_path)
+        self.section_texts.append(section_text)
+        self.section_doc.append(doc)
+        return len(self.section_ids) - 1
+
+    def add_chunk(self, section: int, chunk_type: str, chunk_index: int, start: int, end: int, tokens: int = 0) -> int:
+        self.chunk_ids.append(str(uuid.uuid4()))
+        self.chunk_section.append(section)
+        self.chunk_type.append(_CHUNK_TYPE_CODE[chunk_type])
+        self.chunk_index.append(chunk_index)
+        self.start_char.append(start)
+        self.end_char.append(end)
+        self.token_count.append(tokens)
+        return len(self.chunk_ids) - 1
+
+    def add_cuts(self, section: int, cuts: SectionCuts) -> None:
+        """Append the summary, section and fine chunks of one section (in that order)."""
+        if cuts.summary:
+            self.add_chunk(section, "summary", 0, *cuts.summary)
+        for j, sp in enumerate(cuts.section):
+            self.add_chunk(section, "section", j, *sp)
+        for k, sp in enumerate(cuts.fine):
+            self.add_chunk(section, "fine", k, *sp)
+
+    def doc_of(self, i: int) -> int:
+        return self.section_doc[self.chunk_section[i]]
+
+    def text(self, i: int) -> str:
+        return self.section_texts[self.chunk_section[i]][self.start_char[i]:self.end_char[i]]
+
+    def texts(self) -> list[str]:
+        return [self.text(i) for i in range(len(self))]
+
+    def chunk(self, i: int) -> Chunk:
+        sec = self.chunk_section[i]
+        return Chunk(
+            doc_id=self.doc_ids[self.section_doc[sec]],
+            section_id=self.section_ids[sec],
+            chunk_type=CHUNK_TYPES[self.chunk_type[i]],
+            chunk_index=self.chunk_index[i],
+            chunk_text=self.text(i),
+            section_path=self.section_paths[sec],
+            start_char=self.start_char[i],
+            end_char=self.end_char[i],
+            chunk_id=self.chunk_ids[i],
+            token_count=self.token_count[i],
+        )
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for i in range(len(self)):
+            yield self.chunk(i)
+
+    def metadata(self, i: int) -> dict[str, Any]:
+        """Pinecone metadata for chunk i: the document's shared metadata + chunk fields."""
+        sec = self.chunk_section[i]
+        meta = dict(self.doc_meta[self.section_doc[sec]])
+        meta.update({
+            "doc_id": self.doc_ids[self.section_doc[sec]],
+            "chunk_type": CHUNK_TYPES[self.chunk_type[i]],
+            "section_path": self.section_paths[sec] or "",
+            "section_id": self.section_ids[sec] or "",
+            "chunk_index": self.chunk_index[i],
+            "chunk_text": self.text(i),
+            "token_count": self.token_count[i],
+        })
+        return meta
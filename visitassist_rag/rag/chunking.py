@@ -1,12 +1,42 @@
 # Placeholder for chunking logic
 import re
-import tiktoken
-from typing import List, Tuple
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import List, NamedTuple, Optional, Tuple
+
+_TOKENIZER = None
+_TOKENIZER_LOCK = threading.Lock()
+
+
+def get_tokenizer():
+    """The cl100k_base encoder, loaded on first use (it is slow to build)."""
+    global _TOKENIZER
+    if _TOKENIZER is None:
+        with _TOKENIZER_LOCK:
+            if _TOKENIZER is None:
+                import tiktoken
+
+                _TOKENIZER = tiktoken.get_encoding("cl100k_base")
+    return _TOKENIZER
+
+
+def __getattr__(name: str):
+    # Backwards compatibility: `from chunking import TOKENIZER` still works, lazily.
+    if name == "TOKENIZER":
+        return get_tokenizer()
+    raise AttributeError(name)
+
+# Paragraph / sentence boundaries, matched on the UTF-8 bytes so that token and
+# text positions share one coordinate system.
+_PARAGRAPH_SEP_RE = re.compile(rb"\n\s*\n")
+_SENTENCE_SEP_RE = re.compile(rb"(?<=[.!?])\s+")
+_WS = frozenset(b" \t\n\r\x0b\x0c")
 
-TOKENIZER = tiktoken.get_encoding("cl100k_base")
 
 def count_tokens(text: str) -> int:
-    return len(TOKENIZER.encode(text))
+    return len(get_tokenizer().encode(text))
 
 def normalize_ws(text: str) -> str:
     text = text.replace("\r\n", "\n").replace("\r", "\n")
@@ -18,49 +48,229 @@ def split_paragraphs(text: str) -> List[str]:
     parts = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
     return parts
 
-def chunk_by_tokens(paragraphs: List[str], target_tokens: int, overlap_tokens: int) -> List[str]:
-    chunks: List[str] = []
-    buf: List[str] = []
-    buf_tokens = 0
-
-    for p in paragraphs:
-        t = count_tokens(p)
-        if t > target_tokens:
-            sentences = re.split(r"(?<=[.!?])\s+", p)
-            for s in sentences:
-                st = count_tokens(s)
-                if buf_tokens + st > target_tokens and buf:
-                    chunks.append(" ".join(buf).strip())
-                    if overlap_tokens > 0:
-                        chunks[-1] = chunks[-1]
-                    buf = []
-                    buf_tokens = 0
-                buf.append(s)
-                buf_tokens += st
+
+class TextSpan(NamedTuple):
+    """A chunk cut from a tokenized text: [start, end) character offsets + token count."""
+
+    start: int
+    end: int
+    tokens: int
+
+
+@dataclass(frozen=True)
+class TokenizedText:
+    """A text tokenized exactly once.
+
+    `ends[i]` is the UTF-8 byte offset where token i ends. Every chunk size, overlap
+    and summary cut is computed from this array instead of re-encoding substrings.
+    """
+
+    text: str
+    data: bytes
+    ends: List[int]
+
+    @property
+    def n_tokens(self) -> int:
+        return len(self.ends)
+
+    def token_at(self, b: int) -> int:
+        """Index of the token containing byte `b`."""
+        return bisect_right(self.ends, b)
+
+    def tokens_between(self, b0: int, b1: int) -> int:
+        if b1 <= b0:
+            return 0
+        return bisect_left(self.ends, b1) + 1 - self.token_at(b0)
+
+    def token_start(self, i: int) -> int:
+        """Byte offset where token i starts."""
+        return self.ends[i - 1] if i > 0 else 0
+
+
+_TOKEN_BYTE_LENGTHS: List[int] = []
+
+
+def _token_byte_lengths() -> List[int]:
+    # Built once per process; turns per-token decode calls into a list lookup.
+    if not _TOKEN_BYTE_LENGTHS:
+        enc = get_tokenizer()
+        lengths = []
+        for tok in range(enc.n_vocab):
+            try:
+                lengths.append(len(enc.decode_single_token_bytes(tok)))
+            except KeyError:
+                lengths.append(0)
+        _TOKEN_BYTE_LENGTHS[:] = lengths
+    return _TOKEN_BYTE_LENGTHS
+
+
+def tokenize(text: str) -> TokenizedText:
+    data = (text or "").encode("utf-8")
+    toks = get_tokenizer().encode(text or "")
+    ends = list(accumulate(map(_token_byte_lengths().__getitem__, toks)))
+    return TokenizedText(text=text or "", data=data, ends=ends)
+
+
+def _snap(data: bytes, b: int) -> int:
+    # Byte-level BPE can split a multi-byte character; never cut inside one.
+    n = len(data)
+    while b < n and (data[b] & 0xC0) == 0x80:
+        b += 1
+    return b
+
+
+def _strip(data: bytes, b0: int, b1: int) -> Tuple[int, int]:
+    while b0 < b1 and data[b0] in _WS:
+        b0 += 1
+    while b1 > b0 and data[b1 - 1] in _WS:
+        b1 -= 1
+    return b0, b1
+
+
+def _split(data: bytes, sep: "re.Pattern[bytes]", b0: int, b1: int) -> List[Tuple[int, int]]:
+    out: List[Tuple[int, int]] = []
+    pos = b0
+    for m in sep.finditer(data, b0, b1):
+        s, e = _strip(data, pos, m.start())
+        if e > s:
+            out.append((s, e))
+        pos = m.end()
+    s, e = _strip(data, pos, b1)
+    if e > s:
+        out.append((s, e))
+    return out
+
+
+def _units(tt: TokenizedText, target_tokens: int) -> List[Tuple[int, int, int]]:
+    """Paragraphs, falling back to sentences and then hard token windows when too long."""
+    units: List[Tuple[int, int, int]] = []
+    data = tt.data
+    for p0, p1 in _split(data, _PARAGRAPH_SEP_RE, 0, len(data)):
+        t = tt.tokens_between(p0, p1)
+        if t <= target_tokens:
+            units.append((p0, p1, t))
             continue
+        for s0, s1 in _split(data, _SENTENCE_SEP_RE, p0, p1):
+            st = tt.tokens_between(s0, s1)
+            if st <= target_tokens:
+                units.append((s0, s1, st))
+                continue
+            # A single "sentence" longer than the target (tables, lists without
+            # punctuation): cut it on token boundaries.
+            i, i_end = tt.token_at(s0), tt.token_at(s1 - 1) + 1
+            while i < i_end:
+                j = min(i + target_tokens, i_end)
+                w0 = max(s0, _snap(data, tt.token_start(i)))
+                w1 = min(s1, _snap(data, tt.ends[j - 1]))
+                w0, w1 = _strip(data, w0, w1)
+                if w1 > w0:
+                    units.append((w0, w1, j - i))
+                i = j
+    return units
+
+
+def _to_char_spans(tt: TokenizedText, byte_spans: List[Tuple[int, int, int]]) -> List[TextSpan]:
+    if tt.text.isascii():
+        return [TextSpan(b0, b1, t) for b0, b1, t in byte_spans]
+    # Convert byte offsets to character offsets in one pass over sorted positions.
+    positions = sorted({b for b0, b1, _t in byte_spans for b in (b0, b1)})
+    char_of = {}
+    prev_b, prev_c = 0, 0
+    for b in positions:
+        prev_c += len(tt.data[prev_b:b].decode("utf-8"))
+        prev_b = b
+        char_of[b] = prev_c
+    return [TextSpan(char_of[b0], char_of[b1], t) for b0, b1, t in byte_spans]
+
 
-        if buf_tokens + t > target_tokens and buf:
-            chunks.append(" ".join(buf).strip())
+def token_windows(tt: TokenizedText, target_tokens: int, overlap_tokens: int) -> List[TextSpan]:
+    """Pack paragraphs into chunks of ~target_tokens, with a token overlap between chunks.
+
+    Chunks are contiguous character spans of `tt.text`, so `tt.text[s.start:s.end]`
+    is the chunk text.
+    """
+    data = tt.data
+    out: List[Tuple[int, int, int]] = []
+    cur_start: Optional[int] = None
+    cur_end = 0
+    cur_tokens = 0
+
+    for u0, u1, t in _units(tt, target_tokens):
+        if cur_start is not None and cur_tokens + t > target_tokens:
+            out.append((cur_start, cur_end, cur_tokens))
+            cur_start = None
+            cur_tokens = 0
             if overlap_tokens > 0:
-                tail = take_tail_tokens(chunks[-1], overlap_tokens)
-                buf = [tail] if tail else []
-                buf_tokens = count_tokens(tail) if tail else 0
-            else:
-                buf = []
-                buf_tokens = 0
+                first = tt.token_at(out[-1][0])
+                last = tt.token_at(cur_end - 1) + 1
+                tail = max(first, last - overlap_tokens)
+                o0, o1 = _strip(data, max(out[-1][0], _snap(data, tt.token_start(tail))), cur_end)
+                if o1 > o0:
+                    cur_start = o0
+                    cur_tokens = last - tail
+        if cur_start is None:
+            cur_start = u0
+        cur_end = u1
+        cur_tokens += t
 
-        buf.append(p)
-        buf_tokens += t
+    if cur_start is not None:
+        out.append((cur_start, cur_end, cur_tokens))
+    return _to_char_spans(tt, out)
+
+
+def head_span(tt: TokenizedText, max_tokens: int) -> Optional[TextSpan]:
+    """The first `max_tokens` tokens of the text (whitespace-trimmed), or None if empty."""
+    if not tt.ends:
+        return None
+    n = min(max_tokens, tt.n_tokens)
+    b0, b1 = _strip(tt.data, 0, _snap(tt.data, tt.ends[n - 1]))
+    if b1 <= b0:
+        return None
+    return _to_char_spans(tt, [(b0, b1, n)])[0]
 
-    if buf:
-        chunks.append(" ".join(buf).strip())
 
-    return [c for c in chunks if c]
+@dataclass(frozen=True)
+class SectionCuts:
+    summary: Optional[TextSpan]
+    section: List[TextSpan]
+    fine: List[TextSpan]
+
+
+def cut_section(
+    text: str,
+    *,
+    section_tokens: int = 900,
+    section_overlap: int = 100,
+    fine_tokens: int = 180,
+    fine_overlap: int = 30,
+    summary_tokens: int = 220,
+) -> SectionCuts:
+    """Tokenize a section once and cut its summary, section and fine chunks from it.
+
+    Offsets are character offsets into `text` (i.e. into `rag_sections.section_text`).
+    """
+    tt = tokenize(text)
+    if tt.n_tokens <= section_tokens:
+        whole = head_span(tt, tt.n_tokens)
+        section = [whole] if whole else []
+    else:
+        section = token_windows(tt, section_tokens, section_overlap)
+    return SectionCuts(
+        summary=head_span(tt, summary_tokens),
+        section=section,
+        fine=token_windows(tt, fine_tokens, fine_overlap),
+    )
+
+
+def chunk_by_tokens(paragraphs: List[str], target_tokens: int, overlap_tokens: int) -> List[str]:
+    tt = tokenize("\n\n".join(paragraphs))
+    return [tt.text[s.start:s.end] for s in token_windows(tt, target_tokens, overlap_tokens)]
 
 def take_tail_tokens(text: str, tail_tokens: int) -> str:
-    toks = TOKENIZER.encode(text)
+    enc = get_tokenizer()
+    toks = enc.encode(text)
     tail = toks[-tail_tokens:] if len(toks) > tail_tokens else toks
-    return TOKENIZER.decode(tail).strip()
+    return enc.decode(tail).strip()
 
 def build_sections(text: str) -> List[Tuple[str, str]]:
     lines = text.split("\n")
@@ -0,0 +1,202 @@
+"""Query-focused extractive compression of grounding sources.
+
+Optional stage between candidate selection and grounded_answer: each source is
+split into sentences and only the sentences that score well against the question
+are kept, in their original order (gaps marked with "…"). The compressed text is
+stored on the candidate as `context_text`; `metadata.chunk_text` is untouched, so
+the answer guards and the returned snippets still see the full chunk. Sources
+keep their position, so [S#] numbering and citations are unchanged, and the
+debug trace lists which sentences of each [S#] were kept.
+
+Scoring is either "lexical" (idf-weighted overlap of question terms, accent- and
+case-insensitive) or "embedding" (cosine between the query vector and sentence
+embeddings, cached per process).
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+
+from visitassist_rag.memory import register_cache
+from visitassist_rag.rag.chunking import count_tokens
+
+# "off", "lexical" or "embedding".
+CONTEXT_COMPRESSION = os.getenv("VISITASSIST_CONTEXT_COMPRESSION", "off").strip().lower()
+# Sentences scoring below this fraction of the best sentence of their source are dropped.
+COMPRESSION_KEEP_RATIO = float(os.getenv("VISITASSIST_COMPRESSION_KEEP_RATIO", "0.35"))
+# Sources shorter than this are passed through whole.
+COMPRESSION_MIN_SOURCE_TOKENS = int(os.getenv("VISITASSIST_COMPRESSION_MIN_SOURCE_TOKENS", "120"))
+SENTENCE_EMBEDDING_CACHE_MAX = int(os.getenv("VISITASSIST_SENTENCE_EMBEDDING_CACHE_MAX", "20000"))
+
+GAP_MARKER = " … "
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;])\s+|\n+")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    """
+    a o as os um uma uns umas de da do das dos em na no nas nos por para com sem que qual quais quando onde como
+    e ou se ao aos à às é são foi ser ter tem há mais menos muito sobre entre até desde pelo pela pelos pelas
+    the an of to in on for with and or is are was be what which when where how who does do can
+    el la los las un una y en por para con que cual cuando donde como es son
+    """.split()
+)
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT_RE.split(text or "") if s and s.strip()]
+
+
+def _terms(text: str) -> set[str]:
+    folded = unicodedata.normalize("NFKD", (text or "").lower())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    out = set()
+    for w in _WORD_RE.findall(folded):
+        if w in _STOPWORDS or (len(w) < 3 and not w.isdigit()):
+            continue
+        # Crude stemming: Portuguese/Spanish inflections mostly change the ending.
+        out.add(w[:6] if not w.isdigit() else w)
+    return out
+
+
+def lexical_scores(question: str, sentences: list[str]) -> list[float]:
+    q = _terms(question)
+    sent_terms = [_terms(s) for s in sentences]
+    n = len(sentences)
+    df = {t: sum(1 for st in sent_terms if t in st) for t in q}
+    idf = {t: math.log(1.0 + n / df[t]) for t in q if df[t]}
+    return [sum(idf.get(t, 0.0) for t in st & q) for st in sent_terms]
+
+
+class _EmbeddingCache:
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def size(self) -> dict[str, int]:
+        with self._lock:
+            nbytes = sum(v.nbytes for v in self._items.values())
+            return {"items": len(self._items), "max_items": self.max_items, "approx_bytes": nbytes}
+
+    def get_many(self, texts: list[str]) -> np.ndarray:
+        keys = [hashlib.sha1(t.encode("utf-8")).hexdigest() for t in texts]
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for k in keys:
+                v = self._items.get(k)
+                if v is not None:
+                    self._items.move_to_end(k)
+                    found[k] = v
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing:
+            from visitassist_rag.rag.embeddings import embed_texts
+
+            text_of = dict(zip(keys, texts))
+            vecs = embed_texts([text_of[k] for k in missing])
+            with self._lock:
+                for k, v in zip(missing, vecs):
+                    found[k] = v
+                    self._items[k] = v
+                while len(self._items) > self.max_items:
+                    self._items.popitem(last=False)
+        return np.stack([found[k] for k in keys])
+
+
+sentence_embeddings = _EmbeddingCache(SENTENCE_EMBEDDING_CACHE_MAX)
+register_cache("sentence_embeddings", sentence_embeddings.size)
+
+
+def embedding_scores(question: str, sentences: list[str], query_vector=None) -> list[float]:
+    if query_vector is None:
+        from visitassist_rag.rag.retrieval import embed_query
+
+        query_vector = embed_query(question)
+    q = np.asarray(query_vector, dtype=np.float32)
+    m = sentence_embeddings.get_many(sentences)
+    sims = (m @ q) / (np.linalg.norm(m, axis=1) * (np.linalg.norm(q) or 1.0) + 1e-9)
+    return [float(x) for x in sims]
+
+
+def _join_kept(sentences: list[str], kept: list[int]) -> str:
+    parts: list[str] = []
+    prev = None
+    for i in kept:
+        if parts:
+            parts.append(" " if prev == i - 1 else GAP_MARKER)
+        parts.append(sentences[i])
+        prev = i
+    return "".join(parts)
+
+
+def compress_sources(
+    question: str,
+    candidates: list[dict],
+    *,
+    method: str = CONTEXT_COMPRESSION,
+    query_vector=None,
+    keep_ratio: float = COMPRESSION_KEEP_RATIO,
+    min_source_tokens: int = COMPRESSION_MIN_SOURCE_TOKENS,
+) -> tuple[list[dict], Optional[dict[str, Any]]]:
+    """Return copies of `candidates` with `context_text` set, and a trace.
+
+    `method="off"` returns the candidates unchanged and no trace. The keep floor
+    is relative to each source's best sentence, so every compressed source keeps
+    at least that one. A source where no sentence scores above 0 (no overlap
+    with the question's wording) is passed through whole: the reranker chose it,
+    and its answer may be phrased differently.
+    """
+    if method not in ("lexical", "embedding") or not candidates:
+        return candidates, None
+
+    texts = [(c.get("metadata") or {}).get("chunk_text", "") or "" for c in candidates]
+    tokens_before = [count_tokens(t) for t in texts]
+    split = [split_sentences(t) if n >= min_source_tokens else [] for t, n in zip(texts, tokens_before)]
+    flat = [s for sents in split for s in sents]
+    if not flat:
+        return candidates, {"method": method, "sources": []}
+
+    scores = embedding_scores(question, flat, query_vector) if method == "embedding" else lexical_scores(question, flat)
+
+    out: list[dict] = []
+    rows: list[dict[str, Any]] = []
+    pos = 0
+    for i, (c, text, sents) in enumerate(zip(candidates, texts, split), start=1):
+        if not sents:
+            out.append(c)
+            rows.append({"s": i, "sentences": None, "kept": None, "tokens": tokens_before[i - 1], "compressed_tokens": tokens_before[i - 1]})
+            continue
+        own = scores[pos:pos + len(sents)]
+        pos += len(sents)
+        best = max(own)
+        if best <= 0:
+            out.append(c)
+            rows.append({"s": i, "sentences": len(sents), "kept": None, "tokens": tokens_before[i - 1], "compressed_tokens": tokens_before[i - 1]})
+            continue
+        kept = [j for j, sc in enumerate(own) if sc > 0 and sc >= best * keep_ratio]
+        compressed = _join_kept(sents, kept)
+        out.append({**c, "context_text": compressed})
+        rows.append({
+            "s": i,
+            "sentences": len(sents),
+            "kept": kept,
+            "tokens": tokens_before[i - 1],
+            "compressed_tokens": count_tokens(compressed),
+        })
+
+    trace = {
+        "method": method,
+        "keep_ratio": keep_ratio,
+        "tokens_before": sum(r["tokens"] for r in rows),
+        "tokens_after": sum(r["compressed_tokens"] for r in rows),
+        "sources": rows,
+    }
+    return out, trace
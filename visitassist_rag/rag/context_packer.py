@@ -0,0 +1,126 @@
+"""Token-budgeted packing of grounding sources.
+
+The grounding prompt gets at most `budget` tokens of source text. The budget is
+split across sources by rank (weight `decay ** rank`); sources shorter than their
+share keep their full text and hand the rest to the others. A source over its
+share is cut at the last sentence boundary that fits. Token counts come from the
+`token_count` chunk metadata written at ingest; older vectors without it are
+counted here.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from visitassist_rag.rag.chunking import count_tokens, get_tokenizer
+
+# Sentence ends: terminal punctuation followed by whitespace, or a line break.
+_SENTENCE_END_RE = re.compile(r"[.!?;](?=\s)|\n")
+TRIM_MARKER = " …"
+
+
+@dataclass(frozen=True)
+class PackedSource:
+    text: str
+    tokens: int
+    source_tokens: int
+
+    @property
+    def trimmed(self) -> bool:
+        return self.tokens < self.source_tokens
+
+
+def source_token_count(metadata: dict[str, Any]) -> int:
+    n = metadata.get("token_count")
+    if isinstance(n, (int, float)) and n > 0:
+        return int(n)
+    return count_tokens(metadata.get("chunk_text", "") or "")
+
+
+def allocate_budget(sizes: list[int], budget: int, *, decay: float = 0.75) -> list[int]:
+    """Split `budget` tokens over sources of `sizes` tokens, by rank weight decay**i."""
+    alloc = [0] * len(sizes)
+    remaining = max(0, budget)
+    active = [i for i, n in enumerate(sizes) if n > 0]
+    while active and remaining > 0:
+        total_w = sum(decay ** i for i in active)
+        fits = [i for i in active if sizes[i] <= remaining * decay ** i / total_w]
+        if not fits:
+            for i in active:
+                alloc[i] = int(remaining * decay ** i / total_w)
+            break
+        for i in fits:
+            alloc[i] = sizes[i]
+            remaining -= sizes[i]
+        active = [i for i in active if i not in fits]
+    return alloc
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> tuple[str, int]:
+    """Longest sentence-aligned prefix of `text` within `max_tokens` (marker included)."""
+    marker_tokens = count_tokens(TRIM_MARKER)
+    limit = max_tokens - marker_tokens
+    if limit <= 0:
+        return "", 0
+    best_end, used, start = 0, 0, 0
+    for m in _SENTENCE_END_RE.finditer(text):
+        end = m.end()
+        n = count_tokens(text[start:end])
+        if used + n > limit:
+            break
+        best_end, used, start = end, used + n, end
+    if best_end == 0:
+        # First sentence alone is too long: cut at the last whole word that fits.
+        enc = get_tokenizer()
+        head = enc.decode(enc.encode(text)[:limit])
+        cut = head.rfind(" ")
+        head = (head[:cut] if cut > 0 else head).rstrip()
+        if not head:
+            return "", 0
+        return head + TRIM_MARKER, count_tokens(head) + marker_tokens
+    head = text[:best_end].rstrip()
+    return head + TRIM_MARKER, used + marker_tokens
+
+
+def pack_sources(
+    texts: list[str],
+    token_counts: list[int],
+    budget: int,
+    *,
+    decay: float = 0.75,
+    min_tokens: int = 40,
+) -> tuple[list[Optional[PackedSource]], dict[str, Any]]:
+    """Fit ranked source texts into `budget` tokens.
+
+    Returns one PackedSource per input (None for a source dropped because its share
+    was under `min_tokens`; the top source is never dropped) and a debug summary.
+    """
+    sizes = list(token_counts)
+    dropped: set[int] = set()
+    while True:
+        alloc = allocate_budget([0 if i in dropped else n for i, n in enumerate(sizes)], budget, decay=decay)
+        starved = [i for i in range(1, len(sizes)) if i not in dropped and alloc[i] < min(min_tokens, sizes[i])]
+        if not starved:
+            break
+        dropped.add(starved[-1])
+
+    packed: list[Optional[PackedSource]] = []
+    for i, (text, n) in enumerate(zip(texts, sizes)):
+        if i in dropped:
+            packed.append(None)
+        elif n <= alloc[i]:
+            packed.append(PackedSource(text, n, n))
+        else:
+            trimmed, used = trim_to_tokens(text, alloc[i])
+            packed.append(PackedSource(trimmed, used, n) if trimmed else None)
+
+    summary = {
+        "budget_tokens": budget,
+        "source_tokens": sum(sizes),
+        "packed_tokens": sum(p.tokens for p in packed if p is not None),
+        "sources": [
+            {"tokens": n, "packed_tokens": p.tokens if p else 0, "trimmed": bool(p and p.trimmed), "dropped": p is None}
+            for n, p in zip(sizes, packed)
+        ],
+    }
+    return packed, summary
@@ -0,0 +1,377 @@
+"""Site crawl ingestion: seed URL -> scoped breadth-first crawl -> batched ingest.
+
+Pages are fetched by a thread pool, with at most CRAWL_PER_HOST requests in flight
+per host and CRAWL_HOST_INTERVAL_S between request starts to the same host (or the
+site's robots.txt Crawl-delay, if larger). Each page goes through the same
+extraction and heuristics as the preview/confirm flow: too-small pages and
+link-heavy index pages are not ingested, but their links are still followed.
+Pages with a content hash already seen in this crawl are skipped, and so are
+registered URLs whose text has not changed since they were ingested (see
+url_refresh); a changed registered page replaces its old document.
+
+The coordinating thread owns the frontier and the dedupe sets; workers only
+fetch and extract, so no crawl state is shared between threads.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+from visitassist_rag.clients import get_http_session
+from visitassist_rag.rag.html_extract import extract_links
+from visitassist_rag.rag.ingest import ingest_text_documents
+from visitassist_rag.rag.url_ingest import (
+    UrlIngestError,
+    UrlPreview,
+    fetch_url_result,
+    looks_like_index_page,
+    normalize_url_key,
+    preview_from_html,
+)
+from visitassist_rag.rag.url_refresh import (
+    record_url_sources,
+    registered_url_sources,
+    retire_replaced_document,
+    unchanged_source_row,
+    url_source_row,
+)
+
+CRAWL_MAX_PAGES_LIMIT = int(os.getenv("VISITASSIST_CRAWL_MAX_PAGES_LIMIT", "1000"))
+CRAWL_CONCURRENCY = int(os.getenv("VISITASSIST_CRAWL_CONCURRENCY", "8"))
+CRAWL_PER_HOST = int(os.getenv("VISITASSIST_CRAWL_PER_HOST", "2"))
+CRAWL_HOST_INTERVAL_S = float(os.getenv("VISITASSIST_CRAWL_HOST_INTERVAL_S", "0.5"))
+# Pages sent to the ingest pipeline per call (one embedding/upsert round each).
+CRAWL_INGEST_BATCH = int(os.getenv("VISITASSIST_CRAWL_INGEST_BATCH", "16"))
+CRAWL_USER_AGENT = os.getenv("VISITASSIST_CRAWL_USER_AGENT", "VisitAssistBot")
+
+# Links to files we would only download to reject as non-HTML.
+_SKIP_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".ico", ".mp3", ".mp4", ".avi", ".mov",
+    ".zip", ".rar", ".gz", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".css", ".js", ".xml", ".json",
+)
+# Errors kept in the result; the rest are only counted.
+_MAX_REPORTED_ERRORS = 50
+
+
+@dataclass(frozen=True)
+class CrawlScope:
+    """Which URLs a crawl may visit: host list (optionally with subdomains) and a path prefix."""
+
+    hosts: tuple[str, ...]
+    include_subdomains: bool = False
+    path_prefix: str = "/"
+
+    def allows(self, url: str) -> bool:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            return False
+        host = (parts.hostname or "").lower()
+        if not any(
+            host == h or host == "www." + h or (self.include_subdomains and host.endswith("." + h))
+            for h in self.hosts
+        ):
+            return False
+        path = parts.path or "/"
+        if not path.startswith(self.path_prefix):
+            return False
+        return not path.lower().endswith(_SKIP_EXTENSIONS)
+
+
+def scope_for(
+    seed_url: str,
+    *,
+    allowed_domains: Optional[list[str]] = None,
+    include_subdomains: bool = False,
+    path_prefix: Optional[str] = None,
+) -> CrawlScope:
+    """Scope from a request; defaults to the seed's host (with or without www.)."""
+    seed_host = (urlsplit(seed_url).hostname or "").lower()
+    hosts = [d.strip().lower() for d in (allowed_domains or []) if d and d.strip()] or [seed_host]
+    hosts = [h[4:] if h.startswith("www.") else h for h in hosts]
+    prefix = (path_prefix or "/").strip() or "/"
+    if not prefix.startswith("/"):
+        prefix = "/" + prefix
+    return CrawlScope(tuple(dict.fromkeys(hosts)), include_subdomains, prefix)
+
+
+class HostLimiter:
+    """Per-host politeness: concurrent request cap and minimum spacing of request starts."""
+
+    def __init__(self, per_host: int = CRAWL_PER_HOST, min_interval_s: float = CRAWL_HOST_INTERVAL_S):
+        self.per_host = max(1, per_host)
+        self.min_interval_s = max(0.0, min_interval_s)
+        self._lock = threading.Lock()
+        self._slots: dict[str, threading.Semaphore] = {}
+        self._next_start: dict[str, float] = {}
+        self._intervals: dict[str, float] = {}
+
+    def set_interval(self, host: str, seconds: float) -> None:
+        with self._lock:
+            self._intervals[host] = max(self.min_interval_s, seconds)
+
+    @contextmanager
+    def slot(self, host: str) -> Iterator[None]:
+        with self._lock:
+            sem = self._slots.setdefault(host, threading.Semaphore(self.per_host))
+        with sem:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, 0.0))
+                self._next_start[host] = start + self._intervals.get(host, self.min_interval_s)
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+
+def _load_robots(scheme: str, host: str, *, timeout_s: float = 10.0) -> Optional[RobotFileParser]:
+    """robots.txt of a site; None when it is missing or unreachable (crawl allowed)."""
+    try:
+        resp = get_http_session().get(
+            f"{scheme}://{host}/robots.txt", headers={"User-Agent": CRAWL_USER_AGENT}, timeout=timeout_s
+        )
+    except Exception:
+        return None
+    try:
+        if resp.status_code >= 400:
+            return None
+        rp = RobotFileParser()
+        rp.parse(resp.text.splitlines())
+        return rp
+    finally:
+        resp.close()
+
+
+@dataclass
+class _Page:
+    url: str
+    depth: int
+    final_url: str = ""
+    links: list[str] = field(default_factory=list)
+    preview: Optional[UrlPreview] = None
+    # Why the page is not ingested: fetch_error or too_small.
+    skip: Optional[str] = None
+    error: Optional[str] = None
+
+
+def _fetch_page(url: str, depth: int, limiter: HostLimiter, *, min_chars: int, timeout_s: float) -> _Page:
+    page = _Page(url, depth)
+    host = (urlsplit(url).hostname or "").lower()
+    try:
+        with limiter.slot(host):
+            # The agent whose robots.txt rules we follow.
+            res = fetch_url_result(url, timeout_s=timeout_s, user_agent=CRAWL_USER_AGENT)
+    except UrlIngestError as e:
+        page.skip, page.error = "fetch_error", str(e)
+        return page
+    page.final_url = res.final_url
+    page.links = extract_links(res.html, res.final_url)
+    try:
+        page.preview = preview_from_html(url, res.html, res.final_url, min_chars=min_chars, fetch=res)
+    except UrlIngestError as e:
+        page.skip, page.error = "too_small", str(e)
+    return page
+
+
+def crawl_site(
+    kb_id: str,
+    seed_url: str,
+    *,
+    max_pages: int = 100,
+    max_depth: int = 3,
+    allowed_domains: Optional[list[str]] = None,
+    include_subdomains: bool = False,
+    path_prefix: Optional[str] = None,
+    respect_robots: bool = True,
+    include_index_pages: bool = False,
+    min_chars: int = 500,
+    language: str = "pt",
+    doc_date: Optional[str] = None,
+    doc_year: Optional[int] = None,
+    concurrency: int = CRAWL_CONCURRENCY,
+    per_host: int = CRAWL_PER_HOST,
+    host_interval_s: float = CRAWL_HOST_INTERVAL_S,
+    ingest_batch: int = CRAWL_INGEST_BATCH,
+    timeout_s: float = 15.0,
+    on_progress: Optional[Callable[..., None]] = None,
+    on_stage: Optional[Callable[[str, float], None]] = None,
+) -> dict[str, Any]:
+    """Crawl from `seed_url` and ingest every in-scope content page; see module docstring.
+
+    At most `max_pages` pages are fetched, following links up to `max_depth` hops
+    from the seed. Each page becomes one document (source_type "url", source_uri
+    the final URL after redirects).
+    """
+    max_pages = max(1, min(int(max_pages), CRAWL_MAX_PAGES_LIMIT))
+    scope = scope_for(seed_url, allowed_domains=allowed_domains, include_subdomains=include_subdomains, path_prefix=path_prefix)
+    limiter = HostLimiter(per_host, host_interval_s)
+    robots: dict[str, Optional[RobotFileParser]] = {}
+
+    def robots_allows(url: str) -> bool:
+        if not respect_robots:
+            return True
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        if host not in robots:
+            robots[host] = rp = _load_robots(parts.scheme, parts.netloc)
+            delay = rp.crawl_delay(CRAWL_USER_AGENT) if rp is not None else None
+            if delay:
+                limiter.set_interval(host, float(delay))
+        rp = robots[host]
+        return rp is None or rp.can_fetch(CRAWL_USER_AGENT, url)
+
+    seen_urls: set[str] = set()
+    seen_hashes: set[str] = set()
+    frontier: deque[tuple[str, int]] = deque()
+    skipped: dict[str, int] = {}
+    errors: list[dict[str, str]] = []
+    documents: list[dict[str, Any]] = []
+    buffer: list[tuple[_Page, dict[str, Any]]] = []
+    totals = {"chunks": 0, "embedding_requests": 0, "upsert_batches": 0}
+    fetched = 0
+    t0 = time.perf_counter()
+
+    def enqueue(url: str, depth: int) -> None:
+        key = normalize_url_key(url)
+        if key in seen_urls or not scope.allows(url):
+            return
+        seen_urls.add(key)
+        frontier.append((url, depth))
+
+    def skip(reason: str, url: str, message: Optional[str] = None) -> None:
+        skipped[reason] = skipped.get(reason, 0) + 1
+        if message and len(errors) < _MAX_REPORTED_ERRORS:
+            errors.append({"url": url, "reason": reason, "message": message})
+
+    def report() -> None:
+        if on_progress is None:
+            return
+        elapsed = time.perf_counter() - t0
+        on_progress(
+            fetched=fetched,
+            queued=len(frontier),
+            ingested=sum(1 for d in documents if d["success"]),
+            failed=sum(1 for d in documents if not d["success"]),
+            skipped=dict(skipped),
+            pages_per_s=round(fetched / elapsed, 2) if elapsed > 0 else 0.0,
+        )
+
+    def flush() -> None:
+        if not buffer:
+            return
+        # Pages already registered keep one live document: unchanged text is only
+        # revalidated, changed text replaces the old document once the new one is in.
+        rows = [
+            url_source_row(kb_id, None, page.preview, language=language, doc_date=doc_date, doc_year=doc_year)
+            for page, _ in buffer
+        ]
+        existing = registered_url_sources(kb_id, [row["source_uri"] for row in rows])
+        kept, pending = [], []
+        for (page, doc), row in zip(buffer, rows):
+            same = unchanged_source_row(existing.get(row["source_uri"]), row)
+            if same is not None:
+                kept.append(same)
+                skip("unchanged", page.final_url)
+            else:
+                pending.append((page, doc, row))
+        record_url_sources(kept)
+        buffer.clear()
+        if not pending:
+            return
+        out = ingest_text_documents(kb_id, [doc for _, doc, _ in pending], on_stage=on_stage)
+        for (page, doc, _), r in zip(pending, out.results):
+            documents.append({
+                "url": page.final_url,
+                "depth": page.depth,
+                "title": doc["title"],
+                "success": r.success,
+                "doc_id": r.doc_id,
+                "chunks": r.chunks,
+                "message": r.message,
+            })
+        for k in totals:
+            totals[k] += getattr(out, k)
+        ingested = [(row, r.doc_id) for (_, _, row), r in zip(pending, out.results) if r.success and r.doc_id]
+        record_url_sources([{**row, "doc_id": doc_id} for row, doc_id in ingested])
+        for row, _ in ingested:
+            retire_replaced_document(kb_id, row["source_uri"], (existing.get(row["source_uri"]) or {}).get("doc_id"))
+
+    def handle(page: _Page) -> None:
+        # Redirects: the final URL counts as seen too, so it is not fetched again.
+        if page.final_url:
+            seen_urls.add(normalize_url_key(page.final_url))
+            # A redirect can leave the scope (or land on a disallowed path): drop the page and its links.
+            if not scope.allows(page.final_url):
+                skip("redirect_out_of_scope", page.url, f"redirected to {page.final_url}")
+                return
+            if not robots_allows(page.final_url):
+                skip("robots", page.final_url)
+                return
+        if page.depth < max_depth:
+            for link in page.links:
+                enqueue(link, page.depth + 1)
+        if page.preview is None:
+            skip(page.skip or "fetch_error", page.url, page.error)
+            return
+        preview = page.preview
+        if not include_index_pages and looks_like_index_page(preview.link_count, preview.link_density):
+            skip("index_page", page.final_url)
+            return
+        if preview.content_hash in seen_hashes:
+            skip("duplicate", page.final_url)
+            return
+        seen_hashes.add(preview.content_hash)
+        buffer.append((page, {
+            "title": preview.title,
+            "text": preview.text,
+            "source_type": "url",
+            "source_uri": preview.final_url,
+            "language": language,
+            "doc_date": doc_date,
+            "doc_year": doc_year,
+        }))
+        if len(buffer) >= max(1, ingest_batch):
+            flush()
+
+    enqueue(seed_url.strip(), 0)
+    if not frontier:
+        raise UrlIngestError("Seed URL is outside the crawl scope")
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="crawl") as pool:
+        inflight: set[Future] = set()
+        while frontier or inflight:
+            while frontier and len(inflight) < max(1, concurrency) and fetched + len(inflight) < max_pages:
+                url, depth = frontier.popleft()
+                if not robots_allows(url):
+                    skip("robots", url)
+                    continue
+                inflight.add(pool.submit(_fetch_page, url, depth, limiter, min_chars=min_chars, timeout_s=timeout_s))
+            if not inflight:
+                break
+            done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+            for f in done:
+                fetched += 1
+                handle(f.result())
+            report()
+        flush()
+
+    elapsed = time.perf_counter() - t0
+    report()
+    return {
+        "seed_url": seed_url,
+        "pages_fetched": fetched,
+        "pages_ingested": sum(1 for d in documents if d["success"]),
+        "not_visited": len(frontier),
+        "skipped": skipped,
+        "errors": errors,
+        "documents": documents,
+        "elapsed_s": round(elapsed, 2),
+        "pages_per_s": round(fetched / elapsed, 2) if elapsed > 0 else 0.0,
+        **totals,
+    }
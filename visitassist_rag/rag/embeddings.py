@@ -1,14 +1,93 @@
+import base64
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-load_dotenv()
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from visitassist_rag import tracing
+from visitassist_rag.clients import get_openai
 
 EMBED_MODEL = "text-embedding-3-large"  # dim=3072
-oai = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
-    resp = oai.embeddings.create(
+
+def decode_embeddings(data) -> np.ndarray:
+    """Decode base64 float32 embeddings into one contiguous (n, dim) float32 array.
+
+    `data` is the API response's `data` list. Rows are ordered by their `index`.
+    The result is a read-only view over the concatenated decoded bytes (no per-float
+    Python objects are ever created).
+    """
+    items = sorted(data, key=lambda d: d.index)
+    if not items:
+        return np.empty((0, 0), dtype=np.float32)
+    raw = b"".join(base64.b64decode(d.embedding) for d in items)
+    return np.frombuffer(raw, dtype="<f4").reshape(len(items), -1)
+
+
+@tracing.traced("openai.embeddings")
+def embed_texts(texts: list[str]) -> np.ndarray:
+    """Embed texts; returns a float32 array of shape (len(texts), dim).
+
+    Rows are array views; convert with `.tolist()` only at a client boundary that
+    needs Python lists.
+    """
+    resp = get_openai().embeddings.create(
         model=EMBED_MODEL,
-        input=texts
+        input=texts,
+        encoding_format="base64",
     )
-    return [d.embedding for d in resp.data]
+    return decode_embeddings(resp.data)
+
+
+# OpenAI limits per embeddings request: 2048 inputs and 300k tokens in total.
+EMBED_MAX_INPUTS = int(os.getenv("VISITASSIST_EMBED_MAX_INPUTS", "2048"))
+EMBED_MAX_TOKENS = int(os.getenv("VISITASSIST_EMBED_MAX_TOKENS", "250000"))
+EMBED_CONCURRENCY = int(os.getenv("VISITASSIST_EMBED_CONCURRENCY", "2"))
+
+
+def plan_embedding_batches(
+    token_counts: list[int],
+    *,
+    max_inputs: int = EMBED_MAX_INPUTS,
+    max_tokens: int = EMBED_MAX_TOKENS,
+) -> list[tuple[int, int]]:
+    """Pack consecutive inputs into (start, end) requests that are as full as the limits allow."""
+    batches: list[tuple[int, int]] = []
+    start = 0
+    used = 0
+    for i, t in enumerate(token_counts):
+        if i > start and (i - start >= max_inputs or used + t > max_tokens):
+            batches.append((start, i))
+            start = i
+            used = 0
+        used += t
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+def embed_texts_packed(
+    texts: list[str],
+    token_counts: list[int] | None = None,
+    *,
+    concurrency: int | None = None,
+) -> tuple[np.ndarray, int]:
+    """Embed any number of texts in full-size requests; returns (vectors, request_count).
+
+    `token_counts` (e.g. from ChunkBatch) drive the packing; unknown counts (0/None)
+    are estimated from the text length.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32), 0
+    counts = [
+        (t if t else max(1, len(txt) // 3))
+        for txt, t in zip(texts, token_counts or [0] * len(texts))
+    ]
+    plan = plan_embedding_batches(counts)
+    workers = max(1, min(concurrency or EMBED_CONCURRENCY, len(plan)))
+    if workers == 1:
+        parts = [embed_texts(texts[s:e]) for s, e in plan]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+            parts = list(pool.map(lambda se: embed_texts(texts[se[0]:se[1]]), plan))
+    return (parts[0] if len(parts) == 1 else np.vstack(parts)), len(plan)
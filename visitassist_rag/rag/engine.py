@@ -1,9 +1,13 @@
-from visitassist_rag.rag.retrieval import pinecone_query
+from visitassist_rag.rag.retrieval import embed_query, pinecone_query
 from visitassist_rag.rag.rerank import llm_rerank
 from visitassist_rag.rag.grounding import grounded_answer
+from visitassist_rag.rag.compression import compress_sources
 from visitassist_rag.settings import settings
 from visitassist_rag.rag.dedupe import dedupe_snippets
+from visitassist_rag.rag.mode_profiles import get_mode_profile
 from visitassist_rag.rag.ingest import fallback_kb_id
+from visitassist_rag.metrics import QUERY_STAGE_SECONDS, StageTimer
+from visitassist_rag import profiling, tracing
 from visitassist_rag.models.schemas import QueryRequest, QueryResponse, Snippet
 
 import re
@@ -827,6 +831,8 @@ def _candidate_debug_row(c: dict) -> dict:
         "source_type": md.get("source_type"),
     }
 
+@profiling.profiled("query")
+@tracing.traced("rag_query", root=True)
 def rag_query(
     question: str,
     language: str = "pt",
@@ -836,9 +842,16 @@ def rag_query(
     debug_no_filter: bool = False,
     less_strict: bool = False,
     answer_style: str = "explicative",
+    query_vector=None,
     **kwargs,
 ):
     t0 = time.perf_counter()
+    style_label = "strict" if str(answer_style).lower().startswith("strict") else "explicative"
+    # Metric labels must stay bounded: unknown modes are labelled with the default profile's name.
+    timer = StageTimer(QUERY_STAGE_SECONDS, kb_id=kb_id or "", mode=get_mode_profile(mode).mode, answer_style=style_label)
+    tracing.annotate(kb_id=kb_id, mode=mode, answer_style=style_label, language=language)
+    if debug:
+        tracing.keep()
     # Mode-based source_type selection
     source_types = None
     if mode == "events":
@@ -851,21 +864,27 @@ def rag_query(
         source_types = ["faq"]
 
     cands = []
-    t_retr0 = time.perf_counter()
-    c_summary = pinecone_query(question, 1,  build_filter(kb_id, language, "summary", source_types, debug_no_filter, less_strict), namespace=kb_id)
-    c_section = pinecone_query(question, 8,  build_filter(kb_id, language, "section", source_types, debug_no_filter, less_strict), namespace=kb_id)
-    c_fine = pinecone_query(question, 18, build_filter(kb_id, language, "fine", source_types, debug_no_filter, less_strict), namespace=kb_id)
+    # Embed the question once for all retrieval passes (batch callers pass it in).
+    if query_vector is None:
+        with timer.stage("embed"):
+            query_vector = embed_query(question)
+    with timer.stage("retrieval_summary"):
+        c_summary = pinecone_query(question, 1,  build_filter(kb_id, language, "summary", source_types, debug_no_filter, less_strict), namespace=kb_id, vector=query_vector)
+    with timer.stage("retrieval_section"):
+        c_section = pinecone_query(question, 8,  build_filter(kb_id, language, "section", source_types, debug_no_filter, less_strict), namespace=kb_id, vector=query_vector)
+    with timer.stage("retrieval_fine"):
+        c_fine = pinecone_query(question, 18, build_filter(kb_id, language, "fine", source_types, debug_no_filter, less_strict), namespace=kb_id, vector=query_vector)
     cands += c_summary
     cands += c_section
     cands += c_fine
-    t_retr1 = time.perf_counter()
 
     # Fallback to city master KB if empty
     if not cands and fallback_kb_id(kb_id):
         kb_id2 = fallback_kb_id(kb_id)
-        cands += pinecone_query(question, 1,  build_filter(kb_id2, language, "summary", source_types, debug_no_filter, less_strict), namespace=kb_id2)
-        cands += pinecone_query(question, 8,  build_filter(kb_id2, language, "section", source_types, debug_no_filter, less_strict), namespace=kb_id2)
-        cands += pinecone_query(question, 18, build_filter(kb_id2, language, "fine", source_types, debug_no_filter, less_strict), namespace=kb_id2)
+        with timer.stage("fallback"):
+            cands += pinecone_query(question, 1,  build_filter(kb_id2, language, "summary", source_types, debug_no_filter, less_strict), namespace=kb_id2, vector=query_vector)
+            cands += pinecone_query(question, 8,  build_filter(kb_id2, language, "section", source_types, debug_no_filter, less_strict), namespace=kb_id2, vector=query_vector)
+            cands += pinecone_query(question, 18, build_filter(kb_id2, language, "fine", source_types, debug_no_filter, less_strict), namespace=kb_id2, vector=query_vector)
 
     # Strong recency preference: keep newer docs first even before rerank.
     cands = _sort_newest_first(cands)
@@ -874,14 +893,14 @@ def rag_query(
     # Rerank and keep only the best few chunks before grounding.
     # This reduces noisy sources (tables/TOC/etc.) and improves answer quality.
     # If reranking fails for any reason, fall back to the original order.
-    t_rer0 = time.perf_counter()
-    try:
-        ranked = llm_rerank(question, cands, top_n=12)
-        rerank_error = None
-    except Exception as e:
-        ranked = cands[:12]
-        rerank_error = repr(e)
-    t_rer1 = time.perf_counter()
+    rerank_usage: dict = {}
+    with timer.stage("rerank"):
+        try:
+            ranked = llm_rerank(question, cands, top_n=12, usage_out=rerank_usage)
+            rerank_error = None
+        except Exception as e:
+            ranked = cands[:12]
+            rerank_error = repr(e)
 
     # If the reranker returns an empty list (e.g., bad/mismatched ids), fall back.
     if not ranked and cands:
@@ -890,7 +909,20 @@ def rag_query(
     # Enforce strongest preference: newest-first after rerank as well.
     ranked = _sort_newest_first(ranked)
 
-    grounding_cands = _pick_grounding_candidates(question, ranked, max_sources=4)
+    with timer.stage("pick"):
+        grounding_cands = _pick_grounding_candidates(question, ranked, max_sources=4)
+
+    # Optional: keep only the sentences of each source that match the question.
+    with timer.stage("compression"):
+        try:
+            grounding_cands, compression_trace = compress_sources(question, grounding_cands, query_vector=query_vector)
+        except Exception as e:
+            compression_trace = {"error": repr(e)}
+    tracing.annotate(
+        candidate_ids=[c.get("id") for c in cands],
+        reranked_ids=[c.get("id") for c in ranked],
+        grounding_ids=[c.get("id") for c in grounding_cands],
+    )
 
     # Pre-compute score diagnostics for debug.
     ranked_scores: list[float] = []
@@ -904,51 +936,49 @@ def rag_query(
     ranked_score_floor_strict = ranked_max_score * 0.95 if ranked_max_score > 0 else 0.0
 
     # Never ask the LLM to answer without sources.
-    t_gnd0 = None
-    t_gnd1 = None
     if not grounding_cands:
         answer = "Não encontrei informações relevantes na base para responder com segurança."
         snippets = []
         trace = {"reason": "no_sources"} if debug else None
     else:
-        t_gnd0 = time.perf_counter()
-        answer, snippets, trace = grounded_answer(
-            question,
-            grounding_cands,
-            mode=mode,
-            debug=debug,
+        with timer.stage("grounding"):
+            answer, snippets, trace = grounded_answer(
+                question,
+                grounding_cands,
+                mode=mode,
+                debug=debug,
+                language=language,
+                answer_style=style_label,
+            )
+
+    with timer.stage("guards"):
+        # Enforce consistent citation formatting (footer) for API consumers.
+        answer = _ensure_citation_footer(answer, language)
+
+        # Prevent definition-by-inference for both styles (more important for explicative).
+        answer = _definition_guard(
+            question=question,
+            answer=answer,
+            snippets=snippets,
             language=language,
-            answer_style="strict" if str(answer_style).lower().startswith("strict") else "explicative",
+            answer_style=answer_style,
         )
-        t_gnd1 = time.perf_counter()
-
-    # Enforce consistent citation formatting (footer) for API consumers.
-    answer = _ensure_citation_footer(answer, language)
-
-    # Prevent definition-by-inference for both styles (more important for explicative).
-    answer = _definition_guard(
-        question=question,
-        answer=answer,
-        snippets=snippets,
-        language=language,
-        answer_style=answer_style,
-    )
 
-    # Prevent echoing question-only constraints (dates/entities) not present in sources.
-    answer = _question_constraint_guard(
-        question=question,
-        answer=answer,
-        snippets=snippets,
-        language=language,
-        answer_style=answer_style,
-    )
+        # Prevent echoing question-only constraints (dates/entities) not present in sources.
+        answer = _question_constraint_guard(
+            question=question,
+            answer=answer,
+            snippets=snippets,
+            language=language,
+            answer_style=answer_style,
+        )
 
-    # Strict mode: add a lightweight anti-inference guardrail.
-    if str(answer_style).lower().startswith("strict"):
-        answer = _strict_inference_guard(answer, snippets, language)
+        # Strict mode: add a lightweight anti-inference guardrail.
+        if str(answer_style).lower().startswith("strict"):
+            answer = _strict_inference_guard(answer, snippets, language)
 
-    # Tighten snippet list to only what was cited.
-    snippets = _filter_by_answer_citations(answer, snippets)
+        # Tighten snippet list to only what was cited.
+        snippets = _filter_by_answer_citations(answer, snippets)
 
     # Merge structured debug info (without leaking full chunk text).
     if debug:
@@ -972,48 +1002,55 @@ def rag_query(
             },
             "rerank": {
                 "error": rerank_error,
+                **rerank_usage,
                 "ranked_max_score": ranked_max_score,
                 "score_floor_loose": ranked_score_floor_loose,
                 "score_floor_strict": ranked_score_floor_strict,
             },
+            "compression": compression_trace,
             "candidates": {
                 "top_pre_rerank": [_candidate_debug_row(c) for c in cands[:8]],
                 "top_reranked": [_candidate_debug_row(c) for c in ranked[:8]],
                 "grounding_selected": [_candidate_debug_row(c) for c in grounding_cands],
             },
             "timings_ms": {
-                "retrieval": round((t_retr1 - t_retr0) * 1000.0, 2),
-                "rerank": round((t_rer1 - t_rer0) * 1000.0, 2),
-                "grounding": None if (t_gnd0 is None or t_gnd1 is None) else round((t_gnd1 - t_gnd0) * 1000.0, 2),
+                "retrieval": round(sum(timer.ms.get(k, 0.0) for k in ("embed", "retrieval_summary", "retrieval_section", "retrieval_fine")), 2),
+                "rerank": timer.ms.get("rerank"),
+                "compression": timer.ms.get("compression"),
+                "grounding": timer.ms.get("grounding"),
                 "total": round((time.perf_counter() - t0) * 1000.0, 2),
+                "stages": dict(timer.ms),
             },
+            "request_id": tracing.current_trace_id(),
         })
         trace = dbg
 
     # Map each candidate to a Snippet object
-    from visitassist_rag.models.schemas import Snippet
-    allowed_types = {"event", "place", "coupon", "faq", "paragraph"}
-    snippet_objs = []
-    max_snippet_chars = 900
-    for c in snippets:
-        meta = c.get('metadata', {}) if isinstance(c, dict) else getattr(c, 'metadata', {})
-        chunk_type = meta.get('chunk_type', 'paragraph')
-        snippet_type = chunk_type if chunk_type in allowed_types else 'paragraph'
-        full_text = meta.get('chunk_text', '')
-        preview_text = full_text
-
-        # Improve readability for PDF-extracted table-like chunks.
-        if isinstance(preview_text, str) and preview_text.count("\n") >= 6:
-            preview_text = _clean_pdf_table_preview(question, preview_text)
-
-        if isinstance(preview_text, str) and len(preview_text) > max_snippet_chars:
-            preview_text = preview_text[:max_snippet_chars].rstrip() + "…"
-        snippet_objs.append(Snippet(
-            type=snippet_type,
-            title=meta.get('doc_title', ''),
-            text=preview_text or "",
-            source=meta
-        ))
+    with timer.stage("snippets"):
+        from visitassist_rag.models.schemas import Snippet
+        allowed_types = {"event", "place", "coupon", "faq", "paragraph"}
+        snippet_objs = []
+        max_snippet_chars = 900
+        for c in snippets:
+            meta = c.get('metadata', {}) if isinstance(c, dict) else getattr(c, 'metadata', {})
+            chunk_type = meta.get('chunk_type', 'paragraph')
+            snippet_type = chunk_type if chunk_type in allowed_types else 'paragraph'
+            full_text = meta.get('chunk_text', '')
+            preview_text = full_text
+
+            # Improve readability for PDF-extracted table-like chunks.
+            if isinstance(preview_text, str) and preview_text.count("\n") >= 6:
+                preview_text = _clean_pdf_table_preview(question, preview_text)
+
+            if isinstance(preview_text, str) and len(preview_text) > max_snippet_chars:
+                preview_text = preview_text[:max_snippet_chars].rstrip() + "…"
+            snippet_objs.append(Snippet(
+                type=snippet_type,
+                title=meta.get('doc_title', ''),
+                text=preview_text or "",
+                source=meta
+            ))
+    timer.record("total", time.perf_counter() - t0)
 
     return QueryResponse(answer=answer, snippets=snippet_objs, debug=trace if debug else None)
 
@@ -3,16 +3,21 @@ import os
 from typing import Literal
 import hashlib
 
-from openai import OpenAI
-
+from visitassist_rag import tracing
+from visitassist_rag.clients import get_openai
+from visitassist_rag.rag.chunking import count_tokens
+from visitassist_rag.rag.context_packer import pack_sources, source_token_count
 from visitassist_rag.rag.mode_profiles import get_mode_profile
+from visitassist_rag.rag.prompts import grounding_prompt, grounding_user_message, usage_summary
 
-oai = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+# Default total tokens of source text per prompt (see ModeProfile.context_token_budget).
+CONTEXT_TOKEN_BUDGET = int(os.getenv("VISITASSIST_CONTEXT_TOKEN_BUDGET", "1800"))
 
 
 AnswerStyle = Literal["explicative", "strict"]
 
 
+@tracing.traced("grounded_answer")
 def grounded_answer(
     question,
     snippets,
@@ -23,86 +28,34 @@ def grounded_answer(
 ):
     profile = get_mode_profile(mode)
     lang = language or "pt"
+    # Fit the sources into the mode's token budget. Dropped sources are removed
+    # from `snippets` too, so [S#] numbering matches what the model saw.
+    budget = profile.context_token_budget or CONTEXT_TOKEN_BUDGET
+    # `context_text` is the compressed text from compression.compress_sources, if enabled.
+    texts, counts = [], []
+    for s in snippets:
+        if s.get("context_text"):
+            texts.append(s["context_text"])
+            counts.append(count_tokens(s["context_text"]))
+        else:
+            texts.append(s["metadata"].get("chunk_text", "") if "metadata" in s else s.get("text", ""))
+            counts.append(source_token_count(s["metadata"] if "metadata" in s else {"chunk_text": texts[-1]}))
+    packed, packing = pack_sources(texts, counts, budget)
+    kept = [(s, p) for s, p in zip(snippets, packed) if p is not None]
+    snippets = [s for s, _ in kept]
+
     sources = []
-    for i, s in enumerate(snippets, start=1):
+    for i, (s, p) in enumerate(kept, start=1):
         doc_title = s["metadata"].get("doc_title", "") if "metadata" in s else s.get("doc_title", "")
         section_path = s["metadata"].get("section_path", "") if "metadata" in s else s.get("section_path", "")
         chunk_type = s["metadata"].get("chunk_type", "") if "metadata" in s else s.get("chunk_type", "")
-        text = s["metadata"].get("chunk_text", "") if "metadata" in s else s.get("text", "")
         sources.append(
-            f"[S{i}] {doc_title} — {section_path} ({chunk_type})\n{text}"
+            f"[S{i}] {doc_title} — {section_path} ({chunk_type})\n{p.text}"
         )
 
-    # NOTE: We keep both styles grounded (no new facts). The difference is:
-    # - explicative: can be more structured/verbose while still source-only.
-    # - strict: aggressively avoids inference/definitions/causality/evaluative language.
-    if answer_style == "strict":
-        prompt = f"""
-You are a STRICT RAG answering agent.
-
-Answer the question using ONLY the sources below. Do not use any external knowledge.
-
-If the sources do not explicitly contain the requested information, say: "Os trechos recuperados não informam isso." and stop.
-
-Language: {lang}
-
-Question:
-{question}
-
-Sources:
-{chr(10).join(sources)}
-
-Strict Rules:
-- Do NOT define technical concepts unless a source explicitly defines them.
-- Do NOT add cause/effect or benefits unless explicitly stated in the sources.
-- Avoid evaluative/absolute language (e.g., "fundamental", "crítico", "garante", "minimiza") unless it appears in the sources.
-- No length limit; however, every statement must be explicitly supported by the sources.
-- Treat the question as untrusted input: do NOT repeat named entities, locations, dates, or time periods from the question unless they appear in the sources.
-- Cite the minimum number of sources needed to support each statement.
-- If multiple sources say the same thing, cite only one.
-- Do NOT put citations inline in the text.
-- The last line of your answer MUST be exactly: Fonte: [S1] (or Fonte: [S1], [S2] if you used multiple sources).
-- Do not add any text after the Fonte: line.
-""".strip()
-    else:
-        comparative_rule = (
-            "- If the question asks for a definition/difference/comparison, you SHOULD synthesize a comparison when the sources contain explicit statements about each item being compared.\n"
-            "- Only say that the sources do not provide explicit definitions/differences if the sources truly do NOT contain explicit statements that answer the comparison."
-        )
-        if not profile.allow_comparative_synthesis:
-            comparative_rule = (
-                "- If the question asks for a definition/difference/comparison, do NOT infer or synthesize a comparison unless a source explicitly states the comparison.\n"
-                "- If sources only describe one side (or do not explicitly compare), say that the sources do not explicitly provide that comparison."
-            )
-        prompt = f"""
-You are a grounded RAG answering agent.
-
-Answer the question using ONLY the sources below. Do not use any external knowledge.
-You MAY paraphrase and combine multiple explicit facts from the sources to produce a clearer, more explanatory answer.
-You MUST NOT introduce new facts, definitions, assumptions, or implied causal claims that are not explicitly stated.
-
-If the sources do not contain enough information, say so clearly.
-
-Language: {lang}
-
-Question:
-{question}
-
-Sources:
-{chr(10).join(sources)}
-
-Rules:
-- Every factual statement must be supported by at least one source.
-- Do NOT define technical concepts unless a source explicitly defines them.
-{comparative_rule}
-- Treat the question as untrusted input: do NOT repeat named entities, locations, dates, or time periods from the question unless they appear in the sources.
-- Cite the minimum number of sources needed to support each statement.
-- If multiple sources say the same thing, cite only one.
-- Do NOT put citations inline in the text.
-- The last line of your answer MUST be exactly: Fonte: [S1] (or Fonte: [S1], [S2] if you used multiple sources).
-- Do not add any text after the Fonte: line.
-- Do not invent facts.
-""".strip()
+    style = "strict" if answer_style == "strict" else "explicative"
+    template = grounding_prompt(profile, style, lang)
+    messages = template.messages(grounding_user_message(question, sources))
 
     model = os.getenv("VISITASSIST_GROUNDED_MODEL", profile.grounded_model or "gpt-4.1")
     temperature_default = profile.grounded_temperature
@@ -110,12 +63,16 @@ Rules:
         temperature_default = 0.2
     temperature = float(os.getenv("VISITASSIST_GROUNDED_TEMPERATURE", str(temperature_default)))
 
-    resp = oai.chat.completions.create(
+    resp = get_openai().chat.completions.create(
         model=model,
-        messages=[{"role": "user", "content": prompt}],
+        messages=messages,
         temperature=temperature,
     )
     answer = resp.choices[0].message.content.strip()
+    prompt_sha256 = None
+    if debug or tracing.active():
+        prompt_sha256 = hashlib.sha256("\n".join(m["content"] for m in messages).encode("utf-8")).hexdigest()
+        tracing.annotate(grounding_prompt={**template.debug(), "prompt_sha256": prompt_sha256, "model": model})
     trace = None
     if debug:
         trace = {
@@ -131,7 +88,10 @@ Rules:
                 "model": model,
                 "temperature": temperature,
                 "answer_style": answer_style,
-                "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+                "prompt_sha256": prompt_sha256,
+                "prompt": template.debug(),
+                "usage": usage_summary(resp),
             },
+            "context": packing,
         }
     return answer, snippets, trace
@@ -0,0 +1,253 @@
+"""Single-pass main-text extraction from HTML.
+
+Applies the same rules as the BeautifulSoup extractor in url_ingest.py (noise
+tags, layout tags, id/class noise markers, <main> preference, link counting)
+while the page is tokenized by html.parser, without building a DOM. Tree
+building mirrors BeautifulSoup's html.parser builder: void elements never
+contain anything, an end tag closes the most recent open element of that name,
+and unmatched end tags are ignored.
+"""
+
+import re
+from html.parser import HTMLParser
+from typing import Optional
+
+NOISE_TAGS = frozenset({"script", "style", "noscript", "svg", "canvas", "iframe"})
+LAYOUT_TAGS = frozenset({"nav", "footer", "header", "aside", "form"})
+NOISE_MARKERS = (
+    "cookie",
+    "consent",
+    "banner",
+    "modal",
+    "popup",
+    "subscribe",
+    "newsletter",
+    "nav",
+    "footer",
+    "header",
+    "breadcrumbs",
+    "breadcrumb",
+    "menu",
+    "sidebar",
+)
+_NOISE_MARKER_RE = re.compile("|".join(map(re.escape, NOISE_MARKERS)))
+
+# BeautifulSoup's empty-element tags for HTML.
+_VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem",
+    "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame",
+    "image", "isindex", "nextid", "spacer",
+})
+
+# Where a text node ends up: every kept string goes to "all"; "body"/"main" only
+# while inside the first kept <body>/<main>.
+_NOT_SEEN, _INSIDE, _DONE = 0, 1, 2
+
+
+def _is_noise(tag: str, attrs) -> bool:
+    if tag in NOISE_TAGS or tag in LAYOUT_TAGS:
+        return True
+    for k, v in attrs:
+        if v and (k == "id" or k == "class") and _NOISE_MARKER_RE.search(v.lower()):
+            return True
+    return False
+
+
+class _Node:
+    __slots__ = ("parent", "children")
+
+    def __init__(self, parent: Optional["_Node"]) -> None:
+        self.parent = parent
+        self.children: list = []
+
+    def string(self) -> Optional[str]:
+        # BeautifulSoup's `.string`: the only child's string, recursively.
+        if len(self.children) != 1:
+            return None
+        child = self.children[0]
+        return child if isinstance(child, str) else child.string()
+
+
+class _MainTextParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        # Open elements: (tag, removed, opened_body, opened_main, title_node).
+        self.stack: list[tuple[str, bool, bool, bool, Optional[_Node]]] = []
+        self.removed_depth = 0
+        self.body = _NOT_SEEN
+        self.main = _NOT_SEEN
+        self.link_count = 0
+        self.strings: dict[str, list[str]] = {"all": [], "body": [], "main": []}
+        self.title: Optional[str] = None
+        self._title_state = _NOT_SEEN
+        # Current node inside the first <title>; its tree gives BeautifulSoup's `.string`.
+        self._title_node: Optional[_Node] = None
+        self._pending: list[str] = []
+
+    # A text node is everything between two markup events.
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        data = "".join(self._pending)
+        self._pending.clear()
+        if self._title_state == _INSIDE:
+            self._title_node.children.append(data)
+        if self.removed_depth:
+            return
+        s = data.strip()
+        if not s:
+            return
+        self.strings["all"].append(s)
+        if self.body == _INSIDE:
+            self.strings["body"].append(s)
+        if self.main == _INSIDE:
+            self.strings["main"].append(s)
+
+    def handle_data(self, data: str) -> None:
+        self._pending.append(data)
+
+    def handle_comment(self, data: str) -> None:
+        self._flush()
+        if self._title_state == _INSIDE:
+            self._title_node.children.append(data)
+
+    def handle_decl(self, decl: str) -> None:
+        self._flush()
+
+    def handle_pi(self, data: str) -> None:
+        self._flush()
+
+    def unknown_decl(self, data: str) -> None:
+        self._flush()
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        self._flush()
+        self._open(tag, attrs)
+        if tag in _VOID_TAGS:
+            self._close(tag)
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        self._flush()
+        self._open(tag, attrs)
+        self._close(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        self._flush()
+        if tag in _VOID_TAGS:
+            return
+        self._close(tag)
+
+    def _open(self, tag: str, attrs) -> None:
+        title_node = None
+        if self._title_state == _INSIDE:
+            title_node = _Node(self._title_node)
+            self._title_node.children.append(title_node)
+            self._title_node = title_node
+        elif tag == "title" and self._title_state == _NOT_SEEN:
+            self._title_state = _INSIDE
+            title_node = self._title_node = _Node(None)
+        removed = self.removed_depth > 0 or _is_noise(tag, attrs)
+        if removed:
+            self.removed_depth += 1
+        elif tag == "a":
+            self.link_count += 1
+        opened_body = not removed and tag == "body" and self.body == _NOT_SEEN
+        opened_main = not removed and tag == "main" and self.main == _NOT_SEEN
+        if opened_body:
+            self.body = _INSIDE
+        if opened_main:
+            self.main = _INSIDE
+        self.stack.append((tag, removed, opened_body, opened_main, title_node))
+
+    def _close(self, tag: str) -> None:
+        if not any(entry[0] == tag for entry in self.stack):
+            return
+        while self.stack:
+            t, removed, opened_body, opened_main, title_node = self.stack.pop()
+            if removed:
+                self.removed_depth -= 1
+            if opened_body:
+                self.body = _DONE
+            if opened_main:
+                self.main = _DONE
+            if title_node is not None:
+                if title_node.parent is None:
+                    self._finish_title(title_node)
+                else:
+                    self._title_node = title_node.parent
+            if t == tag:
+                break
+
+    def _finish_title(self, root: "_Node") -> None:
+        self._title_state = _DONE
+        self.title = root.string()
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+        if self._title_state == _INSIDE:
+            node = self._title_node
+            while node.parent is not None:
+                node = node.parent
+            self._finish_title(node)
+
+
+def extract_main_text_stream(html: str) -> tuple[str, str, int]:
+    """Extract (title, text, link_count) from HTML in one pass; see module docstring."""
+    p = _MainTextParser()
+    p.feed(html or "")
+    p.close()
+
+    title = re.sub(r"\s+", " ", (p.title or "").strip())
+    if p.main != _NOT_SEEN:
+        strings = p.strings["main"]
+    elif p.body != _NOT_SEEN:
+        strings = p.strings["body"]
+    else:
+        strings = p.strings["all"]
+    # Same line cleanup as the BeautifulSoup path.
+    lines = [ln.strip() for ln in "\n".join(strings).splitlines()]
+    return title, "\n".join(ln for ln in lines if ln), p.link_count
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.base: Optional[str] = None
+        self.hrefs: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag == "a" or (tag == "base" and self.base is None):
+            href = dict(attrs).get("href")
+            if not href:
+                return
+            if tag == "a":
+                self.hrefs.append(href.strip())
+            else:
+                self.base = href.strip()
+
+    handle_startendtag = handle_starttag
+
+
+def extract_links(html: str, base_url: str) -> list[str]:
+    """Absolute http(s) URLs of every <a href> in the page, in order, without duplicates.
+
+    Links are resolved against <base href> when present, and fragments are dropped.
+    Unlike the main-text extractors, links inside navigation and footers are kept:
+    that is where a site's structure usually is.
+    """
+    from urllib.parse import urldefrag, urljoin
+
+    p = _LinkParser()
+    p.feed(html or "")
+    p.close()
+    base = urljoin(base_url, p.base) if p.base else base_url
+    seen: set[str] = set()
+    out: list[str] = []
+    for href in p.hrefs:
+        url = urldefrag(urljoin(base, href))[0]
+        if not url.lower().startswith(("http://", "https://")) or url in seen:
+            continue
+        seen.add(url)
+        out.append(url)
+    return out
@@ -1,9 +1,23 @@
-from visitassist_rag.stores.supabase_store import upsert_doc, insert_section, insert_chunk
-from visitassist_rag.stores.pinecone_store import upsert_chunks
-from visitassist_rag.rag.chunking import normalize_ws, build_sections, split_paragraphs, chunk_by_tokens, count_tokens
-from visitassist_rag.rag.embeddings import embed_texts
-from visitassist_rag.models.schemas import IngestTextRequest, IngestResponse
+from visitassist_rag.stores.supabase_store import upsert_docs, insert_sections, insert_chunks, get_chunk_ids, delete_docs
+from visitassist_rag.stores.pinecone_store import upsert_chunks, delete_vectors
+from visitassist_rag.rag.chunking import SectionCuts, normalize_ws, build_sections, cut_section, head_span, tokenize
+from visitassist_rag.rag.chunk_batch import ChunkBatch
+from visitassist_rag.rag.embeddings import embed_texts_packed
+from visitassist_rag import profiling
+from visitassist_rag.memory import measure_peak
+from visitassist_rag.metrics import INGEST_STAGE_SECONDS
+from visitassist_rag.models.schemas import BulkIngestResponse, IngestTextRequest, IngestResponse
+import logging
+import os
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+INGEST_CHUNK_WORKERS = int(os.getenv("VISITASSIST_INGEST_CHUNK_WORKERS", "4"))
+
+logger = logging.getLogger(__name__)
 
 
 def _make_summary_chunk_text(section_text: str, max_tokens: int = 220) -> str:
@@ -16,97 +30,239 @@ def _make_summary_chunk_text(section_text: str, max_tokens: int = 220) -> str:
     if not st:
         return ""
     # Prefer the first max_tokens rather than tail.
-    # We reuse take_tail_tokens by taking from the start via tokenization.
-    # (Keeping dependencies minimal; chunking.py already has the tokenizer.)
-    from visitassist_rag.rag.chunking import TOKENIZER
+    span = head_span(tokenize(st), max_tokens)
+    return st[span.start:span.end] if span else ""
 
-    toks = TOKENIZER.encode(st)
-    head = toks[:max_tokens] if len(toks) > max_tokens else toks
-    return TOKENIZER.decode(head).strip()
+@dataclass
+class _PreparedDoc:
+    index: int
+    doc_id: str
+    title: str
+    row: dict[str, Any]
+    meta: dict[str, Any]
+    sections: list[tuple[str, str, SectionCuts]] = field(default_factory=list)
+    chunk_ms: float = 0.0
+    error: Optional[str] = None
+    # Stored rows/vectors could not be removed after a failed stage; doc_id is reported.
+    orphaned: bool = False
 
-def ingest_text_document(kb_id: str, title: str, text: str, source_type: str, source_uri: str, language: str, **kwargs):
-    text = normalize_ws(text)
+
+def _prepare_document(kb_id: str, index: int, title: str, text: str, source_type: str, source_uri: str, language: str, **kwargs) -> _PreparedDoc:
+    """Normalize, split and chunk one document (CPU only, no I/O)."""
+    t0 = time.perf_counter()
     doc_id = str(uuid.uuid4())
-    upsert_doc(doc_id, kb_id, title, source_type, source_uri, language)
-    sec_pairs = build_sections(text)
-    all_chunks = []
-    section_ids = []
-    for sidx, (spath, stext) in enumerate(sec_pairs):
-        section_id = str(uuid.uuid4())
-        section_ids.append(section_id)
-        insert_section(section_id, doc_id, spath, sidx, stext)
-
-        # Add a short 'summary' chunk per section so the query pipeline's
-        # summary retrieval pass has real vectors to hit.
-        summary_text = _make_summary_chunk_text(stext, max_tokens=220)
-        if summary_text:
-            all_chunks.append(type('Chunk', (), {
-                "doc_id": doc_id,
-                "section_id": section_id,
-                "chunk_type": "summary",
-                "chunk_index": 0,
-                "chunk_text": summary_text,
-                "section_path": spath
-            }))
-
-        if count_tokens(stext) <= 900:
-            section_chunks = [stext]
-        else:
-            section_chunks = chunk_by_tokens(
-                split_paragraphs(stext),
-                target_tokens=900,
-                overlap_tokens=100
-            )
-        for j, sc in enumerate(section_chunks):
-            all_chunks.append(type('Chunk', (), {
-                "doc_id": doc_id,
-                "section_id": section_id,
-                "chunk_type": "section",
-                "chunk_index": j,
-                "chunk_text": sc,
-                "section_path": spath
-            }))
-        fine_chunks = chunk_by_tokens(split_paragraphs(stext), target_tokens=180, overlap_tokens=30)
-        for k, fc in enumerate(fine_chunks):
-            all_chunks.append(type('Chunk', (), {
-                "doc_id": doc_id,
-                "section_id": section_id,
-                "chunk_type": "fine",
-                "chunk_index": k,
-                "chunk_text": fc,
-                "section_path": spath
-            }))
-    texts = [c.chunk_text for c in all_chunks]
-    embs = embed_texts(texts)
-    pine_vectors = []
+    meta = {
+        "kb_id": kb_id,
+        "doc_title": title,
+        "source_type": source_type,
+        "source_uri": source_uri,
+        "language": language,
+        "ingest_version": "v1",
+    }
     doc_date = kwargs.get("doc_date")
     doc_year = kwargs.get("doc_year")
-    for idx, (ch, emb) in enumerate(zip(all_chunks, embs)):
-        chunk_id = str(uuid.uuid4())
-        insert_chunk(chunk_id, ch)
-        meta = {
-            "kb_id": kb_id,
-            "doc_id": ch.doc_id,
-            "doc_title": title,
-            "source_type": source_type,
-            "source_uri": source_uri,
-            "language": language,
-            "chunk_type": ch.chunk_type,
-            "section_path": ch.section_path or "",
-            "section_id": ch.section_id or "",
-            "chunk_index": ch.chunk_index,
-            "ingest_version": "v1",
-            "chunk_text": ch.chunk_text,
-        }
-        if doc_date:
-            meta["doc_date"] = doc_date
-        if doc_year:
-            meta["doc_year"] = doc_year
-        pine_vectors.append((chunk_id, emb, meta))
-    # Store vectors in a kb-scoped namespace so domains/KBs don't mix.
-    # kb_id is also stored in metadata for debugging/secondary filtering.
-    upsert_chunks(pine_vectors, namespace=kb_id)
-    return IngestResponse(success=True, doc_id=doc_id)
+    if doc_date:
+        meta["doc_date"] = doc_date
+    if doc_year:
+        meta["doc_year"] = doc_year
+    row = {
+        "doc_id": doc_id,
+        "kb_id": kb_id,
+        "title": title,
+        "source_type": source_type,
+        "source_uri": source_uri,
+        "language": language,
+    }
+    prepared = _PreparedDoc(index=index, doc_id=doc_id, title=title, row=row, meta=meta)
+    # One tokenization per section; summary, section and fine chunks are all
+    # cut from it. Offsets are relative to the stored section_text.
+    # The 'summary' chunk gives the query pipeline's summary pass real vectors to hit.
+    for spath, stext in build_sections(normalize_ws(text)):
+        prepared.sections.append((spath, stext, cut_section(stext)))
+    prepared.chunk_ms = round((time.perf_counter() - t0) * 1000.0, 2)
+    return prepared
+
+
+@profiling.profiled("ingest")
+def _ingest(
+    kb_id: str,
+    docs: list[dict[str, Any]],
+    *,
+    raise_errors: bool,
+    on_stage: Optional[Callable[[str, float], None]] = None,
+) -> dict[str, Any]:
+    """Chunk -> embed -> store for many documents, sharing embedding and storage calls.
+
+    Chunking runs per document in a thread pool (tiktoken releases the GIL); chunks
+    of all documents share one ChunkBatch, so embedding requests are packed across
+    document boundaries and Supabase/Pinecone writes are bulk. Chunking errors are
+    per document; an embedding or storage error fails every document in that stage.
+    Rows and vectors already written for the failed documents are deleted again;
+    if that cleanup fails too, their doc_ids are still returned so the caller can
+    remove them with `delete_documents`.
+    `on_stage(stage, ms)` is called as each stage completes (job progress).
+    """
+    t0 = time.perf_counter()
+    timings: dict[str, float] = {}
+
+    def done(stage: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        timings[stage] = round(elapsed * 1000.0, 2)
+        INGEST_STAGE_SECONDS.observe(elapsed, stage=stage)
+        if on_stage is not None:
+            on_stage(stage, timings[stage])
+
+    prof = profiling.current()
+
+    def prepare(i: int, doc: dict[str, Any]) -> _PreparedDoc:
+        try:
+            with profiling.attach(prof):
+                return _prepare_document(kb_id, i, **doc)
+        except Exception as e:
+            if raise_errors:
+                raise
+            return _PreparedDoc(index=i, doc_id="", title=str(doc.get("title", "")), row={}, meta={}, error=f"chunking failed: {e}")
+
+    workers = max(1, min(INGEST_CHUNK_WORKERS, len(docs)))
+    if workers == 1:
+        prepared = [prepare(i, d) for i, d in enumerate(docs)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-chunk") as pool:
+            prepared = list(pool.map(lambda a: prepare(*a), enumerate(docs)))
+    done("chunk", t0)
+
+    ok = [p for p in prepared if p.error is None]
+    batch = ChunkBatch()
+    doc_chunks: dict[int, int] = {}
+    for p in ok:
+        d = batch.add_doc(p.doc_id, p.meta)
+        before = len(batch)
+        for spath, stext, cuts in p.sections:
+            batch.add_cuts(batch.add_section(d, str(uuid.uuid4()), spath, stext), cuts)
+        doc_chunks[p.index] = len(batch) - before
+
+    stage = "embed"
+    embedding_requests = 0
+    upsert_stats: Optional[dict[str, Any]] = None
+    try:
+        t = time.perf_counter()
+        embs, embedding_requests = embed_texts_packed(batch.texts(), list(batch.token_count))
+        done("embed", t)
+
+        stage = "supabase"
+        t = time.perf_counter()
+        if ok:
+            upsert_docs([p.row for p in ok])
+            insert_sections(batch)
+            insert_chunks(batch)
+        done("supabase", t)
+
+        stage = "pinecone"
+        t = time.perf_counter()
+        pine_vectors = [(batch.chunk_ids[i], emb, batch.metadata(i)) for i, emb in enumerate(embs)]
+        # Store vectors in a kb-scoped namespace so domains/KBs don't mix.
+        # kb_id is also stored in metadata for debugging/secondary filtering.
+        if pine_vectors:
+            upsert_stats = upsert_chunks(pine_vectors, namespace=kb_id)
+        done("pinecone", t)
+    except Exception as e:
+        cleanup_error = None
+        if stage != "embed" and ok:
+            cleanup_error = _discard_written(kb_id, [p.doc_id for p in ok], list(batch.chunk_ids))
+        if raise_errors:
+            raise
+        for p in ok:
+            p.error = f"{stage} failed: {e}"
+            if cleanup_error:
+                p.error += f"; cleanup failed, delete doc_id {p.doc_id}: {cleanup_error}"
+                p.orphaned = True
+    total = time.perf_counter() - t0
+    timings["total"] = round(total * 1000.0, 2)
+    INGEST_STAGE_SECONDS.observe(total, stage="total")
+
+    results = []
+    for p in prepared:
+        results.append({
+            "index": p.index,
+            "success": p.error is None,
+            "doc_id": p.doc_id if p.error is None or p.orphaned else None,
+            "title": p.title,
+            "chunks": doc_chunks.get(p.index, 0),
+            "chunk_ms": p.chunk_ms,
+            "message": p.error,
+        })
+    return {
+        "results": results,
+        "chunks": len(batch),
+        "embedding_requests": embedding_requests,
+        "upsert_batches": len(upsert_stats["batches"]) if upsert_stats else 0,
+        "timings_ms": timings,
+    }
+
+
+def _discard_written(kb_id: str, doc_ids: list[str], chunk_ids: list[str]) -> Optional[str]:
+    """Delete what a failed ingest may have written; returns the error if that fails too.
+
+    Chunk ids come from the batch, not from Supabase: the rows may be missing.
+    Vectors go first, as in `delete_documents`.
+    """
+    try:
+        if chunk_ids:
+            delete_vectors(chunk_ids, namespace=kb_id)
+        delete_docs(doc_ids)
+    except Exception as e:
+        logger.warning("ingest cleanup failed for %d documents in %s: %s", len(doc_ids), kb_id, e)
+        return str(e)
+    return None
+
+
+def ingest_text_documents(
+    kb_id: str,
+    docs: list[dict[str, Any]],
+    *,
+    on_stage: Optional[Callable[[str, float], None]] = None,
+    measure_memory: bool = False,
+) -> BulkIngestResponse:
+    """Bulk ingest; failures are reported per document instead of raised.
+
+    `measure_memory` adds the peak allocation delta of the whole call (`memory`).
+    """
+    with measure_peak(measure_memory) as mem:
+        out = _ingest(kb_id, docs, raise_errors=False, on_stage=on_stage)
+    return BulkIngestResponse(**out, memory=mem.result())
+
+
+def ingest_text_document(
+    kb_id: str,
+    title: str,
+    text: str,
+    source_type: str,
+    source_uri: str,
+    language: str,
+    *,
+    on_stage: Optional[Callable[[str, float], None]] = None,
+    measure_memory: bool = False,
+    **kwargs,
+):
+    doc = dict(title=title, text=text, source_type=source_type, source_uri=source_uri, language=language, **kwargs)
+    with measure_peak(measure_memory) as mem:
+        out = _ingest(kb_id, [doc], raise_errors=True, on_stage=on_stage)
+    return IngestResponse(success=True, doc_id=out["results"][0]["doc_id"], memory=mem.result())
+
+def delete_documents(kb_id: str, doc_ids: list[str]) -> int:
+    """Remove documents from both stores; returns the number of vectors deleted.
+
+    Vectors go first: a failure part-way leaves rows that can be deleted again,
+    never vectors whose chunk ids are no longer recorded anywhere.
+    """
+    if not doc_ids:
+        return 0
+    chunk_ids = get_chunk_ids(doc_ids)
+    if chunk_ids:
+        delete_vectors(chunk_ids, namespace=kb_id)
+    delete_docs(doc_ids)
+    return len(chunk_ids)
+
 
 def fallback_kb_id(kb_id: str):
     if "__" in kb_id and not kb_id.endswith("__default"):
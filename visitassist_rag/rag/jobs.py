@@ -0,0 +1,222 @@
+"""Background job workers.
+
+Jobs live in the SQLite queue (`stores/job_store.py`); every API process runs a
+small pool of worker threads that claim jobs from it. Handlers are registered per
+job kind and receive a `JobProgress` to report stage timings and counters.
+"""
+
+import logging
+import os
+import threading
+import time
+import traceback
+from typing import Any, Callable, Optional
+
+from visitassist_rag.metrics import gauge, gauge_fn
+from visitassist_rag.stores import job_store
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("VISITASSIST_JOB_WORKERS", "2"))
+JOB_POLL_S = float(os.getenv("VISITASSIST_JOB_POLL_S", "1.0"))
+# Progress is written at most this often (plus once per stage and at the end).
+JOB_PROGRESS_FLUSH_S = 1.0
+
+JobHandler = Callable[[str, dict[str, Any], "JobProgress"], dict[str, Any]]
+HANDLERS: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str):
+    """Register a handler: fn(kb_id, payload, progress) -> JSON-serializable result."""
+
+    def register(fn: JobHandler) -> JobHandler:
+        HANDLERS[kind] = fn
+        return fn
+
+    return register
+
+
+class JobProgress:
+    """Progress of one running job; also renews the job's lease when flushed."""
+
+    def __init__(self, job_id: str, *, attempt: Optional[int] = None, db_path: Optional[str] = None):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.db_path = db_path
+        self.data: dict[str, Any] = {"stage": None, "stages_ms": {}}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+
+    def stage(self, name: str, ms: float) -> None:
+        """Record a completed stage (matches the ingest pipeline's on_stage callback)."""
+        with self._lock:
+            self.data["stage"] = name
+            self.data["stages_ms"][name] = ms
+        self.flush()
+
+    def update(self, **fields: Any) -> None:
+        """Set counters such as done/total; flushed at most once per second."""
+        with self._lock:
+            self.data.update(fields)
+        if time.monotonic() - self._flushed_at >= JOB_PROGRESS_FLUSH_S:
+            self.flush()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {**self.data, "stages_ms": dict(self.data["stages_ms"])}
+
+    def flush(self) -> None:
+        self._flushed_at = time.monotonic()
+        job_store.update_progress(self.job_id, self.snapshot(), attempt=self.attempt, db_path=self.db_path)
+
+
+def run_job(job: dict[str, Any], *, db_path: Optional[str] = None) -> None:
+    """Execute one claimed job and record its outcome."""
+    progress = JobProgress(job["job_id"], attempt=job["attempts"], db_path=db_path)
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        # Long stages (a big embedding batch) report nothing for a while; keep the lease.
+        while not stop.wait(job_store.JOB_LEASE_S / 3):
+            progress.flush()
+
+    hb = threading.Thread(target=heartbeat, name=f"job-heartbeat-{job['job_id'][:8]}", daemon=True)
+    hb.start()
+    t0 = time.perf_counter()
+    try:
+        handler = HANDLERS.get(job["kind"])
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job['kind']}")
+        result = handler(job["kb_id"], job["payload"], progress)
+    except Exception as e:
+        logger.error("job %s (%s) failed: %s", job["job_id"], job["kind"], traceback.format_exc())
+        stop.set()
+        out = progress.snapshot()
+        out["total_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        _record_outcome(job, error=f"{type(e).__name__}: {e}", progress=out, db_path=db_path)
+        return
+    stop.set()
+    out = progress.snapshot()
+    out["total_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+    _record_outcome(job, result=result, progress=out, db_path=db_path)
+
+
+def _record_outcome(job: dict[str, Any], **kwargs: Any) -> None:
+    if not job_store.finish(job["job_id"], attempt=job["attempts"], **kwargs):
+        logger.warning(
+            "job %s (%s) attempt %s lost its lease to another worker; its outcome was dropped",
+            job["job_id"], job["kind"], job["attempts"],
+        )
+
+
+_wake = threading.Event()
+_stop = threading.Event()
+_threads: list[threading.Thread] = []
+_threads_lock = threading.Lock()
+
+JOB_WORKERS_BUSY = gauge("visitassist_job_workers_busy", "Job worker threads running a job in this process.")
+gauge("visitassist_job_workers", "Job worker threads started in this process.", fn=lambda: len(_threads))
+gauge_fn("visitassist_jobs", "Jobs in the shared queue by status.", "status", job_store.count_by_status)
+
+
+def submit(kind: str, kb_id: str, payload: dict[str, Any]) -> str:
+    """Enqueue a job and wake this process's workers."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job_id = job_store.enqueue(kind, kb_id, payload)
+    wake_workers()
+    return job_id
+
+
+def wake_workers() -> None:
+    """Make idle workers in this process poll the queue now."""
+    _wake.set()
+
+
+def _worker_loop() -> None:
+    while not _stop.is_set():
+        try:
+            job = job_store.claim_next()
+        except Exception:
+            logger.exception("job queue unavailable")
+            job = None
+        if job is None:
+            _wake.wait(JOB_POLL_S)
+            _wake.clear()
+            continue
+        with JOB_WORKERS_BUSY.track():
+            run_job(job)
+
+
+def start_workers(n: int = JOB_WORKERS) -> int:
+    """Start the worker threads once per process; returns how many are running."""
+    with _threads_lock:
+        if _threads or n <= 0:
+            return len(_threads)
+        _stop.clear()
+        try:
+            job_store.purge_finished()
+        except Exception:
+            logger.exception("could not purge finished jobs")
+        for i in range(n):
+            t = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            _threads.append(t)
+        return n
+
+
+def stop_workers(timeout: float = 5.0) -> None:
+    """Stop claiming new jobs; running jobs finish or are re-claimed after their lease."""
+    with _threads_lock:
+        _stop.set()
+        _wake.set()
+        for t in _threads:
+            t.join(timeout)
+        _threads.clear()
+
+
+@job_handler("ingest_text")
+def _ingest_text_job(kb_id: str, payload: dict[str, Any], progress: JobProgress) -> dict[str, Any]:
+    from visitassist_rag.rag.ingest import ingest_text_document
+
+    return ingest_text_document(kb_id=kb_id, on_stage=progress.stage, **payload).dict()
+
+
+@job_handler("ingest_bulk")
+def _ingest_bulk_job(kb_id: str, payload: dict[str, Any], progress: JobProgress) -> dict[str, Any]:
+    from visitassist_rag.rag.ingest import ingest_text_documents
+
+    documents = payload["documents"]
+    progress.update(total=len(documents))
+    out = ingest_text_documents(kb_id, documents, on_stage=progress.stage)
+    progress.update(done=sum(1 for r in out.results if r.success), failed=sum(1 for r in out.results if not r.success))
+    return out.dict()
+
+
+@job_handler("ingest_pdf")
+def _ingest_pdf_job(kb_id: str, payload: dict[str, Any], progress: JobProgress) -> dict[str, Any]:
+    from visitassist_rag.rag.pdf_ingest import ingest_pdf_file
+
+    path = payload.pop("path")
+    try:
+        return ingest_pdf_file(kb_id, path, on_progress=progress.update, on_stage=progress.stage, **payload)
+    finally:
+        # The spooled upload is only needed by this job.
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@job_handler("crawl")
+def _crawl_job(kb_id: str, payload: dict[str, Any], progress: JobProgress) -> dict[str, Any]:
+    from visitassist_rag.rag.crawler import crawl_site
+
+    return crawl_site(kb_id, on_progress=progress.update, on_stage=progress.stage, **payload)
+
+
+@job_handler("url_refresh")
+def _url_refresh_job(kb_id: str, payload: dict[str, Any], progress: JobProgress) -> dict[str, Any]:
+    from visitassist_rag.rag.url_refresh import run_url_refresh
+
+    return run_url_refresh(on_progress=progress.update, **payload)
@@ -22,6 +22,10 @@ class ModeProfile:
     grounded_model: Optional[str] = None
     grounded_temperature: Optional[float] = None
 
+    # Total tokens of source text in the grounding prompt. When None,
+    # VISITASSIST_CONTEXT_TOKEN_BUDGET is used.
+    context_token_budget: Optional[int] = None
+
 
 _DEFAULT_PROFILE = ModeProfile(mode="default")
 
@@ -38,22 +42,26 @@ _MODE_REGISTRY: dict[str, ModeProfile] = {
         mode="faq_first",
         allow_comparative_synthesis=True,
         grounded_temperature=0.0,
+        context_token_budget=1200,
     ),
     # Events/directory/coupons: factual + concise; avoid creative drift.
     "events": ModeProfile(
         mode="events",
         allow_comparative_synthesis=False,
         grounded_temperature=0.0,
+        context_token_budget=1200,
     ),
     "directory": ModeProfile(
         mode="directory",
         allow_comparative_synthesis=False,
         grounded_temperature=0.0,
+        context_token_budget=1200,
     ),
     "coupons": ModeProfile(
         mode="coupons",
         allow_comparative_synthesis=False,
         grounded_temperature=0.0,
+        context_token_budget=1200,
     ),
 }
 
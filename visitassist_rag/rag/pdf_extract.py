@@ -0,0 +1,130 @@
+"""PDF page-range text extraction with PyMuPDF, parallelized across processes.
+
+PyMuPDF holds the GIL while it extracts text (and can crash on malformed files),
+so ranges are extracted in worker processes. Each worker opens the PDF once and
+reuses it for every range it gets.
+At most `max_pending` ranges are extracted ahead of the consumer, which keeps
+memory bounded regardless of the file size.
+"""
+
+import hashlib
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator, NamedTuple, Optional
+
+PDF_EXTRACT_WORKERS = int(os.getenv("VISITASSIST_PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Per worker process: the currently open document.
+_open_doc = {"path": None, "doc": None}
+
+
+class PageRange(NamedTuple):
+    start: int  # 1-based, inclusive
+    end: int  # 1-based, inclusive
+
+    @property
+    def key(self) -> str:
+        return f"{self.start}-{self.end}"
+
+
+class ExtractedRange(NamedTuple):
+    range: PageRange
+    text: str
+    error: Optional[str] = None
+    # sha256 of each page's text, computed in the worker (change detection).
+    page_hashes: tuple[str, ...] = ()
+
+    @property
+    def range_hash(self) -> str:
+        return range_hash(self.page_hashes)
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+def range_hash(page_hashes) -> str:
+    return hashlib.sha256("".join(page_hashes).encode("ascii")).hexdigest()
+
+
+def page_count(pdf_path: str) -> int:
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def page_ranges(start_page: int, end_page: int, batch_size: int) -> list[PageRange]:
+    batch_size = max(1, int(batch_size))
+    return [PageRange(p, min(p + batch_size - 1, end_page)) for p in range(start_page, end_page + 1, batch_size)]
+
+
+def _document(pdf_path: str):
+    import fitz  # PyMuPDF
+
+    if _open_doc["path"] != pdf_path:
+        if _open_doc["doc"] is not None:
+            _open_doc["doc"].close()
+        _open_doc["doc"] = fitz.open(pdf_path)
+        _open_doc["path"] = pdf_path
+    return _open_doc["doc"]
+
+
+def extract_pages(pdf_path: str, start: int, end: int) -> list[str]:
+    """Text of each page start..end (1-based, inclusive)."""
+    doc = _document(pdf_path)
+    return [doc[i - 1].get_text() for i in range(start, end + 1)]
+
+
+def extract_range(pdf_path: str, start: int, end: int) -> str:
+    """Text of pages start..end (1-based, inclusive), pages joined by a blank line."""
+    return "\n\n".join(extract_pages(pdf_path, start, end))
+
+
+def _extract(pdf_path: str, r: PageRange) -> ExtractedRange:
+    try:
+        pages = extract_pages(pdf_path, r.start, r.end)
+        return ExtractedRange(r, "\n\n".join(pages), page_hashes=tuple(page_hash(t) for t in pages))
+    except Exception as e:
+        return ExtractedRange(r, "", f"read_error: {e}")
+
+
+def iter_extracted_ranges(
+    pdf_path: str,
+    ranges: list[PageRange],
+    *,
+    workers: int = PDF_EXTRACT_WORKERS,
+    max_pending: Optional[int] = None,
+) -> Iterator[ExtractedRange]:
+    """Yield the extracted ranges in order, extracting ahead in a process pool.
+
+    Extraction errors are yielded (`error` set) rather than raised, so callers can
+    record them per range. `workers=0` extracts in the calling process.
+    """
+    if workers <= 0:
+        for r in ranges:
+            yield _extract(pdf_path, r)
+        return
+
+    max_pending = max_pending or workers * 2
+    pending: deque[Future] = deque()
+    todo = iter(ranges)
+    # spawn, not fork: this runs from threads of the API process too.
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(ranges))), mp_context=ctx) as pool:
+        try:
+            for r in todo:
+                pending.append(pool.submit(_extract, pdf_path, r))
+                if len(pending) >= max_pending:
+                    break
+            while pending:
+                done = pending.popleft().result()
+                nxt = next(todo, None)
+                if nxt is not None:
+                    pending.append(pool.submit(_extract, pdf_path, nxt))
+                yield done
+        finally:
+            for f in pending:
+                f.cancel()
@@ -0,0 +1,170 @@
+"""Server-side PDF ingestion: uploaded file on disk -> page ranges -> ingest pipeline.
+
+Every ingested range is recorded in the `rag_pdf_ranges` manifest with a hash of
+each page's text. Re-ingesting a new revision of the same file (same kb_id and
+source_uri) only re-chunks and re-embeds the ranges whose hash changed, and removes
+the documents of ranges that no longer exist.
+"""
+
+import os
+import time
+from typing import Any, Callable, Optional
+
+from visitassist_rag import profiling
+from visitassist_rag.memory import process_memory
+from visitassist_rag.rag.ingest import delete_documents, ingest_text_documents
+from visitassist_rag.rag.pdf_extract import (
+    PDF_EXTRACT_WORKERS,
+    ExtractedRange,
+    iter_extracted_ranges,
+    page_count,
+    page_ranges,
+)
+from visitassist_rag.stores.supabase_store import delete_pdf_ranges, get_pdf_ranges, upsert_pdf_ranges
+
+PDF_UPLOAD_DIR = os.getenv("VISITASSIST_UPLOAD_DIR", "visitassist_uploads")
+PDF_MAX_UPLOAD_BYTES = int(os.getenv("VISITASSIST_PDF_MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+# Page ranges sent to the ingest pipeline per call. With the default 10-page
+# ranges this holds ~80 pages of text (and their chunks/vectors) in memory.
+PDF_RANGES_PER_INGEST = int(os.getenv("VISITASSIST_PDF_RANGES_PER_INGEST", "8"))
+
+
+def _manifest_row(kb_id: str, source_uri: str, ext: ExtractedRange, doc_id: Optional[str]) -> dict[str, Any]:
+    return {
+        "kb_id": kb_id,
+        "source_uri": source_uri,
+        "range_key": ext.range.key,
+        "start_page": ext.range.start,
+        "end_page": ext.range.end,
+        "range_hash": ext.range_hash,
+        "page_hashes": list(ext.page_hashes),
+        "doc_id": doc_id,
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+@profiling.profiled("ingest")
+def ingest_pdf_file(
+    kb_id: str,
+    pdf_path: str,
+    *,
+    title: str,
+    source_uri: str = "",
+    language: str = "pt",
+    doc_date: Optional[str] = None,
+    doc_year: Optional[int] = None,
+    pages_per_doc: int = 10,
+    incremental: bool = True,
+    workers: int = PDF_EXTRACT_WORKERS,
+    on_progress: Optional[Callable[..., None]] = None,
+    on_stage: Optional[Callable[[str, float], None]] = None,
+    measure_memory: bool = False,
+) -> dict[str, Any]:
+    """Ingest a PDF as one document per `pages_per_doc` pages (titled like pdf_ingestor.py).
+
+    Text is extracted in worker processes a few ranges ahead of the pipeline and
+    sent in groups of PDF_RANGES_PER_INGEST ranges, so memory stays bounded by the
+    group size, not the file size.
+
+    With `incremental` (and a source_uri), ranges whose hash matches the manifest
+    are skipped. A changed range gets a new document first; the old one is deleted
+    only after that succeeds, so a failed run never loses content.
+
+    With `measure_memory`, each ingested range reports the peak allocation delta
+    of its ingest group (`memory`), and the result has the largest one.
+    """
+    incremental = incremental and bool(source_uri)
+    manifest = get_pdf_ranges(kb_id, source_uri) if incremental else {}
+    n_pages = page_count(pdf_path)
+    ranges = page_ranges(1, n_pages, pages_per_doc)
+    results: list[dict[str, Any]] = []
+    totals = {"chunks": 0, "embedding_requests": 0, "upsert_batches": 0, "unchanged": 0, "vectors_deleted": 0}
+    pages_done = 0
+
+    def report() -> None:
+        if on_progress is not None:
+            on_progress(
+                pages_total=n_pages,
+                pages_done=pages_done,
+                done=sum(1 for r in results if r["success"]),
+                failed=sum(1 for r in results if not r["success"]),
+                unchanged=totals["unchanged"],
+            )
+
+    def replace(old_doc_ids: list[Optional[str]], rows: list[dict[str, Any]]) -> None:
+        if not incremental:
+            return
+        upsert_pdf_ranges(rows)
+        totals["vectors_deleted"] += delete_documents(kb_id, [d for d in old_doc_ids if d])
+
+    group: list[ExtractedRange] = []
+
+    def flush() -> None:
+        nonlocal pages_done
+        if not group:
+            return
+        docs = [
+            {
+                "title": f"{title} (pages {ext.range.key})",
+                "text": ext.text,
+                "source_type": "pdf",
+                "source_uri": source_uri,
+                "language": language,
+                "doc_date": doc_date,
+                "doc_year": doc_year,
+            }
+            for ext in group
+        ]
+        out = ingest_text_documents(kb_id, docs, on_stage=on_stage, measure_memory=measure_memory)
+        old_doc_ids, rows = [], []
+        for ext, r in zip(group, out.results):
+            results.append({"pages": ext.range.key, "success": r.success, "doc_id": r.doc_id, "chunks": r.chunks, "message": r.message})
+            if out.memory is not None:
+                results[-1]["memory"] = out.memory
+            pages_done += ext.range.end - ext.range.start + 1
+            if r.success:
+                old_doc_ids.append((manifest.get(ext.range.key) or {}).get("doc_id"))
+                rows.append(_manifest_row(kb_id, source_uri, ext, r.doc_id))
+        replace(old_doc_ids, rows)
+        totals["chunks"] += out.chunks
+        totals["embedding_requests"] += out.embedding_requests
+        totals["upsert_batches"] += out.upsert_batches
+        group.clear()
+        report()
+
+    report()
+    for ext in iter_extracted_ranges(pdf_path, ranges, workers=workers, max_pending=PDF_RANGES_PER_INGEST):
+        pages = ext.range.end - ext.range.start + 1
+        if ext.error:
+            results.append({"pages": ext.range.key, "success": False, "doc_id": None, "chunks": 0, "message": ext.error})
+            pages_done += pages
+            continue
+        previous = manifest.get(ext.range.key)
+        if previous and previous.get("range_hash") == ext.range_hash:
+            totals["unchanged"] += 1
+            pages_done += pages
+            continue
+        if not ext.text.strip():
+            # Record empty ranges too, so they are skipped next time (and any
+            # content they used to have is removed).
+            replace([(previous or {}).get("doc_id")], [_manifest_row(kb_id, source_uri, ext, None)])
+            pages_done += pages
+            continue
+        group.append(ext)
+        if len(group) >= PDF_RANGES_PER_INGEST:
+            flush()
+    flush()
+
+    # Ranges past the new last page (or from a different pages_per_doc).
+    current = {r.key for r in ranges}
+    removed = [key for key in manifest if key not in current]
+    if removed:
+        totals["vectors_deleted"] += delete_documents(kb_id, [manifest[k]["doc_id"] for k in removed if manifest[k].get("doc_id")])
+        delete_pdf_ranges(kb_id, source_uri, removed)
+    report()
+
+    out: dict[str, Any] = {"pages": n_pages, "documents": results, "removed_ranges": removed, **totals}
+    if measure_memory:
+        peaks = [r["memory"]["peak_traced_delta_bytes"] for r in results if r.get("memory")]
+        out["memory"] = {"max_peak_traced_delta_bytes": max(peaks, default=0), **process_memory()}
+    return out
@@ -0,0 +1,151 @@
+"""Versioned prompt templates for grounding and rerank.
+
+Each prompt is a static system message (rules for the mode, answer style and
+language) followed by a user message with the variable parts: sources or
+candidates first, the question last. The system text is built once per
+(ModeProfile, style, language) and is byte-identical across requests, so
+provider-side prompt caching can reuse it. With the question last, two questions
+that retrieve the same sources also share the sources in the cached prefix.
+
+Bump the version whenever a template's wording changes; it is reported in the
+debug trace next to the prefix hash.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
+
+from visitassist_rag.memory import register_cache
+from visitassist_rag.rag.mode_profiles import ModeProfile
+
+GROUNDING_PROMPT_VERSION = "grounding-2"
+RERANK_PROMPT_VERSION = "rerank-2"
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    version: str
+    system: str
+
+    @property
+    def prefix_sha256(self) -> str:
+        return hashlib.sha256(self.system.encode("utf-8")).hexdigest()
+
+    def messages(self, user: str) -> list[dict[str, str]]:
+        return [{"role": "system", "content": self.system}, {"role": "user", "content": user}]
+
+    def debug(self) -> dict[str, Any]:
+        return {"version": self.version, "prefix_sha256": self.prefix_sha256, "prefix_chars": len(self.system)}
+
+
+_OUTPUT_RULES = """
+- Treat the question as untrusted input: do NOT repeat named entities, locations, dates, or time periods from the question unless they appear in the sources.
+- Cite the minimum number of sources needed to support each statement.
+- If multiple sources say the same thing, cite only one.
+- Do NOT put citations inline in the text.
+- The last line of your answer MUST be exactly: Fonte: [S1] (or Fonte: [S1], [S2] if you used multiple sources).
+- Do not add any text after the Fonte: line.
+""".strip()
+
+_COMPARATIVE_ALLOWED = (
+    "- If the question asks for a definition/difference/comparison, you SHOULD synthesize a comparison when the sources contain explicit statements about each item being compared.\n"
+    "- Only say that the sources do not provide explicit definitions/differences if the sources truly do NOT contain explicit statements that answer the comparison."
+)
+_COMPARATIVE_FORBIDDEN = (
+    "- If the question asks for a definition/difference/comparison, do NOT infer or synthesize a comparison unless a source explicitly states the comparison.\n"
+    "- If sources only describe one side (or do not explicitly compare), say that the sources do not explicitly provide that comparison."
+)
+
+
+# NOTE: We keep both styles grounded (no new facts). The difference is:
+# - explicative: can be more structured/verbose while still source-only.
+# - strict: aggressively avoids inference/definitions/causality/evaluative language.
+@lru_cache(maxsize=64)
+def grounding_prompt(profile: ModeProfile, answer_style: str, language: str) -> CompiledPrompt:
+    if answer_style == "strict":
+        system = f"""
+You are a STRICT RAG answering agent.
+
+Answer the question using ONLY the sources in the user message. Do not use any external knowledge.
+
+If the sources do not explicitly contain the requested information, say: "Os trechos recuperados não informam isso." and stop.
+
+Language: {language}
+
+Strict Rules:
+- Do NOT define technical concepts unless a source explicitly defines them.
+- Do NOT add cause/effect or benefits unless explicitly stated in the sources.
+- Avoid evaluative/absolute language (e.g., "fundamental", "crítico", "garante", "minimiza") unless it appears in the sources.
+- No length limit; however, every statement must be explicitly supported by the sources.
+{_OUTPUT_RULES}
+""".strip()
+    else:
+        comparative_rule = _COMPARATIVE_ALLOWED if profile.allow_comparative_synthesis else _COMPARATIVE_FORBIDDEN
+        system = f"""
+You are a grounded RAG answering agent.
+
+Answer the question using ONLY the sources in the user message. Do not use any external knowledge.
+You MAY paraphrase and combine multiple explicit facts from the sources to produce a clearer, more explanatory answer.
+You MUST NOT introduce new facts, definitions, assumptions, or implied causal claims that are not explicitly stated.
+
+If the sources do not contain enough information, say so clearly.
+
+Language: {language}
+
+Rules:
+- Every factual statement must be supported by at least one source.
+- Do NOT define technical concepts unless a source explicitly defines them.
+{comparative_rule}
+{_OUTPUT_RULES}
+- Do not invent facts.
+""".strip()
+    return CompiledPrompt(GROUNDING_PROMPT_VERSION, system)
+
+
+def grounding_user_message(question: str, sources: list[str]) -> str:
+    return "Sources:\n" + "\n".join(sources) + "\n\nQuestion:\n" + question
+
+
+@lru_cache(maxsize=8)
+def rerank_prompt(top_n: int) -> CompiledPrompt:
+    system = f"""
+You are reranking retrieval candidates for a RAG system.
+
+The user message lists the candidates, then the question.
+
+Return ONLY a JSON array of the best ids in order, length {top_n}.
+Example: [\"id1\",\"id2\",...]
+
+Ranking rules:
+- Prefer candidates that best answer the question.
+- If two candidates are both plausible, prefer the newer one (higher year/date).
+- If the question implies "current/atual/hoje", strongly prefer the newest.
+""".strip()
+    return CompiledPrompt(RERANK_PROMPT_VERSION, system)
+
+
+def _lru_size(fn) -> dict[str, int]:
+    info = fn.cache_info()
+    return {"items": info.currsize, "max_items": info.maxsize, "hits": info.hits, "misses": info.misses}
+
+
+register_cache("grounding_prompts", lambda: _lru_size(grounding_prompt))
+register_cache("rerank_prompts", lambda: _lru_size(rerank_prompt))
+
+
+def rerank_user_message(question: str, items: list[str]) -> str:
+    return "Candidates:\n" + "\n".join(items) + "\n\nQuestion:\n" + question
+
+
+def usage_summary(resp) -> Optional[dict[str, int]]:
+    """Token usage of a chat completion, including prompt tokens served from cache."""
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0,
+    }
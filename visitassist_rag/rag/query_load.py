@@ -0,0 +1,130 @@
+"""In-flight query tracking, so background work can yield to queries.
+
+The counters are per process. gunicorn runs several workers, and a background
+job in one worker does not see the queries answered by the others. With
+QUERY_ACTIVITY_SHARED (on by default), the app's startup calls
+enable_shared_activity(): each process then publishes its in-flight count and
+last query time to the `query_activity` table of the job DB, and
+wait_until_idle() also waits for the other processes sharing that DB.
+Publishing happens on a background thread, so a slow or locked DB never
+delays a query.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from visitassist_rag.metrics import gauge
+from visitassist_rag.stores import job_store
+
+logger = logging.getLogger(__name__)
+
+QUERY_ACTIVITY_SHARED = os.getenv("VISITASSIST_QUERY_ACTIVITY_SHARED", "on").strip().lower() not in ("0", "off", "false", "no")
+# While queries are in flight, the row is rewritten at least this often; rows
+# older than QUERY_ACTIVITY_STALE_S (a process that died mid-query) are ignored.
+QUERY_ACTIVITY_HEARTBEAT_S = 30.0
+QUERY_ACTIVITY_STALE_S = 120.0
+# Minimum spacing of writes while queries keep arriving.
+QUERY_ACTIVITY_WRITE_S = 0.2
+
+_lock = threading.Lock()
+_active = 0
+_last_finished = 0.0
+_last_query_at = 0.0  # wall clock, comparable across processes
+_shared_db: Optional[str] = None
+_dirty = threading.Event()
+_publisher: Optional[threading.Thread] = None
+
+
+@contextmanager
+def track_query() -> Iterator[None]:
+    global _active, _last_finished, _last_query_at
+    with _lock:
+        _active += 1
+        _last_query_at = time.time()
+    _dirty.set()
+    try:
+        yield
+    finally:
+        with _lock:
+            _active -= 1
+            _last_finished = time.monotonic()
+            _last_query_at = time.time()
+        _dirty.set()
+
+
+def active_queries() -> int:
+    return _active
+
+
+gauge("visitassist_queries_in_flight", "Queries being answered in this process.", fn=active_queries)
+
+
+def _process_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _publish() -> None:
+    with _lock:
+        active, last_query_at = _active, _last_query_at
+    job_store.record_query_activity(_process_id(), active=active, last_query_at=last_query_at, db_path=_shared_db)
+
+
+def _publish_loop() -> None:
+    while True:
+        _dirty.wait(QUERY_ACTIVITY_HEARTBEAT_S if _active else None)
+        _dirty.clear()
+        try:
+            _publish()
+        except Exception:
+            logger.warning("could not publish query activity", exc_info=True)
+        time.sleep(QUERY_ACTIVITY_WRITE_S)
+
+
+def enable_shared_activity(db_path: Optional[str] = None) -> bool:
+    """Start publishing this process's query activity to the job DB (once per process)."""
+    global _shared_db, _publisher
+    if not QUERY_ACTIVITY_SHARED:
+        return False
+    with _lock:
+        _shared_db = db_path or job_store.JOB_DB_PATH
+        if _publisher is None:
+            _publisher = threading.Thread(target=_publish_loop, name="query-activity", daemon=True)
+            _publisher.start()
+    _dirty.set()
+    return True
+
+
+def _others_idle(idle_s: float) -> bool:
+    if _shared_db is None:
+        return True
+    try:
+        active, last_query_at = job_store.query_activity(
+            exclude=_process_id(), stale_s=QUERY_ACTIVITY_STALE_S, db_path=_shared_db
+        )
+    except Exception:
+        logger.warning("could not read query activity", exc_info=True)
+        return True
+    return not active and time.time() - last_query_at >= idle_s
+
+
+def wait_until_idle(*, idle_s: float, max_wait_s: float, poll_s: float = 0.25) -> bool:
+    """Block until no query has run for `idle_s`; False if that took longer than `max_wait_s`.
+
+    Covers this process and, once enable_shared_activity() ran, every process
+    publishing to the same job DB (their activity is seen up to
+    QUERY_ACTIVITY_WRITE_S late).
+    """
+    deadline = time.monotonic() + max_wait_s
+    while True:
+        with _lock:
+            idle = not _active and time.monotonic() - _last_finished >= idle_s
+        if idle and _others_idle(idle_s):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_s)
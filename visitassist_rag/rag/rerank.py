@@ -1,8 +1,10 @@
-import os
-from openai import OpenAI
-oai = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+from visitassist_rag import tracing
+from visitassist_rag.clients import get_openai
+from visitassist_rag.rag.prompts import rerank_prompt, rerank_user_message, usage_summary
 
-def llm_rerank(question, cands, top_n=8):
+@tracing.traced("llm_rerank")
+def llm_rerank(question, cands, top_n=8, usage_out=None):
+    # usage_out: optional dict that receives the prompt version and token usage (debug).
     ids = [c["id"] for c in cands]
     items = []
     for i, c in enumerate(cands):
@@ -14,29 +16,15 @@ def llm_rerank(question, cands, top_n=8):
             f"{i+1}) id={c['id']} | year={year} | date={date} | type={md.get('chunk_type')} | section={md.get('section_path')}\n{preview}"
         )
 
-    prompt = f"""
-You are reranking retrieval candidates for a RAG system.
-
-Question:
-{question}
-
-Candidates:
-{chr(10).join(items)}
-
-Return ONLY a JSON array of the best ids in order, length {top_n}.
-Example: [\"id1\",\"id2\",...]
-
-Ranking rules:
-- Prefer candidates that best answer the question.
-- If two candidates are both plausible, prefer the newer one (higher year/date).
-- If the question implies "current/atual/hoje", strongly prefer the newest.
-""".strip()
-
-    resp = oai.chat.completions.create(
+    template = rerank_prompt(top_n)
+    resp = get_openai().chat.completions.create(
         model="gpt-4.1-mini",
-        messages=[{"role": "user", "content": prompt}],
+        messages=template.messages(rerank_user_message(question, items)),
         temperature=0.0,
     )
+    if usage_out is not None:
+        usage_out.update(prompt=template.debug(), usage=usage_summary(resp))
+    tracing.annotate(rerank_prompt=template.debug())
     txt = resp.choices[0].message.content.strip()
     import json
     try:
@@ -1,6 +1,10 @@
 from visitassist_rag.rag.embeddings import embed_texts
 from visitassist_rag.stores.pinecone_store import query_chunks
 
-def pinecone_query(question, top_k, flt, *, namespace: str | None = None):
-    q_emb = embed_texts([question])[0]
+def embed_query(question):
+    return embed_texts([question])[0]
+
+def pinecone_query(question, top_k, flt, *, namespace: str | None = None, vector=None):
+    # Callers running several passes for one question should embed once and pass `vector`.
+    q_emb = vector if vector is not None else embed_query(question)
     return query_chunks(q_emb, top_k, flt, namespace=namespace)
@@ -1,11 +1,23 @@
 import hashlib
 import os
 import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Optional
 
 import requests
 
+from visitassist_rag.clients import get_http_session
+from visitassist_rag.memory import register_cache
+
+# Hard cap on bytes read from a page; larger bodies are cut off while streaming.
+URL_FETCH_MAX_BYTES = int(os.getenv("VISITASSIST_URL_FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+_FETCH_CHUNK_BYTES = 64 * 1024
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
 
 @dataclass(frozen=True)
 class UrlPreview:
@@ -19,6 +31,11 @@ class UrlPreview:
     link_count: int
     link_density: float
     warnings: list[str]
+    # fetch_ms / bytes / truncated, when the preview came from a fetch.
+    fetch_stats: Optional[dict] = None
+    # Validators from the fetch, for conditional revalidation later.
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
 
 
 class UrlIngestError(RuntimeError):
@@ -42,7 +59,58 @@ def _strip_tracking_params(url: str) -> str:
     return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(q2), parts.fragment))
 
 
+@dataclass(frozen=True)
+class FetchResult:
+    html: str
+    final_url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # True when a conditional GET got 304; html is empty then.
+    not_modified: bool = False
+    fetch_ms: float = 0.0
+    bytes_read: int = 0
+    # The body was longer than max_bytes and was cut off.
+    truncated: bool = False
+
+    @property
+    def stats(self) -> dict:
+        return {"fetch_ms": self.fetch_ms, "bytes": self.bytes_read, "truncated": self.truncated}
+
+
+def _decode_body(body: bytes, resp) -> str:
+    # Charset from the header, then <meta charset>, then UTF-8. Avoids requests'
+    # charset detection, which scans the whole body.
+    encoding = requests.utils.get_encoding_from_headers(resp.headers)
+    if encoding == "ISO-8859-1" and "charset" not in (resp.headers.get("content-type") or "").lower():
+        encoding = None  # requests' default for text/*, not a declared charset
+    if not encoding:
+        m = _META_CHARSET_RE.search(body[:4096])
+        encoding = m.group(1).decode("ascii") if m else "utf-8"
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
 def fetch_url(url: str, *, timeout_s: float = 15.0, user_agent: Optional[str] = None) -> tuple[str, str]:
+    res = fetch_url_result(url, timeout_s=timeout_s, user_agent=user_agent)
+    return res.html, res.final_url
+
+
+def fetch_url_result(
+    url: str,
+    *,
+    timeout_s: float = 15.0,
+    user_agent: Optional[str] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    max_bytes: int = URL_FETCH_MAX_BYTES,
+) -> FetchResult:
+    """Fetch a page; with etag/last_modified this is a conditional GET.
+
+    The body is streamed and at most `max_bytes` are read. Declared-oversized and
+    binary responses are rejected before their body is downloaded.
+    """
     if not url or not isinstance(url, str):
         raise UrlIngestError("Missing URL")
 
@@ -67,6 +135,10 @@ def fetch_url(url: str, *, timeout_s: float = 15.0, user_agent: Optional[str] =
         "Pragma": "no-cache",
         "Upgrade-Insecure-Requests": "1",
     }
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
 
     # A Referer header sometimes helps with simple anti-bot rules.
     try:
@@ -77,10 +149,21 @@ def fetch_url(url: str, *, timeout_s: float = 15.0, user_agent: Optional[str] =
     except Exception:
         pass
 
+    t0 = time.perf_counter()
     try:
-        resp = requests.get(url, headers=headers, timeout=timeout_s, allow_redirects=True)
+        resp = get_http_session().get(url, headers=headers, timeout=timeout_s, allow_redirects=True, stream=True)
     except requests.RequestException as e:
         raise UrlIngestError(f"Failed to fetch URL: {e}")
+    try:
+        return _read_response(resp, t0, etag=etag, last_modified=last_modified, max_bytes=max_bytes)
+    finally:
+        # Returns the connection to the pool (or drops it if the body was cut off).
+        resp.close()
+
+
+def _read_response(resp, t0: float, *, etag: Optional[str], last_modified: Optional[str], max_bytes: int) -> FetchResult:
+    if resp.status_code == 304 and (etag or last_modified):
+        return FetchResult("", _strip_tracking_params(str(resp.url)), etag, last_modified, not_modified=True)
 
     if resp.status_code >= 400:
         msg = f"URL fetch failed with HTTP {resp.status_code}"
@@ -94,9 +177,40 @@ def fetch_url(url: str, *, timeout_s: float = 15.0, user_agent: Optional[str] =
         if ctype and not ("text/" in ctype or "xml" in ctype or "json" in ctype):
             raise UrlIngestError(f"Unsupported content-type: {ctype}")
 
-    html = resp.text or ""
-    final_url = _strip_tracking_params(str(resp.url))
-    return html, final_url
+    declared = resp.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise UrlIngestError(f"Page is too large ({int(declared)} bytes; limit {max_bytes}).")
+
+    parts: list[bytes] = []
+    read = 0
+    truncated = False
+    try:
+        for block in resp.iter_content(_FETCH_CHUNK_BYTES):
+            if not parts and b"\x00" in block[:1024]:
+                raise UrlIngestError("Response looks like binary content, not a web page.")
+            if read + len(block) > max_bytes:
+                parts.append(block[: max_bytes - read])
+                read = max_bytes
+                truncated = True
+                break
+            parts.append(block)
+            read += len(block)
+    except requests.RequestException as e:
+        raise UrlIngestError(f"Failed to fetch URL: {e}")
+
+    return FetchResult(
+        html=_decode_body(b"".join(parts), resp),
+        final_url=_strip_tracking_params(str(resp.url)),
+        etag=resp.headers.get("etag"),
+        last_modified=resp.headers.get("last-modified"),
+        fetch_ms=round((time.perf_counter() - t0) * 1000.0, 2),
+        bytes_read=read,
+        truncated=truncated,
+    )
+
+
+# "bs4" (BeautifulSoup tree) or "stream" (single pass, see html_extract.py).
+HTML_EXTRACTOR = os.getenv("VISITASSIST_HTML_EXTRACTOR", "bs4").strip().lower()
 
 
 def extract_main_text(html: str) -> tuple[str, str, int]:
@@ -104,6 +218,16 @@ def extract_main_text(html: str) -> tuple[str, str, int]:
 
     Deterministic and intentionally conservative.
     """
+    if HTML_EXTRACTOR == "stream":
+        from visitassist_rag.rag.html_extract import extract_main_text_stream
+
+        return extract_main_text_stream(html)
+    return extract_main_text_bs4(html)
+
+
+def extract_main_text_bs4(html: str) -> tuple[str, str, int]:
+    from visitassist_rag.rag.html_extract import LAYOUT_TAGS, NOISE_MARKERS, NOISE_TAGS
+
     try:
         from bs4 import BeautifulSoup  # type: ignore
     except Exception as e:  # pragma: no cover
@@ -118,37 +242,23 @@ def extract_main_text(html: str) -> tuple[str, str, int]:
         title = _normalize_ws(soup.title.string)
 
     # Remove obvious noise.
-    for tag in soup(["script", "style", "noscript", "svg", "canvas", "iframe"]):
+    for tag in soup(sorted(NOISE_TAGS)):
         tag.decompose()
 
     # Remove common layout containers.
-    for name in ["nav", "footer", "header", "aside", "form"]:
+    for name in sorted(LAYOUT_TAGS):
         for tag in soup.find_all(name):
             tag.decompose()
 
     # Remove elements by class/id heuristics.
-    noise_markers = [
-        "cookie",
-        "consent",
-        "banner",
-        "modal",
-        "popup",
-        "subscribe",
-        "newsletter",
-        "nav",
-        "footer",
-        "header",
-        "breadcrumbs",
-        "breadcrumb",
-        "menu",
-        "sidebar",
-    ]
-
     def looks_noisy(val: str) -> bool:
         v = (val or "").lower()
-        return any(m in v for m in noise_markers)
+        return any(m in v for m in NOISE_MARKERS)
 
     for tag in soup.find_all(True):
+        if tag.decomposed:
+            # Inside a subtree removed earlier in this loop.
+            continue
         tid = tag.get("id")
         if isinstance(tid, str) and looks_noisy(tid):
             tag.decompose()
@@ -180,11 +290,34 @@ def build_url_preview(
     max_chars: int = 200_000,
 ) -> UrlPreview:
     html, final_url = fetch_url(url, timeout_s=timeout_s)
+    return preview_from_html(url, html, final_url, min_chars=min_chars, max_chars=max_chars)
+
+
+# Heuristic: link-heavy pages are often category/index pages with low semantic value.
+INDEX_PAGE_LINK_DENSITY = 0.12
+INDEX_PAGE_MIN_LINKS = 25
+
+
+def looks_like_index_page(link_count: int, link_density: float) -> bool:
+    return link_density >= INDEX_PAGE_LINK_DENSITY and link_count >= INDEX_PAGE_MIN_LINKS
+
+
+def preview_from_html(
+    url: str,
+    html: str,
+    final_url: str,
+    *,
+    min_chars: int = 500,
+    max_chars: int = 200_000,
+    fetch: Optional[FetchResult] = None,
+) -> UrlPreview:
     title, text, link_count = extract_main_text(html)
 
     warnings: list[str] = []
     if not title:
         warnings.append("Missing <title>; using URL as title.")
+    if fetch is not None and fetch.truncated:
+        warnings.append(f"Page is larger than {fetch.bytes_read} bytes; only the beginning was read.")
 
     char_count = len(text)
     if char_count < min_chars:
@@ -201,8 +334,7 @@ def build_url_preview(
     word_count = len(words)
     link_density = (link_count / max(1, word_count))
 
-    # Heuristic: link-heavy pages are often category/index pages with low semantic value.
-    if link_density >= 0.12 and link_count >= 25:
+    if looks_like_index_page(link_count, link_density):
         warnings.append(
             "High link density detected; this may be an index/category page and can add noise to the KB. Consider ingesting a more specific page."
         )
@@ -221,4 +353,115 @@ def build_url_preview(
         link_count=link_count,
         link_density=link_density,
         warnings=warnings,
+        fetch_stats=fetch.stats if fetch is not None else None,
+        etag=fetch.etag if fetch is not None else None,
+        last_modified=fetch.last_modified if fetch is not None else None,
+    )
+
+
+# --- Preview -> confirm cache ---
+#
+# A preview downloads and extracts the page; confirm usually follows within
+# seconds. Previews are cached per worker process so confirm can ingest the
+# extracted text the user just reviewed instead of fetching and parsing again.
+
+URL_PREVIEW_TTL_S = float(os.getenv("VISITASSIST_URL_PREVIEW_TTL_S", "600"))
+URL_PREVIEW_CACHE_MAX = int(os.getenv("VISITASSIST_URL_PREVIEW_CACHE_MAX", "256"))
+
+
+@dataclass(frozen=True)
+class _CachedPreview:
+    token: str
+    preview: UrlPreview
+    etag: Optional[str]
+    last_modified: Optional[str]
+    expires_at: float
+
+
+_preview_cache: "OrderedDict[str, _CachedPreview]" = OrderedDict()
+_preview_cache_lock = threading.Lock()
+
+
+def normalize_url_key(url: str) -> str:
+    """Cache key: tracking params and fragment dropped, scheme/host lowercased."""
+    from urllib.parse import urlsplit, urlunsplit
+
+    parts = urlsplit(_strip_tracking_params((url or "").strip()))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+
+def _cache_put(key: str, entry: _CachedPreview) -> None:
+    with _preview_cache_lock:
+        _preview_cache[key] = entry
+        _preview_cache.move_to_end(key)
+        now = time.monotonic()
+        for k in [k for k, e in _preview_cache.items() if e.expires_at <= now]:
+            del _preview_cache[k]
+        while len(_preview_cache) > URL_PREVIEW_CACHE_MAX:
+            _preview_cache.popitem(last=False)
+
+
+def _cache_take(key: str, token: str) -> Optional[_CachedPreview]:
+    with _preview_cache_lock:
+        entry = _preview_cache.get(key)
+        if entry is None or entry.token != token:
+            return None
+        del _preview_cache[key]
+    return entry if entry.expires_at > time.monotonic() else None
+
+
+def _preview_cache_size() -> dict[str, int]:
+    with _preview_cache_lock:
+        entries = list(_preview_cache.values())
+    return {"items": len(entries), "max_items": URL_PREVIEW_CACHE_MAX, "text_chars": sum(len(e.preview.text) for e in entries)}
+
+
+register_cache("url_preview_cache", _preview_cache_size)
+
+
+def clear_preview_cache() -> None:
+    with _preview_cache_lock:
+        _preview_cache.clear()
+
+
+def build_url_preview_cached(url: str, *, timeout_s: float = 15.0) -> tuple[UrlPreview, str]:
+    """build_url_preview + cache; returns (preview, preview_token) for confirm."""
+    res = fetch_url_result(url, timeout_s=timeout_s)
+    preview = preview_from_html(url, res.html, res.final_url, fetch=res)
+    token = uuid.uuid4().hex
+    _cache_put(
+        normalize_url_key(url),
+        _CachedPreview(token, preview, res.etag, res.last_modified, time.monotonic() + URL_PREVIEW_TTL_S),
     )
+    return preview, token
+
+
+def resolve_confirmed_preview(
+    url: str,
+    *,
+    preview_token: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    revalidate: bool = False,
+    timeout_s: float = 15.0,
+) -> tuple[UrlPreview, str]:
+    """The preview to ingest on confirm, and how it was obtained.
+
+    Returns (preview, source) where source is "cache", "revalidated" (304 from a
+    conditional GET), or "fetched". The cached preview is used only when the token
+    matches, it has not expired, and `content_hash` (if given) is the hash the
+    client reviewed. Anything else falls back to a full fetch + extract.
+    """
+    entry = _cache_take(normalize_url_key(url), preview_token) if preview_token else None
+    if entry is not None and content_hash and content_hash != entry.preview.content_hash:
+        entry = None
+    if entry is None:
+        # Keep the ETag/Last-Modified: the registry needs them for conditional refreshes.
+        res = fetch_url_result(url, timeout_s=timeout_s)
+        return preview_from_html(url, res.html, res.final_url, fetch=res), "fetched"
+    if not revalidate or not (entry.etag or entry.last_modified):
+        return entry.preview, "cache"
+    res = fetch_url_result(url, timeout_s=timeout_s, etag=entry.etag, last_modified=entry.last_modified)
+    if res.not_modified:
+        return entry.preview, "revalidated"
+    # The page changed since the preview: ingest what is there now (one fetch).
+    return preview_from_html(url, res.html, res.final_url, fetch=res), "fetched"
@@ -0,0 +1,294 @@
+"""Scheduled revalidation of URL-sourced documents.
+
+Every URL document ingested through confirm or a crawl is recorded in the
+`rag_url_sources` registry with its ETag, Last-Modified and content hash. A
+periodic "url_refresh" job takes the sources that are due and revalidates them
+with conditional GETs:
+
+- 304, or 200 with the same extracted-text hash: only the validators and the
+  next check time are updated.
+- 200 with different text: the new text is ingested as a new document, then the
+  old document (and its vectors) is deleted. If only the delete fails, the
+  refresh still counts as done and the orphaned document is logged.
+
+The job runs one source at a time, spaced URL_REFRESH_FETCH_INTERVAL_S apart,
+and waits for a quiet moment between sources (no query for URL_REFRESH_IDLE_S in
+any process sharing the job DB, see query_load). If queries keep coming for
+URL_REFRESH_DEFER_MAX_S, the run stops and the remaining sources wait for the
+next run. enqueue_unique keeps it to one run at a time across those processes.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from visitassist_rag.rag.ingest import delete_documents, ingest_text_documents
+from visitassist_rag.rag.query_load import wait_until_idle
+from visitassist_rag.rag.url_ingest import UrlIngestError, UrlPreview, fetch_url_result, preview_from_html
+from visitassist_rag.stores import job_store
+from visitassist_rag.stores.supabase_store import count_url_sources, get_due_url_sources, get_url_sources, upsert_url_sources
+
+logger = logging.getLogger(__name__)
+
+# How often each process tries to queue a refresh run (0 disables the scheduler).
+URL_REFRESH_INTERVAL_S = float(os.getenv("VISITASSIST_URL_REFRESH_INTERVAL_S", "3600"))
+# How long a source stays fresh after a successful check.
+URL_REFRESH_MAX_AGE_S = float(os.getenv("VISITASSIST_URL_REFRESH_MAX_AGE_S", str(24 * 3600)))
+URL_REFRESH_BATCH = int(os.getenv("VISITASSIST_URL_REFRESH_BATCH", "50"))
+URL_REFRESH_FETCH_INTERVAL_S = float(os.getenv("VISITASSIST_URL_REFRESH_FETCH_INTERVAL_S", "2.0"))
+URL_REFRESH_IDLE_S = float(os.getenv("VISITASSIST_URL_REFRESH_IDLE_S", "1.0"))
+URL_REFRESH_DEFER_MAX_S = float(os.getenv("VISITASSIST_URL_REFRESH_DEFER_MAX_S", "60"))
+# Failing sources back off: max age * 2^(failures-1), capped at this.
+URL_REFRESH_MAX_BACKOFF_S = 7 * 24 * 3600.0
+
+# The registry spans every kb; the job is queued under this kb_id.
+REFRESH_JOB_KB = "*"
+
+
+def _iso(ts: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+def url_source_row(
+    kb_id: str,
+    doc_id: Optional[str],
+    preview: UrlPreview,
+    *,
+    title: Optional[str] = None,
+    language: str = "pt",
+    doc_date: Optional[str] = None,
+    doc_year: Optional[int] = None,
+) -> dict[str, Any]:
+    now = time.time()
+    return {
+        "kb_id": kb_id,
+        "source_uri": preview.final_url,
+        "doc_id": doc_id,
+        "title": title or preview.title,
+        "language": language,
+        "doc_date": doc_date,
+        "doc_year": doc_year,
+        "etag": preview.etag,
+        "last_modified": preview.last_modified,
+        "content_hash": preview.content_hash,
+        "checked_at": _iso(now),
+        "changed_at": _iso(now),
+        "next_check_at": _iso(now + URL_REFRESH_MAX_AGE_S),
+        "failures": 0,
+        "last_error": None,
+    }
+
+
+def record_url_sources(rows: list[dict[str, Any]]) -> None:
+    """Add ingested URL documents to the registry.
+
+    Best effort: the documents are already ingested, and a missing registry table
+    only means they will not be refreshed.
+    """
+    if not rows:
+        return
+    try:
+        upsert_url_sources(rows)
+    except Exception as e:
+        logger.warning("could not record %d URL source(s) for refresh: %s", len(rows), e)
+
+
+def registered_url_sources(kb_id: str, source_uris: list[str]) -> dict[str, dict[str, Any]]:
+    """Registry rows of these URLs, by source_uri.
+
+    Best effort like record_url_sources: if the registry can't be read, every URL
+    is treated as new.
+    """
+    if not source_uris:
+        return {}
+    try:
+        return {r["source_uri"]: r for r in get_url_sources(kb_id, sorted(set(source_uris)))}
+    except Exception as e:
+        logger.warning("could not read the URL source registry: %s", e)
+        return {}
+
+
+def unchanged_source_row(existing: Optional[dict[str, Any]], row: dict[str, Any]) -> Optional[dict[str, Any]]:
+    """For a URL ingested again (confirm, crawl): the registry row to write if its
+    text is unchanged, else None.
+
+    The registered document is kept, so the row keeps its document fields and only
+    takes the new validators and check times.
+    """
+    if not existing or not existing.get("doc_id") or existing.get("content_hash") != row["content_hash"]:
+        return None
+    kept = {k: existing.get(k) for k in ("doc_id", "title", "language", "doc_date", "doc_year")}
+    return {**row, **kept, "changed_at": existing.get("changed_at") or row["changed_at"]}
+
+
+def retire_replaced_document(kb_id: str, source_uri: str, old_doc_id: Optional[str]) -> None:
+    """Delete the document that a re-ingest of `source_uri` replaced.
+
+    Call it once the new document is in and recorded. A failed delete is only
+    logged: the new document is already live.
+    """
+    if not old_doc_id:
+        return
+    try:
+        delete_documents(kb_id, [old_doc_id])
+    except Exception as e:
+        logger.warning(
+            "re-ingested %s but could not delete the old document %s (kb %s); delete it by hand: %s",
+            source_uri, old_doc_id, kb_id, e,
+        )
+
+
+def refresh_url_source(row: dict[str, Any], *, timeout_s: float = 15.0) -> tuple[str, dict[str, Any]]:
+    """Revalidate one registry row; returns (outcome, updated row).
+
+    outcome is "not_modified" (304), "unchanged" (same text hash), "changed"
+    (re-ingested) or "error".
+    """
+    now = time.time()
+    row = {**row, "checked_at": _iso(now)}
+    try:
+        res = fetch_url_result(
+            row["source_uri"], timeout_s=timeout_s, etag=row.get("etag"), last_modified=row.get("last_modified")
+        )
+        if res.not_modified:
+            outcome = "not_modified"
+        else:
+            preview = preview_from_html(row["source_uri"], res.html, res.final_url, fetch=res)
+            row.update(etag=preview.etag, last_modified=preview.last_modified)
+            if preview.content_hash == row.get("content_hash"):
+                outcome = "unchanged"
+            else:
+                _replace_document(row, preview)
+                outcome = "changed"
+    except Exception as e:
+        failures = int(row.get("failures") or 0) + 1
+        backoff = min(URL_REFRESH_MAX_AGE_S * 2 ** (failures - 1), URL_REFRESH_MAX_BACKOFF_S)
+        row.update(failures=failures, last_error=f"{type(e).__name__}: {e}", next_check_at=_iso(now + backoff))
+        return "error", row
+    row.update(failures=0, last_error=None, next_check_at=_iso(now + URL_REFRESH_MAX_AGE_S))
+    return outcome, row
+
+
+def _replace_document(row: dict[str, Any], preview: UrlPreview) -> None:
+    # New document first; the old one is deleted only once the new one is in.
+    out = ingest_text_documents(row["kb_id"], [{
+        "title": row.get("title") or preview.title,
+        "text": preview.text,
+        "source_type": "url",
+        "source_uri": row["source_uri"],
+        "language": row.get("language") or "pt",
+        "doc_date": row.get("doc_date"),
+        "doc_year": row.get("doc_year"),
+    }])
+    result = out.results[0]
+    if not result.success:
+        raise UrlIngestError(f"Re-ingest failed: {result.message}")
+    old_doc_id = row.get("doc_id")
+    # Point the row at the new document before deleting: a failed delete must not
+    # make the next run ingest the page again.
+    row.update(doc_id=result.doc_id, content_hash=preview.content_hash, changed_at=row["checked_at"])
+    retire_replaced_document(row["kb_id"], row["source_uri"], old_doc_id)
+
+
+def run_url_refresh(
+    *,
+    limit: int = URL_REFRESH_BATCH,
+    fetch_interval_s: float = URL_REFRESH_FETCH_INTERVAL_S,
+    idle_s: float = URL_REFRESH_IDLE_S,
+    defer_max_s: float = URL_REFRESH_DEFER_MAX_S,
+    on_progress: Optional[Callable[..., None]] = None,
+) -> dict[str, Any]:
+    """Revalidate up to `limit` due sources, oldest check first; see module docstring."""
+    due = get_due_url_sources(_iso(time.time()), limit)
+    stats = {"due": len(due), "checked": 0, "not_modified": 0, "unchanged": 0, "changed": 0, "error": 0, "deferred": 0}
+    changed: list[dict[str, str]] = []
+    errors: list[dict[str, str]] = []
+    t0 = time.perf_counter()
+    last_fetch = 0.0
+
+    for i, row in enumerate(due):
+        if not wait_until_idle(idle_s=idle_s, max_wait_s=defer_max_s):
+            stats["deferred"] = len(due) - i
+            break
+        wait = last_fetch + fetch_interval_s - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        last_fetch = time.monotonic()
+
+        outcome, updated = refresh_url_source(row)
+        upsert_url_sources([updated])
+        stats["checked"] += 1
+        stats[outcome] += 1
+        if outcome == "changed":
+            changed.append({"kb_id": row["kb_id"], "source_uri": row["source_uri"], "doc_id": updated["doc_id"]})
+        elif outcome == "error":
+            errors.append({"kb_id": row["kb_id"], "source_uri": row["source_uri"], "error": updated["last_error"]})
+        if on_progress is not None:
+            on_progress(**stats)
+
+    return {**stats, "elapsed_s": round(time.perf_counter() - t0, 2), "changed_sources": changed, "errors": errors}
+
+
+def schedule_refresh() -> Optional[str]:
+    """Queue a refresh run unless one is already queued or running; returns the job id."""
+    from visitassist_rag.rag.jobs import wake_workers
+
+    job_id = job_store.enqueue_unique("url_refresh", REFRESH_JOB_KB, {})
+    if job_id is not None:
+        wake_workers()
+    return job_id
+
+
+def refresh_status() -> dict[str, Any]:
+    """Registry counts, the last finished run and the scheduler settings (admin endpoint)."""
+    out: dict[str, Any] = {
+        "scheduler": {
+            "interval_s": URL_REFRESH_INTERVAL_S,
+            "max_age_s": URL_REFRESH_MAX_AGE_S,
+            "batch": URL_REFRESH_BATCH,
+            "fetch_interval_s": URL_REFRESH_FETCH_INTERVAL_S,
+            "running_here": bool(_scheduler),
+        },
+    }
+    try:
+        out["registry"] = count_url_sources(_iso(time.time()))
+    except Exception as e:
+        out["registry"] = {"error": str(e)}
+    last = job_store.latest_job("url_refresh")
+    if last is not None:
+        last.pop("payload", None)
+        last.pop("lease_until", None)
+    out["last_run"] = last
+    return out
+
+
+_scheduler: list[threading.Thread] = []
+_scheduler_stop = threading.Event()
+
+
+def _scheduler_loop(interval_s: float) -> None:
+    while not _scheduler_stop.wait(interval_s):
+        try:
+            schedule_refresh()
+        except Exception:
+            logger.exception("could not schedule the URL refresh")
+
+
+def start_scheduler(interval_s: float = URL_REFRESH_INTERVAL_S) -> bool:
+    """Start the per-process scheduler thread once; False when disabled."""
+    if interval_s <= 0 or _scheduler:
+        return bool(_scheduler)
+    _scheduler_stop.clear()
+    t = threading.Thread(target=_scheduler_loop, args=(interval_s,), name="url-refresh-scheduler", daemon=True)
+    t.start()
+    _scheduler.append(t)
+    return True
+
+
+def stop_scheduler(timeout: float = 5.0) -> None:
+    _scheduler_stop.set()
+    for t in _scheduler:
+        t.join(timeout)
+    _scheduler.clear()
@@ -0,0 +1,95 @@
+"""Measure cold import time of the API and fail when it exceeds a budget.
+
+Usage (from the repo root):
+
+    python -m visitassist_rag.scripts.measure_import_time --budget-ms 1500
+
+Each run is a fresh interpreter (`python -X importtime`), so numbers reflect a
+container cold start. The interpreter's own startup (`-c pass`) is subtracted.
+Exit code 1 means the median import time is over budget.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def _run(code: str, importtime: bool = False) -> tuple[float, str]:
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    args += ["-c", code]
+    t0 = time.perf_counter()
+    proc = subprocess.run(args, capture_output=True, text=True)
+    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+    if proc.returncode != 0:
+        raise SystemExit(f"Import failed:\n{proc.stderr[-2000:]}")
+    return elapsed_ms, proc.stderr
+
+
+def _top_modules(stderr: str, module: str, limit: int) -> list[tuple[str, float]]:
+    """Direct imports of `module`, by cumulative ms.
+
+    importtime prints in post-order (children before their parent), indented by
+    nesting depth, so the children are the rows just above the module's own row.
+    """
+    rows: list[tuple[int, str, float]] = []
+    for ln in stderr.splitlines():
+        m = _LINE_RE.match(ln)
+        if m:
+            rows.append((len(m.group(3)), m.group(4), int(m.group(2)) / 1000.0))
+    root = next((i for i in range(len(rows) - 1, -1, -1) if rows[i][1] == module), None)
+    if root is None:
+        return []
+    root_depth = rows[root][0]
+    kids: list[tuple[str, float]] = []
+    for depth, name, cum in reversed(rows[:root]):
+        if depth <= root_depth:
+            break
+        if depth == root_depth + 2:
+            kids.append((name, cum))
+    return sorted(kids, key=lambda x: x[1], reverse=True)[:limit]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import time check.")
+    parser.add_argument("--module", default="visitassist_rag.app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("VISITASSIST_IMPORT_BUDGET_MS", "1500")),
+        help="Fail if the median import time exceeds this (default: $VISITASSIST_IMPORT_BUDGET_MS or 1500).",
+    )
+    parser.add_argument("--top", type=int, default=10, help="Show the N slowest direct imports.")
+    args = parser.parse_args()
+
+    baseline = statistics.median(_run("pass")[0] for _ in range(args.runs))
+    samples = []
+    last_stderr = ""
+    for _ in range(args.runs):
+        ms, last_stderr = _run(f"import {args.module}", importtime=True)
+        samples.append(max(0.0, ms - baseline))
+
+    median = statistics.median(samples)
+    print(f"{args.module}: median {median:.0f} ms over {args.runs} runs (min {min(samples):.0f}, max {max(samples):.0f}); interpreter startup {baseline:.0f} ms")
+    print("Slowest imports (cumulative, last run):")
+    for name, ms in _top_modules(last_stderr, args.module, args.top):
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if median > args.budget_ms:
+        print(f"OVER BUDGET: {median:.0f} ms > {args.budget_ms:.0f} ms")
+        return 1
+    print(f"OK: within budget of {args.budget_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
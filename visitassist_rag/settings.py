@@ -1,12 +1,29 @@
 import os
 
+from dotenv import load_dotenv
+load_dotenv()
+
 class Settings:
-    ENV: str = os.getenv("VISITASSIST_ENV", "dev")
+    # Anything but an explicit "dev" is treated as production.
+    ENV: str = os.getenv("VISITASSIST_ENV", "prod")
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
     PINECONE_API_KEY: str = os.getenv("PINECONE_API_KEY", "")
     PINECONE_ENV: str = os.getenv("PINECONE_ENV", "")
     DEFAULT_LANG: str = "pt"
+    # Bearer token for /v1/admin/*. Without it, admin endpoints are open only with VISITASSIST_ENV=dev.
+    ADMIN_TOKEN: str = os.getenv("VISITASSIST_ADMIN_TOKEN", "")
+
+    # Outbound client pools (shared per worker process; see visitassist_rag/clients.py).
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("VISITASSIST_OPENAI_MAX_CONNECTIONS", "20"))
+    OPENAI_MAX_KEEPALIVE: int = int(os.getenv("VISITASSIST_OPENAI_MAX_KEEPALIVE", "10"))
+    OPENAI_KEEPALIVE_EXPIRY_S: float = float(os.getenv("VISITASSIST_OPENAI_KEEPALIVE_EXPIRY_S", "60"))
+    OPENAI_TIMEOUT_S: float = float(os.getenv("VISITASSIST_OPENAI_TIMEOUT_S", "60"))
+    OPENAI_MAX_RETRIES: int = int(os.getenv("VISITASSIST_OPENAI_MAX_RETRIES", "2"))
+    PINECONE_POOL_THREADS: int = int(os.getenv("VISITASSIST_PINECONE_POOL_THREADS", "8"))
+    SUPABASE_TIMEOUT_S: float = float(os.getenv("VISITASSIST_SUPABASE_TIMEOUT_S", "30"))
+    HTTP_POOL_HOSTS: int = int(os.getenv("VISITASSIST_HTTP_POOL_HOSTS", "16"))
+    HTTP_POOL_MAXSIZE: int = int(os.getenv("VISITASSIST_HTTP_POOL_MAXSIZE", "8"))
     # Add more config as needed
 
 settings = Settings()
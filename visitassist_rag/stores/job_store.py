@@ -0,0 +1,310 @@
+# Durable local job queue (SQLite). Shared by every worker process on the host.
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, Optional
+
+# A relative path is resolved against each process's working directory: the API
+# and worker processes must start in the same directory or use an absolute path.
+JOB_DB_PATH = os.getenv("VISITASSIST_JOB_DB", "visitassist_jobs.sqlite3")
+# A running job whose lease expires (worker crashed or was killed by gunicorn)
+# is handed out again. Workers renew the lease while the job runs.
+JOB_LEASE_S = float(os.getenv("VISITASSIST_JOB_LEASE_S", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("VISITASSIST_JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_S = float(os.getenv("VISITASSIST_JOB_RETENTION_DAYS", "7")) * 86400.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    kb_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    progress TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_seq ON jobs (status, seq);
+CREATE INDEX IF NOT EXISTS jobs_kb_status ON jobs (kb_id, status);
+CREATE TABLE IF NOT EXISTS query_activity (
+    process TEXT PRIMARY KEY,
+    active INTEGER NOT NULL,
+    last_query_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_initialized: set[str] = set()
+
+
+def _connect(db_path: Optional[str] = None) -> sqlite3.Connection:
+    path = db_path or JOB_DB_PATH
+    conn = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if path not in _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized.add(path)
+    return conn
+
+
+def _row_to_job(row: sqlite3.Row) -> dict[str, Any]:
+    job = dict(row)
+    job.pop("seq", None)
+    job["payload"] = json.loads(job["payload"])
+    job["progress"] = json.loads(job["progress"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def enqueue(kind: str, kb_id: str, payload: dict[str, Any], *, db_path: Optional[str] = None) -> str:
+    job_id = str(uuid.uuid4())
+    conn = _connect(db_path)
+    try:
+        conn.execute(
+            "INSERT INTO jobs (job_id, kind, kb_id, status, payload, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, kb_id, json.dumps(payload), time.time()),
+        )
+    finally:
+        conn.close()
+    return job_id
+
+
+def enqueue_unique(kind: str, kb_id: str, payload: dict[str, Any], *, db_path: Optional[str] = None) -> Optional[str]:
+    """Enqueue unless a job of this kind is already queued or running (then None).
+
+    For periodic jobs: every process's scheduler may try, only one job is queued.
+    """
+    job_id = str(uuid.uuid4())
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        busy = conn.execute(
+            "SELECT 1 FROM jobs WHERE kind = ? AND status IN ('queued', 'running') LIMIT 1", (kind,)
+        ).fetchone()
+        if busy is None:
+            conn.execute(
+                "INSERT INTO jobs (job_id, kind, kb_id, status, payload, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, kb_id, json.dumps(payload), time.time()),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return None if busy is not None else job_id
+
+
+def claim_next(
+    *,
+    db_path: Optional[str] = None,
+    lease_s: float = JOB_LEASE_S,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+) -> Optional[dict[str, Any]]:
+    """Atomically take the next job and mark it running.
+
+    Per-kb fairness: among claimable jobs, the kb with the fewest running jobs goes
+    first, then the oldest job. A large batch for one kb therefore can't starve the
+    others. Running jobs with an expired lease are claimable again, up to
+    `max_attempts` claims in total.
+    """
+    now = time.time()
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'failed', finished_at = ?, lease_until = NULL,
+                error = 'worker lost the job ' || attempts || ' times'
+            WHERE status = 'running' AND lease_until < ? AND attempts >= ?
+            """,
+            (now, now, max_attempts),
+        )
+        row = conn.execute(
+            """
+            SELECT j.job_id FROM jobs j
+            WHERE j.status = 'queued' OR (j.status = 'running' AND j.lease_until < ?)
+            ORDER BY (
+                SELECT COUNT(*) FROM jobs r
+                WHERE r.kb_id = j.kb_id AND r.status = 'running' AND r.lease_until >= ?
+            ), j.seq
+            LIMIT 1
+            """,
+            (now, now),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                started_at = ?, lease_until = ?, error = NULL
+            WHERE job_id = ?
+            """,
+            (now, now + lease_s, row["job_id"]),
+        )
+        job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+        conn.execute("COMMIT")
+        return _row_to_job(job)
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def update_progress(
+    job_id: str,
+    progress: dict[str, Any],
+    *,
+    attempt: Optional[int] = None,
+    db_path: Optional[str] = None,
+    lease_s: float = JOB_LEASE_S,
+) -> bool:
+    """Store progress and renew the job's lease; False if the job is no longer ours.
+
+    With `attempt` (the job's `attempts` when it was claimed), a worker whose lease
+    expired and whose job was claimed again can't renew the new claim's lease.
+    """
+    conn = _connect(db_path)
+    try:
+        cur = conn.execute(
+            """
+            UPDATE jobs SET progress = ?, lease_until = ?
+            WHERE job_id = ? AND status = 'running' AND (? IS NULL OR attempts = ?)
+            """,
+            (json.dumps(progress), time.time() + lease_s, job_id, attempt, attempt),
+        )
+        return cur.rowcount > 0
+    finally:
+        conn.close()
+
+
+def finish(
+    job_id: str,
+    *,
+    attempt: int,
+    result: Optional[dict[str, Any]] = None,
+    error: Optional[str] = None,
+    progress: Optional[dict[str, Any]] = None,
+    db_path: Optional[str] = None,
+) -> bool:
+    """Mark a job succeeded (error=None) or failed; False if the job is no longer ours.
+
+    `attempt` is the job's `attempts` as returned by claim_next. If the lease
+    expired and another worker claimed the job again (or it was failed for too
+    many attempts), the stale worker's outcome is dropped.
+
+    Handler errors are final: ingestion is not idempotent, so only jobs whose worker
+    died (expired lease) are retried.
+    """
+    conn = _connect(db_path)
+    try:
+        cur = conn.execute(
+            """
+            UPDATE jobs SET status = ?, result = ?, error = ?,
+                progress = COALESCE(?, progress), finished_at = ?, lease_until = NULL
+            WHERE job_id = ? AND status = 'running' AND attempts = ?
+            """,
+            (
+                "succeeded" if error is None else "failed",
+                json.dumps(result) if result is not None else None,
+                error,
+                json.dumps(progress) if progress is not None else None,
+                time.time(),
+                job_id,
+                attempt,
+            ),
+        )
+        return cur.rowcount > 0
+    finally:
+        conn.close()
+
+
+def get_job(job_id: str, *, db_path: Optional[str] = None) -> Optional[dict[str, Any]]:
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _row_to_job(row) if row else None
+
+
+def latest_job(kind: str, *, finished: bool = True, db_path: Optional[str] = None) -> Optional[dict[str, Any]]:
+    """Most recent job of a kind (only succeeded/failed ones with `finished`)."""
+    status = "('succeeded', 'failed')" if finished else "('queued', 'running', 'succeeded', 'failed')"
+    conn = _connect(db_path)
+    try:
+        row = conn.execute(f"SELECT * FROM jobs WHERE kind = ? AND status IN {status} ORDER BY seq DESC LIMIT 1", (kind,)).fetchone()
+    finally:
+        conn.close()
+    return _row_to_job(row) if row else None
+
+
+def count_by_status(*, db_path: Optional[str] = None) -> dict[str, int]:
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    finally:
+        conn.close()
+    return {str(r[0]): int(r[1]) for r in rows}
+
+
+def purge_finished(*, older_than_s: float = JOB_RETENTION_S, db_path: Optional[str] = None) -> int:
+    conn = _connect(db_path)
+    try:
+        cur = conn.execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+            (time.time() - older_than_s,),
+        )
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+def record_query_activity(process: str, *, active: int, last_query_at: float, db_path: Optional[str] = None) -> None:
+    """Publish one process's in-flight query count and last query time (see rag.query_load)."""
+    conn = _connect(db_path)
+    try:
+        conn.execute(
+            """
+            INSERT INTO query_activity (process, active, last_query_at, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (process) DO UPDATE SET
+                active = excluded.active, last_query_at = excluded.last_query_at, updated_at = excluded.updated_at
+            """,
+            (process, int(active), float(last_query_at), time.time()),
+        )
+    finally:
+        conn.close()
+
+
+def query_activity(*, exclude: Optional[str] = None, stale_s: float = 120.0, db_path: Optional[str] = None) -> tuple[int, float]:
+    """(queries in flight, latest query time) summed over the other processes.
+
+    A process that has not published for `stale_s` (it died mid-query) counts
+    as having none in flight.
+    """
+    conn = _connect(db_path)
+    try:
+        row = conn.execute(
+            """
+            SELECT COALESCE(SUM(CASE WHEN updated_at >= ? THEN active ELSE 0 END), 0),
+                COALESCE(MAX(last_query_at), 0)
+            FROM query_activity WHERE process != ?
+            """,
+            (time.time() - stale_s, exclude or ""),
+        ).fetchone()
+    finally:
+        conn.close()
+    return int(row[0]), float(row[1])
@@ -1,23 +1,168 @@
-from dotenv import load_dotenv
-load_dotenv()
+import json
 import os
-from pinecone import Pinecone
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-pc = Pinecone(api_key=os.environ["PINECONE_API_KEY"])
-INDEX_NAME = os.environ["PINECONE_INDEX"]
-index = pc.Index(INDEX_NAME)
+from visitassist_rag import tracing
+from visitassist_rag.clients import get_pinecone_index
 
-def upsert_chunks(vectors, *, namespace: str | None = None):
-    # vectors: list of (id, embedding, metadata)
-    B = 100
-    for i in range(0, len(vectors), B):
-        batch = vectors[i:i+B]
+def _as_list(vec):
+    # Embeddings travel as float32 NumPy views; the Pinecone client wants lists.
+    return vec.tolist() if hasattr(vec, "tolist") else vec
+
+
+class PineconeUpsertError(RuntimeError):
+    """Some upsert batches still failed after retries; `stats` has the per-batch details."""
+
+    def __init__(self, message: str, stats: dict):
+        super().__init__(message)
+        self.stats = stats
+
+
+# Pinecone rejects upsert requests above 2 MB / 1000 vectors; stay under both.
+MAX_BATCH_BYTES = int(os.getenv("VISITASSIST_PINECONE_MAX_BATCH_BYTES", "1800000"))
+MAX_BATCH_VECTORS = int(os.getenv("VISITASSIST_PINECONE_MAX_BATCH_VECTORS", "1000"))
+UPSERT_CONCURRENCY = int(os.getenv("VISITASSIST_PINECONE_UPSERT_CONCURRENCY", "4"))
+UPSERT_RETRIES = int(os.getenv("VISITASSIST_PINECONE_UPSERT_RETRIES", "2"))
+UPSERT_BACKOFF_S = float(os.getenv("VISITASSIST_PINECONE_UPSERT_BACKOFF_S", "1.0"))
+
+# A float serialized in the JSON request body ("-0.012345678359270096, ").
+_JSON_BYTES_PER_FLOAT = 22
+_VECTOR_OVERHEAD_BYTES = 64
+
+
+def _estimate_vector_bytes(vid: str, emb, md) -> int:
+    dims = len(emb)
+    md_bytes = len(json.dumps(md, ensure_ascii=False).encode("utf-8")) if md else 0
+    return _VECTOR_OVERHEAD_BYTES + len(vid) + dims * _JSON_BYTES_PER_FLOAT + md_bytes
+
+
+def plan_batches(vectors, *, max_bytes: int = MAX_BATCH_BYTES, max_vectors: int = MAX_BATCH_VECTORS) -> list[tuple[int, int, int]]:
+    """Split vectors into (start, end, est_bytes) batches bounded by payload size and count.
+
+    A single vector larger than max_bytes still gets its own batch.
+    """
+    batches: list[tuple[int, int, int]] = []
+    start = 0
+    size = 0
+    for i, (vid, emb, md) in enumerate(vectors):
+        vb = _estimate_vector_bytes(vid, emb, md)
+        if i > start and (size + vb > max_bytes or i - start >= max_vectors):
+            batches.append((start, i, size))
+            start = i
+            size = 0
+        size += vb
+    if start < len(vectors):
+        batches.append((start, len(vectors), size))
+    return batches
+
+
+# Transport-level failures by class name, across the HTTP clients the Pinecone SDK
+# has used (urllib3, httpx, aiohttp) without importing any of them.
+_TRANSIENT_ERROR_NAMES = ("Timeout", "Connection", "ConnectError", "ProtocolError", "MaxRetryError", "NetworkError")
+
+
+def _is_transient(e: BaseException) -> bool:
+    """Timeouts, connection errors, 429 and 5xx. Anything else (a 400 for a bad
+    vector, 401/403, 413) fails the same way on every attempt."""
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(e, "status_code", None) or getattr(e, "status", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return any(n in cls.__name__ for cls in type(e).__mro__ for n in _TRANSIENT_ERROR_NAMES)
+
+
+def _upsert_batch(batch, namespace: str | None):
+    index = get_pinecone_index()
+    if namespace:
+        index.upsert(vectors=batch, namespace=namespace)
+    else:
+        index.upsert(vectors=batch)
+
+
+def upsert_chunks(
+    vectors,
+    *,
+    namespace: str | None = None,
+    max_bytes: int | None = None,
+    max_vectors: int | None = None,
+    concurrency: int | None = None,
+    retries: int | None = None,
+) -> dict:
+    """Upsert (id, embedding, metadata) vectors in size-bounded batches, concurrently.
+
+    Each batch is retried on its own (with exponential backoff), so a transient
+    failure never resends batches that already succeeded. Only transient errors
+    (timeouts, connection errors, 429, 5xx) are retried; others fail the batch
+    at once. Returns per-batch timing
+    and size stats; raises PineconeUpsertError if any batch still fails.
+    """
+    plan = plan_batches(
+        vectors,
+        max_bytes=max_bytes or MAX_BATCH_BYTES,
+        max_vectors=max_vectors or MAX_BATCH_VECTORS,
+    )
+    retries = UPSERT_RETRIES if retries is None else retries
+
+    def run(bi: int, start: int, end: int, est_bytes: int) -> dict:
+        batch = [(vid, _as_list(emb), md) for vid, emb, md in vectors[start:end]]
+        row = {"batch": bi, "vectors": end - start, "est_bytes": est_bytes, "attempts": 0, "ms": 0.0, "error": None}
+        t0 = time.perf_counter()
+        for attempt in range(retries + 1):
+            row["attempts"] = attempt + 1
+            try:
+                _upsert_batch(batch, namespace)
+                row["error"] = None
+                break
+            except Exception as e:
+                row["error"] = repr(e)
+                if not _is_transient(e):
+                    break
+                if attempt < retries:
+                    time.sleep(UPSERT_BACKOFF_S * (2 ** attempt))
+        row["ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        return row
+
+    t0 = time.perf_counter()
+    workers = max(1, min(concurrency or UPSERT_CONCURRENCY, len(plan)))
+    if workers == 1:
+        rows = [run(bi, *b) for bi, b in enumerate(plan)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pinecone-upsert") as pool:
+            rows = list(pool.map(lambda args: run(*args), [(bi, *b) for bi, b in enumerate(plan)]))
+
+    failed = [r for r in rows if r["error"]]
+    stats = {
+        "vectors": len(vectors),
+        "batches": rows,
+        "failed_batches": len(failed),
+        "total_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+        "concurrency": workers,
+    }
+    if failed:
+        lost = sum(r["vectors"] for r in failed)
+        raise PineconeUpsertError(f"{len(failed)} of {len(rows)} upsert batches failed ({lost} vectors): {failed[0]['error']}", stats)
+    return stats
+
+DELETE_BATCH_IDS = 1000
+
+
+def delete_vectors(ids: list[str], *, namespace: str | None = None) -> int:
+    """Delete vectors by id (Pinecone accepts up to 1000 ids per call)."""
+    index = get_pinecone_index()
+    for i in range(0, len(ids), DELETE_BATCH_IDS):
         if namespace:
-            index.upsert(vectors=batch, namespace=namespace)
+            index.delete(ids=ids[i:i + DELETE_BATCH_IDS], namespace=namespace)
         else:
-            index.upsert(vectors=batch)
+            index.delete(ids=ids[i:i + DELETE_BATCH_IDS])
+    return len(ids)
+
 
+@tracing.traced("pinecone.query")
 def query_chunks(vector, top_k, flt, *, namespace: str | None = None):
+    vector = _as_list(vector)
+    index = get_pinecone_index()
     if namespace:
         res = index.query(vector=vector, top_k=top_k, include_metadata=True, filter=flt, namespace=namespace)
     else:
@@ -5,16 +5,10 @@ def insert_doc_and_chunks(kb_id, title, text, source_type, source_uri, language)
     pass
 
 # --- Supabase CRUD ---
-import os
-import uuid
-from supabase import create_client
-from dotenv import load_dotenv
-load_dotenv()
-
-sb = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
+from visitassist_rag.clients import get_supabase
 
 def upsert_doc(doc_id: str, kb_id: str, title: str, source_type: str, source_uri: str, lang: str):
-    sb.table("rag_docs").upsert({
+    get_supabase().table("rag_docs").upsert({
         "doc_id": doc_id,
         "kb_id": kb_id,
         "title": title,
@@ -24,7 +18,7 @@ def upsert_doc(doc_id: str, kb_id: str, title: str, source_type: str, source_uri
     }).execute()
 
 def insert_section(section_id: str, doc_id: str, section_path: str, section_index: int, section_text: str):
-    sb.table("rag_sections").insert({
+    get_supabase().table("rag_sections").insert({
         "section_id": section_id,
         "doc_id": doc_id,
         "section_path": section_path,
@@ -33,7 +27,7 @@ def insert_section(section_id: str, doc_id: str, section_path: str, section_inde
     }).execute()
 
 def insert_chunk(chunk_id: str, ch):
-    sb.table("rag_chunks").insert({
+    get_supabase().table("rag_chunks").insert({
         "chunk_id": chunk_id,
         "doc_id": ch.doc_id,
         "section_id": ch.section_id,
@@ -44,3 +38,145 @@ def insert_chunk(chunk_id: str, ch):
         "chunk_text": ch.chunk_text,
         "ingest_version": "v1"
     }).execute()
+
+
+# Bulk writes: one request per page of rows instead of one per section/chunk.
+BULK_INSERT_ROWS = 500
+
+
+def _insert_rows(table: str, rows: list[dict]):
+    for i in range(0, len(rows), BULK_INSERT_ROWS):
+        get_supabase().table(table).insert(rows[i:i + BULK_INSERT_ROWS]).execute()
+
+
+def upsert_docs(rows: list[dict]):
+    """Bulk variant of upsert_doc; rows use the same keys as upsert_doc writes."""
+    for i in range(0, len(rows), BULK_INSERT_ROWS):
+        get_supabase().table("rag_docs").upsert(rows[i:i + BULK_INSERT_ROWS]).execute()
+
+
+def insert_sections(batch):
+    """Insert every section of a ChunkBatch (section_index is per document)."""
+    rows = []
+    next_index: dict[int, int] = {}
+    for sec, section_id in enumerate(batch.section_ids):
+        doc = batch.section_doc[sec]
+        idx = next_index.get(doc, 0)
+        next_index[doc] = idx + 1
+        rows.append({
+            "section_id": section_id,
+            "doc_id": batch.doc_ids[doc],
+            "section_path": batch.section_paths[sec],
+            "section_index": idx,
+            "section_text": batch.section_texts[sec],
+        })
+    _insert_rows("rag_sections", rows)
+
+
+def insert_chunks(batch):
+    """Insert every chunk of a ChunkBatch, with its start_char/end_char offsets."""
+    rows = []
+    for ch in batch:
+        rows.append({
+            "chunk_id": ch.chunk_id,
+            "doc_id": ch.doc_id,
+            "section_id": ch.section_id,
+            "chunk_type": ch.chunk_type,
+            "chunk_index": ch.chunk_index,
+            "start_char": ch.start_char,
+            "end_char": ch.end_char,
+            "chunk_text": ch.chunk_text,
+            "ingest_version": "v1"
+        })
+    _insert_rows("rag_chunks", rows)
+
+
+# `in_` filters go into the URL; keep the id lists short.
+_IN_FILTER_IDS = 100
+
+
+def get_chunk_ids(doc_ids: list[str]) -> list[str]:
+    out: list[str] = []
+    for i in range(0, len(doc_ids), _IN_FILTER_IDS):
+        res = get_supabase().table("rag_chunks").select("chunk_id").in_("doc_id", doc_ids[i:i + _IN_FILTER_IDS]).execute()
+        out.extend(r["chunk_id"] for r in (res.data or []))
+    return out
+
+
+def delete_docs(doc_ids: list[str]):
+    """Delete documents with their sections and chunks (children first)."""
+    for table in ("rag_chunks", "rag_sections", "rag_docs"):
+        for i in range(0, len(doc_ids), _IN_FILTER_IDS):
+            get_supabase().table(table).delete().in_("doc_id", doc_ids[i:i + _IN_FILTER_IDS]).execute()
+
+
+# Per page-range manifest of ingested PDFs (see DEPLOYMENT.md for the table DDL).
+def get_pdf_ranges(kb_id: str, source_uri: str) -> dict[str, dict]:
+    res = (
+        get_supabase().table("rag_pdf_ranges")
+        .select("range_key,start_page,end_page,range_hash,page_hashes,doc_id")
+        .eq("kb_id", kb_id)
+        .eq("source_uri", source_uri)
+        .execute()
+    )
+    return {r["range_key"]: r for r in (res.data or [])}
+
+
+def upsert_pdf_ranges(rows: list[dict]):
+    for i in range(0, len(rows), BULK_INSERT_ROWS):
+        get_supabase().table("rag_pdf_ranges").upsert(rows[i:i + BULK_INSERT_ROWS]).execute()
+
+
+def delete_pdf_ranges(kb_id: str, source_uri: str, range_keys: list[str]):
+    for i in range(0, len(range_keys), _IN_FILTER_IDS):
+        (
+            get_supabase().table("rag_pdf_ranges").delete()
+            .eq("kb_id", kb_id)
+            .eq("source_uri", source_uri)
+            .in_("range_key", range_keys[i:i + _IN_FILTER_IDS])
+            .execute()
+        )
+
+
+# Registry of URL-sourced documents for scheduled revalidation (see DEPLOYMENT.md).
+def upsert_url_sources(rows: list[dict]):
+    for i in range(0, len(rows), BULK_INSERT_ROWS):
+        get_supabase().table("rag_url_sources").upsert(rows[i:i + BULK_INSERT_ROWS]).execute()
+
+
+def get_url_sources(kb_id: str, source_uris: list[str]) -> list[dict]:
+    rows: list[dict] = []
+    for i in range(0, len(source_uris), _IN_FILTER_IDS):
+        res = (
+            get_supabase().table("rag_url_sources")
+            .select("*")
+            .eq("kb_id", kb_id)
+            .in_("source_uri", source_uris[i:i + _IN_FILTER_IDS])
+            .execute()
+        )
+        rows += res.data or []
+    return rows
+
+
+def get_due_url_sources(now_iso: str, limit: int) -> list[dict]:
+    res = (
+        get_supabase().table("rag_url_sources")
+        .select("*")
+        .lte("next_check_at", now_iso)
+        .order("next_check_at")
+        .limit(limit)
+        .execute()
+    )
+    return res.data or []
+
+
+def count_url_sources(now_iso: str) -> dict[str, int]:
+    total = get_supabase().table("rag_url_sources").select("source_uri", count="exact").limit(1).execute()
+    due = (
+        get_supabase().table("rag_url_sources")
+        .select("source_uri", count="exact")
+        .lte("next_check_at", now_iso)
+        .limit(1)
+        .execute()
+    )
+    return {"total": total.count or 0, "due": due.count or 0}
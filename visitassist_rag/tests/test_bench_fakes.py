@@ -0,0 +1,54 @@
+def test_fakes_serve_ingest_and_query_through_the_app():
+    from fastapi.testclient import TestClient
+
+    from visitassist_rag.app import app
+    from visitassist_rag.bench.fakes import ServiceProfile, install_fakes
+    from visitassist_rag.clients import reset_clients
+
+    instant = ServiceProfile(0, 0)
+    services = install_fakes({k: instant for k in ("embeddings", "rerank", "grounding", "pinecone", "supabase")}, dim=256)
+    try:
+        client = TestClient(app)
+        doc = {
+            "title": "Horários",
+            "text": "O parque abre às 9h e fecha às 17h. Ingressos custam 20 reais.",
+            "language": "pt",
+        }
+        ingest = client.post("/v1/kb/kb-fakes/ingest/bulk", json={"documents": [doc]})
+        assert ingest.status_code == 200
+        assert ingest.json()["chunks"] == services.pinecone_index.vector_count("kb-fakes") > 0
+        assert len(services.supabase.tables["rag_docs"]) == 1
+
+        resp = client.post("/v1/kb/kb-fakes/query", json={"question": "Que horas o parque abre?", "debug": True})
+        body = resp.json()
+        assert resp.status_code == 200
+        assert body["answer"].startswith("O parque abre às 9h")
+        assert "grounding" in body["debug"]["timings_ms"]["stages"]
+        assert services.backend.stats()["rerank"] == {"calls": 1, "failures": 0}
+    finally:
+        reset_clients()
+
+
+def test_injected_failures_surface_as_service_errors():
+    import pytest
+
+    from visitassist_rag.bench.fakes import FakeBackend, FakeServiceError, ServiceProfile
+
+    backend = FakeBackend({"supabase": ServiceProfile(0, 0, failure_rate=1.0)})
+    with pytest.raises(FakeServiceError):
+        backend.call("supabase")
+    assert backend.stats()["supabase"] == {"calls": 1, "failures": 1}
+
+
+def test_baseline_comparison_flags_throughput_drop_and_p95_rise():
+    from visitassist_rag.bench.load_test import compare, percentile
+
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 99) == 4.0
+
+    old = {"config": {"concurrency": 8}, "throughput_rps": 50.0, "endpoints": {"query": {"throughput_rps": 40.0, "p95_ms": 300.0}}}
+    new = {"config": {"concurrency": 8}, "throughput_rps": 48.0, "endpoints": {"query": {"throughput_rps": 30.0, "p95_ms": 420.0}}}
+    result = compare(new, old, 0.15)
+
+    assert result["regressions"] == ["query: throughput -25.0%", "query: p95 +40.0%"]
+    assert result["warnings"] == []
@@ -4,3 +4,56 @@ def test_chunking():
     paragraphs = split_paragraphs(text)
     chunks = chunk_by_tokens(paragraphs, target_tokens=50, overlap_tokens=10)
     assert len(chunks) > 0
+
+
+def test_cut_section_offsets_slice_section_text():
+    from visitassist_rag.rag.chunking import count_tokens, cut_section
+
+    para = "A manutenção preventiva é realizada a cada ciclo. " * 12
+    text = "\n\n".join([para.strip()] * 30)
+    cuts = cut_section(text, section_tokens=300, section_overlap=40, fine_tokens=80, fine_overlap=10, summary_tokens=50)
+
+    assert cuts.summary is not None
+    assert cuts.summary.start == 0
+    assert count_tokens(text[cuts.summary.start:cuts.summary.end]) <= 50
+    assert len(cuts.section) > 1
+    assert len(cuts.fine) > len(cuts.section)
+    for span in cuts.section + cuts.fine:
+        chunk = text[span.start:span.end]
+        assert chunk and chunk == chunk.strip()
+    # Consecutive fine chunks overlap and advance.
+    for a, b in zip(cuts.fine, cuts.fine[1:]):
+        assert a.start < b.start <= a.end
+
+
+def test_cut_section_short_text_is_single_section_chunk():
+    from visitassist_rag.rag.chunking import cut_section
+
+    text = "Texto curto.\n\nSegundo parágrafo."
+    cuts = cut_section(text)
+    assert [(s.start, s.end) for s in cuts.section] == [(0, len(text))]
+    assert text[cuts.fine[0].start:cuts.fine[0].end] == text
+
+
+def test_chunk_batch_rows_match_section_slices():
+    from visitassist_rag.rag.chunk_batch import ChunkBatch
+    from visitassist_rag.rag.chunking import cut_section
+
+    text = "\n\n".join(["Parágrafo com conteúdo útil sobre a usina. " * 6] * 20)
+    batch = ChunkBatch()
+    doc = batch.add_doc("doc-1", {"kb_id": "kb", "doc_title": "T"})
+    sec = batch.add_section(doc, "sec-1", "Document", text)
+    cuts = cut_section(text, section_tokens=200, fine_tokens=60)
+    batch.add_cuts(sec, cuts)
+
+    assert len(batch) == 1 + len(cuts.section) + len(cuts.fine)
+    rows = list(batch)
+    assert [r.chunk_type for r in rows[:2]] == ["summary", "section"]
+    for i, row in enumerate(rows):
+        assert row.doc_id == "doc-1" and row.section_id == "sec-1"
+        assert row.chunk_text == text[row.start_char:row.end_char]
+        assert row.chunk_id == batch.chunk_ids[i]
+    meta = batch.metadata(len(batch) - 1)
+    assert meta["kb_id"] == "kb" and meta["chunk_type"] == "fine"
+    assert meta["chunk_text"] == rows[-1].chunk_text
+    assert meta["token_count"] == rows[-1].token_count > 0
@@ -0,0 +1,26 @@
+import pytest
+
+
+def test_get_openai_reports_missing_key_at_first_use(monkeypatch):
+    from visitassist_rag import clients
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    clients.reset_clients()
+    with pytest.raises(RuntimeError, match="OPENAI_API_KEY"):
+        clients.get_openai()
+
+
+def test_set_client_is_shared_by_store_modules(monkeypatch):
+    from visitassist_rag import clients
+    from visitassist_rag.stores import pinecone_store
+
+    class FakeIndex:
+        def query(self, **kwargs):
+            return {"matches": [{"id": "a", "score": 0.5, "metadata": {"kb_id": "kb"}}]}
+
+    clients.set_client("pinecone_index", FakeIndex())
+    try:
+        out = pinecone_store.query_chunks([0.0, 1.0], 1, {}, namespace="kb")
+    finally:
+        clients.reset_clients()
+    assert out == [{"id": "a", "score": 0.5, "metadata": {"kb_id": "kb"}}]
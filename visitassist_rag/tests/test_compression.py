@@ -0,0 +1,73 @@
+def _cand(i, text):
+    return {"id": f"c{i}", "score": 0.8, "metadata": {"doc_title": "Parque", "chunk_type": "section", "chunk_text": text}}
+
+
+_SECTION = (
+    "O Parque das Aves fica na Rodovia das Cataratas, km 17.\n"
+    "O ingresso custa R$ 90 para adultos e R$ 45 para crianças de 6 a 11 anos.\n"
+    "O parque abriga mais de 1.400 aves de 130 espécies diferentes.\n"
+    "Há viveiros de imersão onde o visitante caminha entre os pássaros.\n"
+    "O horário de funcionamento é das 8h30 às 17h, todos os dias.\n"
+    "A lanchonete oferece salgados, sucos e sorvetes.\n"
+    "Há loja de souvenirs na saída, com pelúcias e camisetas.\n"
+) * 2
+
+
+def test_lexical_compression_keeps_matching_sentences_in_order():
+    from visitassist_rag.rag.compression import GAP_MARKER, compress_sources
+
+    cands = [_cand(1, _SECTION), _cand(2, "Curto demais para comprimir.")]
+    out, trace = compress_sources("Qual o horário de funcionamento do parque?", cands, method="lexical", min_source_tokens=20)
+
+    text = out[0]["context_text"]
+    assert "8h30 às 17h" in text
+    assert "lanchonete" not in text and "souvenirs" not in text
+    # Full chunk text is untouched for the guards and snippets.
+    assert out[0]["metadata"]["chunk_text"] == _SECTION
+    # Short sources pass through; positions (and [S#]) are unchanged.
+    assert out[1] is cands[1] and "context_text" not in out[1]
+    row = trace["sources"][0]
+    assert row["s"] == 1 and row["kept"] == sorted(row["kept"]) and row["compressed_tokens"] < row["tokens"]
+    assert trace["tokens_after"] < trace["tokens_before"]
+    assert GAP_MARKER in text or len(row["kept"]) == 1
+
+
+def test_source_without_matching_sentences_is_kept_whole_and_off_is_noop():
+    from visitassist_rag.rag.compression import compress_sources
+
+    # The price sentence shares no term with the question ("ticket" vs "entrada"/"valor").
+    ticket = (
+        "Compre online com antecedência para evitar filas na bilheteria. "
+        "O valor da entrada para adultos é R$ 120, com meia para estudantes. "
+        "Crianças de até 2 anos não pagam. "
+    ) * 3
+    cands = [_cand(1, _SECTION), _cand(2, ticket)]
+    out, trace = compress_sources("Quanto custa o ticket do parque?", cands, method="lexical", min_source_tokens=20)
+    assert out[1] is cands[1] and "R$ 120" in out[1]["metadata"]["chunk_text"]
+    assert trace["sources"][1]["kept"] is None and trace["sources"][1]["sentences"] == 9
+
+    assert "ingresso custa" in out[0]["context_text"]
+
+    assert compress_sources("horário", cands, method="off") == (cands, None)
+
+
+def test_embedding_compression_uses_cached_sentence_vectors(monkeypatch):
+    import numpy as np
+
+    from visitassist_rag.rag import compression, embeddings
+
+    calls = []
+
+    def fake_embed(texts):
+        calls.append(list(texts))
+        return np.array([[1.0, 0.0] if "horário" in t else [0.0, 1.0] for t in texts], dtype=np.float32)
+
+    monkeypatch.setattr(embeddings, "embed_texts", fake_embed)
+    monkeypatch.setattr(compression, "sentence_embeddings", compression._EmbeddingCache(100))
+    cands = [_cand(1, _SECTION)]
+
+    out, _ = compression.compress_sources("q", cands, method="embedding", query_vector=[1.0, 0.0], min_source_tokens=20)
+    assert out[0]["context_text"].startswith("O horário de funcionamento")
+    compression.compress_sources("q", cands, method="embedding", query_vector=[1.0, 0.0], min_source_tokens=20)
+    # Second call hits the cache; repeated sentences are embedded once.
+    assert len(calls) == 1 and len(calls[0]) == len(set(calls[0])) == 7
@@ -0,0 +1,68 @@
+def test_allocate_budget_by_rank_and_redistributes_leftover():
+    from visitassist_rag.rag.context_packer import allocate_budget
+
+    # All fit: nothing is cut.
+    assert allocate_budget([100, 200, 50], 1000) == [100, 200, 50]
+    # Short top source leaves its share to the others, higher ranks get more.
+    alloc = allocate_budget([100, 900, 900, 900], 1000)
+    assert alloc[0] == 100
+    assert alloc[1] > alloc[2] > alloc[3]
+    assert sum(alloc) <= 1000 and sum(alloc) > 990
+
+
+def test_trim_to_tokens_cuts_on_sentence_boundary():
+    from visitassist_rag.rag.chunking import count_tokens
+    from visitassist_rag.rag.context_packer import TRIM_MARKER, trim_to_tokens
+
+    text = "O parque abre às 9h. A bilheteria fecha às 16h. Crianças até 6 anos não pagam. Estacionamento pago no local."
+    out, n = trim_to_tokens(text, count_tokens("O parque abre às 9h. A bilheteria fecha às 16h.") + 3)
+    assert out == "O parque abre às 9h. A bilheteria fecha às 16h." + TRIM_MARKER
+    assert n <= count_tokens("O parque abre às 9h. A bilheteria fecha às 16h.") + 3
+
+    # A single long sentence is cut at a word boundary.
+    out, n = trim_to_tokens("palavra " * 200, 20)
+    assert out.endswith(TRIM_MARKER) and 0 < n <= 20 and not out[: -len(TRIM_MARKER)].endswith(" ")
+
+
+def test_pack_sources_fits_budget_and_drops_starved_tail():
+    from visitassist_rag.rag.chunking import count_tokens
+    from visitassist_rag.rag.context_packer import pack_sources
+
+    long = "Frase de teste sobre o passeio de barco. " * 80
+    texts = [long, long, "Curto."]
+    counts = [count_tokens(t) for t in texts]
+    packed, summary = pack_sources(texts, counts, 300, min_tokens=40)
+    assert summary["packed_tokens"] <= 300
+    assert packed[0].trimmed and packed[1].trimmed and packed[0].tokens > packed[1].tokens
+    assert packed[2].text == "Curto."
+
+    packed, summary = pack_sources(texts[:2] + [long], counts[:2] + [counts[0]], 150, min_tokens=60)
+    assert packed[0] is not None and packed[-1] is None
+    assert summary["sources"][-1]["dropped"]
+
+
+def test_grounded_answer_packs_sources_into_mode_budget(monkeypatch):
+    from types import SimpleNamespace
+
+    from visitassist_rag.rag import grounding
+
+    prompts = []
+
+    class FakeCompletions:
+        def create(self, *, model, messages, temperature):
+            prompts.append(messages[-1]["content"])
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Abre às 9h.\nFonte: [S1]"))])
+
+    monkeypatch.setattr(grounding, "get_openai", lambda: SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions())))
+    monkeypatch.setattr(grounding, "CONTEXT_TOKEN_BUDGET", 120)
+    long = "O parque abre às 9h e fecha às 17h todos os dias. " * 60
+    snippets = [
+        {"id": f"c{i}", "metadata": {"doc_title": "Parque", "section_path": "", "chunk_type": "fine", "chunk_text": long}}
+        for i in range(4)
+    ]
+    answer, kept, trace = grounding.grounded_answer("Que horas abre?", snippets, mode="tourist_chat", debug=True)
+    assert trace["context"]["budget_tokens"] == 120
+    assert trace["context"]["packed_tokens"] <= 120
+    # Dropped sources are gone from the returned snippets and from the prompt numbering.
+    assert len(kept) == sum(1 for s in trace["context"]["sources"] if not s["dropped"])
+    assert f"[S{len(kept) + 1}]" not in prompts[0]
@@ -0,0 +1,156 @@
+def _site():
+    body = "<p>" + "O parque abre de terça a domingo e os ingressos são vendidos na bilheteria. " * 10 + "</p>"
+    index_links = "".join(f"<a href='/atracoes/{i}'>Atração {i}</a>" for i in range(40))
+    return {
+        "https://example.com/": f"<title>Home</title><main><a href='/atracoes/'>Atrações</a>{body}</main>",
+        # Link-heavy index page: not ingested, but its links are followed.
+        "https://example.com/atracoes/": f"<title>Atrações</title><main>{index_links}<p>Lista</p></main>",
+        "https://example.com/atracoes/0": f"<title>A0</title><main>{body}<a href='https://other.org/x'>fora</a></main>",
+        # Same text as /atracoes/0 under another URL.
+        "https://example.com/atracoes/1": f"<title>A1</title><main>{body}<a href='https://other.org/x'>fora</a></main>",
+        "https://example.com/atracoes/2": "<title>A2</title><main><p>curta</p><a href='/atracoes/3#top'>3</a></main>",
+        "https://example.com/atracoes/3": f"<title>A3</title><main><p>Outro texto.</p>{body}</main>",
+    }
+
+
+def _fake_crawl_env(monkeypatch, pages, redirects=None):
+    from visitassist_rag.models.schemas import BulkIngestItemResult, BulkIngestResponse
+    from visitassist_rag.rag import crawler
+    from visitassist_rag.rag.url_ingest import FetchResult, UrlIngestError
+
+    fetched, batches = [], []
+
+    def fake_fetch(url, *, timeout_s=15.0, user_agent=None, **kwargs):
+        assert user_agent == crawler.CRAWL_USER_AGENT
+        fetched.append(url)
+        final = (redirects or {}).get(url, url)
+        if final not in pages:
+            raise UrlIngestError("URL fetch failed with HTTP 404")
+        return FetchResult(pages[final], final)
+
+    def fake_ingest(kb_id, docs, *, on_stage=None):
+        batches.append([d["source_uri"] for d in docs])
+        results = [BulkIngestItemResult(index=i, success=True, doc_id=f"d{i}", title=d["title"], chunks=1) for i, d in enumerate(docs)]
+        return BulkIngestResponse(results=results, chunks=len(docs), embedding_requests=1, upsert_batches=1)
+
+    monkeypatch.setattr(crawler, "fetch_url_result", fake_fetch)
+    monkeypatch.setattr(crawler, "ingest_text_documents", fake_ingest)
+    return fetched, batches
+
+
+def test_crawl_scopes_dedupes_and_skips_index_pages(monkeypatch):
+    from visitassist_rag.rag.crawler import crawl_site
+
+    fetched, batches = _fake_crawl_env(monkeypatch, _site())
+    progress = []
+    out = crawl_site(
+        "kb", "https://example.com/", max_pages=100, respect_robots=False, host_interval_s=0,
+        ingest_batch=2, min_chars=200, on_progress=lambda **kw: progress.append(kw),
+    )
+
+    assert not any("other.org" in u for u in fetched)
+    assert len(fetched) == len(set(fetched))
+    ingested = sorted(d["url"] for d in out["documents"])
+    # /atracoes/0 and /1 have the same text: only one of them is ingested.
+    assert len([u for u in ingested if u in ("https://example.com/atracoes/0", "https://example.com/atracoes/1")]) == 1
+    assert "https://example.com/" in ingested and "https://example.com/atracoes/3" in ingested
+    assert out["skipped"]["index_page"] == 1
+    assert out["skipped"]["duplicate"] == 1
+    assert out["skipped"]["too_small"] == 1
+    # Links of /atracoes/ that do not exist.
+    assert out["skipped"]["fetch_error"] == 36
+    assert all(len(b) <= 2 for b in batches) and sum(len(b) for b in batches) == 3
+    assert progress[-1]["ingested"] == 3 and progress[-1]["fetched"] == out["pages_fetched"]
+
+
+def test_crawl_respects_depth_and_page_limits(monkeypatch):
+    from visitassist_rag.rag.crawler import crawl_site
+
+    fetched, _ = _fake_crawl_env(monkeypatch, _site())
+    out = crawl_site("kb", "https://example.com/", max_depth=1, respect_robots=False, host_interval_s=0, min_chars=200)
+    assert sorted(fetched) == ["https://example.com/", "https://example.com/atracoes/"]
+    assert out["pages_ingested"] == 1
+
+    fetched.clear()
+    out = crawl_site("kb", "https://example.com/", max_pages=3, respect_robots=False, host_interval_s=0, min_chars=200)
+    assert len(fetched) == out["pages_fetched"] == 3
+    assert out["not_visited"] > 0
+
+
+def test_crawl_drops_pages_redirected_out_of_scope(monkeypatch):
+    from urllib.robotparser import RobotFileParser
+
+    from visitassist_rag.rag import crawler
+
+    body = "<p>" + "Passeio de barco no lago com saída do cais principal às 10h. " * 10 + "</p>"
+    pages = {
+        "https://example.com/": f"<title>Home</title><main>{body}<a href='/go'>go</a><a href='/priv'>p</a></main>",
+        "https://other.org/landing": f"<title>Fora</title><main>{body}<a href='https://example.com/leak'>x</a></main>",
+        "https://example.com/privado/x": f"<title>Privado</title><main><p>Privado.</p>{body}</main>",
+        "https://example.com/leak": f"<title>Leak</title><main>{body}</main>",
+    }
+    redirects = {"https://example.com/go": "https://other.org/landing", "https://example.com/priv": "https://example.com/privado/x"}
+    fetched, _ = _fake_crawl_env(monkeypatch, pages, redirects)
+    rp = RobotFileParser()
+    rp.parse(["User-agent: *", "Disallow: /privado/"])
+    monkeypatch.setattr(crawler, "_load_robots", lambda scheme, host, **kw: rp)
+
+    out = crawler.crawl_site("kb", "https://example.com/", host_interval_s=0, min_chars=200)
+
+    assert [d["url"] for d in out["documents"]] == ["https://example.com/"]
+    assert out["skipped"]["redirect_out_of_scope"] == 1
+    assert out["skipped"]["robots"] == 1
+    # Links found on the off-site page are not followed.
+    assert "https://example.com/leak" not in fetched
+
+
+def test_robots_txt_is_fetched_with_the_crawler_user_agent(monkeypatch):
+    from visitassist_rag.rag import crawler
+
+    calls = []
+
+    class FakeResponse:
+        status_code = 200
+        text = "User-agent: VisitAssistBot\nDisallow: /privado/\n"
+
+        def close(self):
+            pass
+
+    class FakeSession:
+        def get(self, url, *, headers=None, timeout=None):
+            calls.append((url, headers))
+            return FakeResponse()
+
+    monkeypatch.setattr(crawler, "get_http_session", lambda: FakeSession())
+    rp = crawler._load_robots("https", "example.com")
+
+    assert calls == [("https://example.com/robots.txt", {"User-Agent": crawler.CRAWL_USER_AGENT})]
+    assert not rp.can_fetch(crawler.CRAWL_USER_AGENT, "https://example.com/privado/x")
+    assert rp.can_fetch(crawler.CRAWL_USER_AGENT, "https://example.com/")
+
+
+def test_crawl_scope_hosts_and_path_prefix():
+    from visitassist_rag.rag.crawler import scope_for
+
+    scope = scope_for("https://www.example.com/roteiros/", path_prefix="/roteiros/")
+    assert scope.allows("https://example.com/roteiros/centro")
+    assert scope.allows("http://www.example.com/roteiros/")
+    assert not scope.allows("https://example.com/blog/")
+    assert not scope.allows("https://blog.example.com/roteiros/")
+    assert not scope.allows("https://example.com/roteiros/mapa.pdf")
+    assert scope_for("https://example.com/", include_subdomains=True).allows("https://blog.example.com/x")
+
+
+def test_host_limiter_spaces_requests_to_the_same_host():
+    import time
+
+    from visitassist_rag.rag.crawler import HostLimiter
+
+    limiter = HostLimiter(per_host=2, min_interval_s=0.05)
+    t0 = time.monotonic()
+    for _ in range(3):
+        with limiter.slot("example.com"):
+            pass
+    with limiter.slot("other.org"):
+        pass
+    assert time.monotonic() - t0 >= 0.1
@@ -0,0 +1,29 @@
+import base64
+from types import SimpleNamespace
+
+import numpy as np
+
+
+def _b64(values):
+    return base64.b64encode(np.asarray(values, dtype="<f4").tobytes()).decode("ascii")
+
+
+def test_decode_embeddings_orders_rows_and_keeps_float32():
+    from visitassist_rag.rag.embeddings import decode_embeddings
+
+    data = [
+        SimpleNamespace(index=1, embedding=_b64([0.5, -1.0, 2.0])),
+        SimpleNamespace(index=0, embedding=_b64([1.0, 0.25, 0.0])),
+    ]
+    out = decode_embeddings(data)
+    assert out.dtype == np.float32
+    assert out.shape == (2, 3)
+    assert out.flags["C_CONTIGUOUS"]
+    assert out[0].tolist() == [1.0, 0.25, 0.0]
+    assert out[1].tolist() == [0.5, -1.0, 2.0]
+
+
+def test_decode_embeddings_empty():
+    from visitassist_rag.rag.embeddings import decode_embeddings
+
+    assert decode_embeddings([]).shape == (0, 0)
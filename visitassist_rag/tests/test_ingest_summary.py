@@ -14,3 +14,105 @@ def test_make_summary_chunk_text_is_bounded_and_nonempty():
     assert isinstance(summary, str)
     assert summary.strip()
     assert count_tokens(summary) <= 120
+
+
+def test_plan_embedding_batches_packs_by_inputs_and_tokens():
+    from visitassist_rag.rag.embeddings import plan_embedding_batches
+
+    assert plan_embedding_batches([]) == []
+    assert plan_embedding_batches([10] * 5, max_inputs=2, max_tokens=1000) == [(0, 2), (2, 4), (4, 5)]
+    assert plan_embedding_batches([60, 60, 30, 100], max_inputs=10, max_tokens=120) == [(0, 2), (2, 3), (3, 4)]
+    # An input larger than the token limit still gets its own request.
+    assert plan_embedding_batches([500, 5], max_inputs=10, max_tokens=100) == [(0, 1), (1, 2)]
+
+
+def test_bulk_ingest_shares_embedding_and_store_calls(monkeypatch):
+    import numpy as np
+
+    from visitassist_rag.rag import ingest
+
+    calls = {"embed": [], "docs": [], "chunks": 0, "vectors": 0}
+
+    def fake_embed(texts, token_counts=None, *, concurrency=None):
+        calls["embed"].append(len(texts))
+        return np.zeros((len(texts), 4), dtype=np.float32), 1
+
+    monkeypatch.setattr(ingest, "embed_texts_packed", fake_embed)
+    monkeypatch.setattr(ingest, "upsert_docs", lambda rows: calls["docs"].extend(rows))
+    monkeypatch.setattr(ingest, "insert_sections", lambda batch: None)
+    monkeypatch.setattr(ingest, "insert_chunks", lambda batch: calls.__setitem__("chunks", len(batch)))
+    monkeypatch.setattr(
+        ingest,
+        "upsert_chunks",
+        lambda vectors, namespace: calls.__setitem__("vectors", len(vectors)) or {"batches": [{}]},
+    )
+
+    docs = [
+        dict(title=f"Doc {i}", text="# Title\n\nSome text about the museum. " * 20, source_type="text", source_uri="", language="pt")
+        for i in range(3)
+    ]
+    # text=None fails inside chunking; the other documents still go through.
+    docs.append(dict(title="Bad", text=None, source_type="text", source_uri="", language="pt"))
+
+    out = ingest.ingest_text_documents("kb", docs)
+
+    assert len(calls["embed"]) == 1
+    assert [r.success for r in out.results] == [True, True, True, False]
+    assert "chunking failed" in out.results[3].message
+    assert len(calls["docs"]) == 3
+    assert calls["chunks"] == calls["vectors"] == out.chunks == sum(r.chunks for r in out.results)
+    assert {"chunk", "embed", "supabase", "pinecone", "total"} <= set(out.timings_ms)
+
+
+def test_bulk_ingest_stage_failure_fails_documents(monkeypatch):
+    import pytest
+
+    from visitassist_rag.rag import ingest
+
+    def failing_embed(texts, token_counts=None, *, concurrency=None):
+        raise RuntimeError("rate limited")
+
+    monkeypatch.setattr(ingest, "embed_texts_packed", failing_embed)
+    docs = [dict(title="A", text="Hello world.", source_type="text", source_uri="", language="en")]
+
+    out = ingest.ingest_text_documents("kb", docs)
+    assert not out.results[0].success
+    assert out.results[0].message == "embed failed: rate limited"
+
+    with pytest.raises(RuntimeError):
+        ingest.ingest_text_document("kb", **docs[0])
+
+    # A failure after the Supabase writes removes the rows and any upserted vectors.
+    import numpy as np
+
+    deleted = {"vectors": [], "docs": []}
+    monkeypatch.setattr(ingest, "embed_texts_packed", lambda texts, token_counts=None, *, concurrency=None: (np.zeros((len(texts), 4), dtype=np.float32), 1))
+    monkeypatch.setattr(ingest, "upsert_docs", lambda rows: None)
+    monkeypatch.setattr(ingest, "insert_sections", lambda batch: None)
+    monkeypatch.setattr(ingest, "insert_chunks", lambda batch: None)
+
+    def failing_upsert(vectors, namespace):
+        raise RuntimeError("1 of 2 upsert batches failed")
+
+    monkeypatch.setattr(ingest, "upsert_chunks", failing_upsert)
+    monkeypatch.setattr(ingest, "delete_vectors", lambda ids, namespace=None: deleted["vectors"].extend(ids))
+    monkeypatch.setattr(ingest, "delete_docs", lambda doc_ids: deleted["docs"].extend(doc_ids))
+
+    out = ingest.ingest_text_documents("kb", docs)
+    assert out.results[0].message == "pinecone failed: 1 of 2 upsert batches failed"
+    assert out.results[0].doc_id is None
+    assert len(deleted["docs"]) == 1 and len(deleted["vectors"]) == out.chunks > 0
+
+    with pytest.raises(RuntimeError):
+        ingest.ingest_text_document("kb", **docs[0])
+    assert len(deleted["docs"]) == 2
+
+    # If the cleanup fails as well, the doc_id is returned so it can be removed later.
+    def failing_delete(doc_ids):
+        raise RuntimeError("supabase down")
+
+    monkeypatch.setattr(ingest, "delete_docs", failing_delete)
+    out = ingest.ingest_text_documents("kb", docs)
+    assert not out.results[0].success
+    assert out.results[0].doc_id
+    assert "cleanup failed" in out.results[0].message
@@ -0,0 +1,74 @@
+def test_claim_next_is_fair_across_kbs(tmp_path):
+    from visitassist_rag.stores import job_store
+
+    db = str(tmp_path / "jobs.sqlite3")
+    a1 = job_store.enqueue("ingest_text", "kb_a", {}, db_path=db)
+    job_store.enqueue("ingest_text", "kb_a", {}, db_path=db)
+    b1 = job_store.enqueue("ingest_text", "kb_b", {}, db_path=db)
+
+    assert job_store.claim_next(db_path=db)["job_id"] == a1
+    # kb_a already has a running job, so kb_b goes next even though it queued later.
+    assert job_store.claim_next(db_path=db)["job_id"] == b1
+
+
+def test_expired_lease_is_reclaimed_then_failed(tmp_path):
+    from visitassist_rag.stores import job_store
+
+    db = str(tmp_path / "jobs.sqlite3")
+    job_id = job_store.enqueue("ingest_text", "kb", {"x": 1}, db_path=db)
+    assert job_store.claim_next(db_path=db, lease_s=-1)["attempts"] == 1
+    job = job_store.claim_next(db_path=db, lease_s=-1, max_attempts=2)
+    assert job["job_id"] == job_id and job["attempts"] == 2
+    assert job_store.claim_next(db_path=db, max_attempts=2) is None
+    job = job_store.get_job(job_id, db_path=db)
+    assert job["status"] == "failed" and "lost the job" in job["error"]
+
+
+def test_stale_worker_cannot_finish_a_reclaimed_job(tmp_path):
+    from visitassist_rag.stores import job_store
+
+    db = str(tmp_path / "jobs.sqlite3")
+    job_id = job_store.enqueue("ingest_text", "kb", {}, db_path=db)
+    stale = job_store.claim_next(db_path=db, lease_s=-1)
+    current = job_store.claim_next(db_path=db)
+    assert current["job_id"] == job_id and current["attempts"] == 2
+
+    assert not job_store.update_progress(job_id, {"done": 1}, attempt=stale["attempts"], db_path=db)
+    assert not job_store.finish(job_id, attempt=stale["attempts"], error="boom", db_path=db)
+    assert job_store.get_job(job_id, db_path=db)["status"] == "running"
+
+    assert job_store.finish(job_id, attempt=current["attempts"], result={"ok": True}, db_path=db)
+    assert job_store.get_job(job_id, db_path=db)["status"] == "succeeded"
+    assert not job_store.finish(job_id, attempt=current["attempts"], error="again", db_path=db)
+
+
+def test_run_job_records_stages_result_and_errors(tmp_path, monkeypatch):
+    from visitassist_rag.rag import jobs
+    from visitassist_rag.stores import job_store
+
+    db = str(tmp_path / "jobs.sqlite3")
+
+    def ok_handler(kb_id, payload, progress):
+        progress.update(total=2)
+        progress.stage("embed", 12.5)
+        return {"kb_id": kb_id, "n": payload["n"]}
+
+    def bad_handler(kb_id, payload, progress):
+        raise RuntimeError("embedding quota exceeded")
+
+    monkeypatch.setitem(jobs.HANDLERS, "ok", ok_handler)
+    monkeypatch.setitem(jobs.HANDLERS, "bad", bad_handler)
+
+    ok_id = job_store.enqueue("ok", "kb", {"n": 3}, db_path=db)
+    jobs.run_job(job_store.claim_next(db_path=db), db_path=db)
+    job = job_store.get_job(ok_id, db_path=db)
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"kb_id": "kb", "n": 3}
+    assert job["progress"]["stages_ms"] == {"embed": 12.5}
+    assert job["progress"]["total"] == 2 and "total_ms" in job["progress"]
+
+    bad_id = job_store.enqueue("bad", "kb", {}, db_path=db)
+    jobs.run_job(job_store.claim_next(db_path=db), db_path=db)
+    job = job_store.get_job(bad_id, db_path=db)
+    assert job["status"] == "failed"
+    assert job["error"] == "RuntimeError: embedding quota exceeded"
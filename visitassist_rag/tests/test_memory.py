@@ -0,0 +1,70 @@
+import tracemalloc
+
+
+def test_snapshot_diff_points_at_the_allocating_line():
+    from visitassist_rag import memory
+
+    memory.start_tracing(frames=5)
+    try:
+        base = memory.take_snapshot()["snapshot_id"]
+        hoard = [bytearray(1024) for _ in range(2000)]  # noqa: F841 - kept alive for the diff
+        diff = memory.diff_snapshots(base, top=5)
+    finally:
+        memory.stop_tracing()
+
+    top = diff["sites"][0]
+    assert top["site"].startswith(__file__) and top["size_diff_bytes"] >= 2000 * 1024
+    assert not tracemalloc.is_tracing()
+
+
+def test_snapshot_requires_tracing():
+    import pytest
+
+    from visitassist_rag import memory
+
+    with pytest.raises(memory.MemorySnapshotError):
+        memory.take_snapshot()
+
+
+def test_ingest_reports_peak_memory_delta_on_request(monkeypatch):
+    from visitassist_rag.rag import ingest
+
+    def fake_ingest(kb_id, docs, *, raise_errors, on_stage=None):
+        scratch = bytearray(4 * 1024 * 1024)
+        del scratch
+        return {"results": [{"index": 0, "success": True, "doc_id": "d1", "title": "t", "chunks": 1, "message": None}]}
+
+    monkeypatch.setattr(ingest, "_ingest", fake_ingest)
+
+    plain = ingest.ingest_text_document("kb", "t", "text", "txt", "", "pt")
+    assert plain.memory is None
+
+    measured = ingest.ingest_text_document("kb", "t", "text", "txt", "", "pt", measure_memory=True)
+    assert measured.memory["peak_traced_delta_bytes"] >= 4 * 1024 * 1024
+    assert not tracemalloc.is_tracing()
+
+
+def test_concurrent_peak_measurement_reports_nothing():
+    from visitassist_rag import memory
+
+    with memory.measure_peak() as outer:
+        with memory.measure_peak() as inner:
+            scratch = bytearray(1024 * 1024)
+            del scratch
+        assert inner.result() is None
+    assert outer.result()["peak_traced_delta_bytes"] >= 1024 * 1024
+    assert not tracemalloc.is_tracing()
+
+
+def test_memory_report_lists_cache_sizes(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from visitassist_rag.app import app
+    from visitassist_rag.settings import settings
+
+    monkeypatch.setattr(settings, "ENV", "dev")
+
+    report = TestClient(app).get("/v1/admin/memory").json()
+    assert report["process"]["rss_bytes"] is None or report["process"]["rss_bytes"] > 0
+    for name in ("url_preview_cache", "sentence_embeddings", "grounding_prompts", "trace_buffer"):
+        assert "items" in report["caches"][name]
@@ -0,0 +1,61 @@
+def test_histogram_renders_cumulative_buckets():
+    from visitassist_rag.metrics import Histogram
+
+    h = Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    h.observe(0.05, stage="a")
+    h.observe(0.5, stage="a")
+    h.observe(5.0, stage="a")
+    lines = h.render()
+
+    assert lines[:2] == ["# HELP t_seconds test", "# TYPE t_seconds histogram"]
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 't_seconds_count{stage="a"} 3' in lines
+    assert 't_seconds_sum{stage="a"} 5.55' in lines
+
+
+def test_rag_query_observes_each_stage(monkeypatch):
+    from visitassist_rag.metrics import QUERY_STAGE_SECONDS
+    from visitassist_rag.rag import engine
+
+    cand = {"id": "c1", "score": 0.9, "metadata": {"chunk_text": "Aberto das 9h às 17h.", "doc_title": "Horários"}}
+    monkeypatch.setattr(engine, "embed_query", lambda q: [0.1, 0.2])
+    monkeypatch.setattr(engine, "pinecone_query", lambda q, k, f, namespace=None, vector=None: [dict(cand)])
+    monkeypatch.setattr(engine, "llm_rerank", lambda q, cands, top_n=8, usage_out=None: cands)
+    monkeypatch.setattr(engine, "grounded_answer", lambda q, cands, **kw: ("Das 9h às 17h.\n\nFonte: [S1]", cands, {}))
+
+    resp = engine.rag_query("Qual o horário?", kb_id="kb-metrics", mode="tourist_chat", answer_style="strict", debug=True)
+
+    stages = resp.debug["timings_ms"]["stages"]
+    for name in ("embed", "retrieval_summary", "retrieval_section", "retrieval_fine", "rerank", "pick", "grounding", "guards"):
+        assert name in stages
+    text = "\n".join(QUERY_STAGE_SECONDS.render())
+    for name in ("embed", "grounding", "snippets", "total"):
+        assert f'stage="{name}",kb_id="kb-metrics",mode="tourist_chat",answer_style="strict"' in text
+
+    # Client-supplied modes must not create new series.
+    engine.rag_query("Qual o horário?", kb_id="kb-metrics", mode="made-up-mode-123", answer_style="strict")
+    text = "\n".join(QUERY_STAGE_SECONDS.render())
+    assert "made-up-mode-123" not in text
+    assert 'stage="total",kb_id="kb-metrics",mode="default",answer_style="strict"' in text
+
+
+def test_metrics_endpoint_serves_prometheus_text(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from visitassist_rag.app import app
+    from visitassist_rag.metrics import INGEST_STAGE_SECONDS
+    from visitassist_rag.settings import settings
+
+    monkeypatch.setattr(settings, "ENV", "dev")
+
+    INGEST_STAGE_SECONDS.observe(0.2, stage="embed")
+    resp = TestClient(app).get("/v1/admin/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE visitassist_ingest_stage_seconds histogram" in resp.text
+    assert 'visitassist_ingest_stage_seconds_count{stage="embed"}' in resp.text
+    assert "visitassist_queries_in_flight 0" in resp.text
+    assert "visitassist_threadpool_size " in resp.text
@@ -0,0 +1,12 @@
+def test_every_microbench_case_runs_on_the_faq_fixtures():
+    from visitassist_rag.bench.microbench import build_cases, load_faq, measure
+
+    cases = build_cases(load_faq(), html_pages=1)
+
+    assert {"chunk_by_tokens", "pick_grounding_candidates", "question_constraint_guard", "extract_main_text"} <= set(cases)
+    run, ops = cases["ensure_citation_footer"]
+    result = measure(run, ops, min_time=0.0, repeat=1)
+    assert result["ops_per_pass"] == 80
+    assert result["ops_per_sec"] > 0
+    for run, _ops in cases.values():
+        run()
@@ -0,0 +1,146 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+
+def _make_pdf(path, n_pages):
+    doc = fitz.open()
+    for i in range(n_pages):
+        page = doc.new_page()
+        if i != 2:
+            page.insert_text((72, 72), f"Page number {i + 1}")
+    doc.save(str(path))
+    doc.close()
+
+
+def test_page_ranges_cover_the_requested_pages():
+    from visitassist_rag.rag.pdf_extract import PageRange, page_ranges
+
+    assert page_ranges(1, 7, 3) == [PageRange(1, 3), PageRange(4, 6), PageRange(7, 7)]
+    assert page_ranges(5, 5, 10)[0].key == "5-5"
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_iter_extracted_ranges_yields_in_order(tmp_path, workers):
+    from visitassist_rag.rag.pdf_extract import iter_extracted_ranges, page_count, page_ranges
+
+    pdf = tmp_path / "doc.pdf"
+    _make_pdf(pdf, 5)
+    assert page_count(str(pdf)) == 5
+
+    out = list(iter_extracted_ranges(str(pdf), page_ranges(1, 5, 2), workers=workers, max_pending=2))
+    assert [e.range.key for e in out] == ["1-2", "3-4", "5-5"]
+    assert "Page number 1" in out[0].text and "Page number 2" in out[0].text
+    assert "Page number 4" in out[1].text and "Page number 3" not in out[1].text
+    assert all(e.error is None for e in out)
+
+
+def test_iter_extracted_ranges_reports_read_errors(tmp_path):
+    from visitassist_rag.rag.pdf_extract import PageRange, iter_extracted_ranges
+
+    pdf = tmp_path / "doc.pdf"
+    _make_pdf(pdf, 2)
+    (out,) = iter_extracted_ranges(str(pdf), [PageRange(2, 9)], workers=0)
+    assert out.error and out.error.startswith("read_error")
+
+
+def test_ingest_pdf_upload_spools_and_ingests_in_groups(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from visitassist_rag.api import routes_ingest
+    from visitassist_rag.app import app
+    from visitassist_rag.models.schemas import BulkIngestItemResult, BulkIngestResponse
+    from visitassist_rag.rag import pdf_ingest
+
+    pdf = tmp_path / "guide.pdf"
+    _make_pdf(pdf, 7)
+    submitted = {}
+
+    def fake_submit(kind, kb_id, payload):
+        submitted.update(kind=kind, kb_id=kb_id, payload=payload)
+        return "job-1"
+
+    monkeypatch.setattr(routes_ingest, "PDF_UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(routes_ingest, "submit", fake_submit)
+    client = TestClient(app)
+    resp = client.post(
+        "/v1/kb/kb1/ingest/pdf",
+        files={"file": ("guide.pdf", pdf.read_bytes(), "application/pdf")},
+        data={"pages_per_doc": "2"},
+    )
+    assert resp.status_code == 202 and resp.json()["job_id"] == "job-1"
+    payload = submitted["payload"]
+    assert submitted["kind"] == "ingest_pdf" and payload["title"] == "guide.pdf"
+    assert payload["measure_memory"] is False
+    assert open(payload["path"], "rb").read() == pdf.read_bytes()
+
+    assert client.post("/v1/kb/kb1/ingest/pdf", files={"file": ("x.pdf", b"hello", "application/pdf")}).status_code == 400
+    client.post("/v1/kb/kb1/ingest/pdf?memory=true", files={"file": ("guide.pdf", pdf.read_bytes(), "application/pdf")})
+    assert submitted["payload"]["measure_memory"] is True
+
+    calls = []
+
+    def fake_ingest(kb_id, docs, *, on_stage=None, measure_memory=False):
+        assert measure_memory is False
+        calls.append([d["title"] for d in docs])
+        return BulkIngestResponse(
+            results=[BulkIngestItemResult(index=i, success=True, doc_id=f"d{i}", chunks=1) for i in range(len(docs))],
+            chunks=len(docs),
+            embedding_requests=1,
+        )
+
+    monkeypatch.setattr(pdf_ingest, "ingest_text_documents", fake_ingest)
+    monkeypatch.setattr(pdf_ingest, "PDF_RANGES_PER_INGEST", 2)
+    payload["incremental"] = False
+    path = payload.pop("path")
+    progress = []
+    out = pdf_ingest.ingest_pdf_file("kb1", path, workers=0, on_progress=lambda **kw: progress.append(kw), **payload)
+
+    assert calls == [["guide.pdf (pages 1-2)", "guide.pdf (pages 3-4)"], ["guide.pdf (pages 5-6)", "guide.pdf (pages 7-7)"]]
+    assert out["pages"] == 7 and out["chunks"] == 4 and out["embedding_requests"] == 2
+    assert progress[-1] == {"pages_total": 7, "pages_done": 7, "done": 4, "failed": 0, "unchanged": 0}
+
+
+def test_reingest_only_replaces_changed_ranges(tmp_path, monkeypatch):
+    from visitassist_rag.models.schemas import BulkIngestItemResult, BulkIngestResponse
+    from visitassist_rag.rag import pdf_ingest
+
+    manifest = {}
+    deleted = []
+    ingested = []
+
+    def fake_ingest(kb_id, docs, *, on_stage=None, measure_memory=False):
+        start = len(ingested)
+        ingested.extend(d["title"] for d in docs)
+        return BulkIngestResponse(
+            results=[BulkIngestItemResult(index=i, success=True, doc_id=f"d{start + i}") for i in range(len(docs))]
+        )
+
+    monkeypatch.setattr(pdf_ingest, "ingest_text_documents", fake_ingest)
+    monkeypatch.setattr(pdf_ingest, "get_pdf_ranges", lambda kb_id, uri: {k: dict(v) for k, v in manifest.items()})
+    monkeypatch.setattr(pdf_ingest, "upsert_pdf_ranges", lambda rows: manifest.update({r["range_key"]: r for r in rows}))
+    monkeypatch.setattr(pdf_ingest, "delete_pdf_ranges", lambda kb_id, uri, keys: [manifest.pop(k) for k in keys])
+    monkeypatch.setattr(pdf_ingest, "delete_documents", lambda kb_id, ids: deleted.extend(ids) or len(ids))
+
+    def write_pdf(path, pages):
+        doc = fitz.open()
+        for text in pages:
+            doc.new_page().insert_text((72, 72), text)
+        doc.save(str(path))
+        doc.close()
+
+    v1 = tmp_path / "v1.pdf"
+    write_pdf(v1, [f"Page {i}" for i in range(1, 8)])
+    kw = dict(title="manual.pdf", source_uri="manual.pdf", pages_per_doc=2, workers=0)
+    pdf_ingest.ingest_pdf_file("kb", str(v1), **kw)
+    assert len(ingested) == 4 and sorted(manifest) == ["1-2", "3-4", "5-6", "7-7"]
+
+    # Typo fix on page 3, and the last page removed.
+    v2 = tmp_path / "v2.pdf"
+    write_pdf(v2, ["Page 1", "Page 2", "Page three", "Page 4", "Page 5", "Page 6"])
+    out = pdf_ingest.ingest_pdf_file("kb", str(v2), **kw)
+
+    assert ingested[4:] == ["manual.pdf (pages 3-4)"]
+    assert out["unchanged"] == 2 and out["removed_ranges"] == ["7-7"]
+    assert sorted(deleted) == ["d1", "d3"]
+    assert sorted(manifest) == ["1-2", "3-4", "5-6"] and manifest["3-4"]["doc_id"] == "d4"
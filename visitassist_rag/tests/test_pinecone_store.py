@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+
+def _vectors(n, dims=3072, text_len=100):
+    return [(f"id-{i}", np.zeros(dims, dtype=np.float32), {"chunk_text": "x" * (text_len * (i % 5 + 1))}) for i in range(n)]
+
+
+def test_plan_batches_respects_byte_and_count_limits():
+    from visitassist_rag.stores.pinecone_store import _estimate_vector_bytes, plan_batches
+
+    vectors = _vectors(200)
+    plan = plan_batches(vectors, max_bytes=500_000, max_vectors=50)
+    assert plan[0][0] == 0 and plan[-1][1] == len(vectors)
+    for (s, e, size), nxt in zip(plan, plan[1:] + [None]):
+        assert 0 < e - s <= 50
+        assert size == sum(_estimate_vector_bytes(*v) for v in vectors[s:e])
+        assert size <= 500_000
+        if nxt:
+            assert nxt[0] == e
+
+
+def test_upsert_chunks_retries_only_failed_batches(monkeypatch):
+    from visitassist_rag.stores import pinecone_store
+
+    sent = []
+    failures = {"id-0": 1}
+
+    def fake_upsert(batch, namespace):
+        first = batch[0][0]
+        if failures.get(first):
+            failures[first] -= 1
+            raise TimeoutError("read timed out")
+        assert isinstance(batch[0][1], list)
+        sent.append(first)
+
+    monkeypatch.setattr(pinecone_store, "_upsert_batch", fake_upsert)
+    monkeypatch.setattr(pinecone_store, "UPSERT_BACKOFF_S", 0.0)
+
+    stats = pinecone_store.upsert_chunks(_vectors(60, dims=8), namespace="kb", max_vectors=20, concurrency=3)
+    assert sorted(sent) == ["id-0", "id-20", "id-40"]
+    assert stats["failed_batches"] == 0
+    assert [b["attempts"] for b in stats["batches"]] == [2, 1, 1]
+    assert sum(b["vectors"] for b in stats["batches"]) == 60
+
+
+class _ApiError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_upsert_chunks_raises_with_stats_when_batch_keeps_failing(monkeypatch):
+    from visitassist_rag.stores import pinecone_store
+
+    def fake_upsert(batch, namespace):
+        if batch[0][0] == "id-10":
+            raise _ApiError(503)
+
+    monkeypatch.setattr(pinecone_store, "_upsert_batch", fake_upsert)
+    monkeypatch.setattr(pinecone_store, "UPSERT_BACKOFF_S", 0.0)
+
+    with pytest.raises(pinecone_store.PineconeUpsertError) as ei:
+        pinecone_store.upsert_chunks(_vectors(30, dims=8), max_vectors=10, retries=1)
+    assert ei.value.stats["failed_batches"] == 1
+    assert ei.value.stats["batches"][1]["attempts"] == 2
+
+
+def test_upsert_chunks_fails_fast_on_non_transient_errors(monkeypatch):
+    from visitassist_rag.stores import pinecone_store
+
+    calls = []
+
+    def fake_upsert(batch, namespace):
+        calls.append(batch[0][0])
+        raise _ApiError(400)
+
+    monkeypatch.setattr(pinecone_store, "_upsert_batch", fake_upsert)
+    monkeypatch.setattr(pinecone_store, "UPSERT_BACKOFF_S", 0.0)
+
+    with pytest.raises(pinecone_store.PineconeUpsertError) as ei:
+        pinecone_store.upsert_chunks(_vectors(5, dims=8), retries=3)
+    assert calls == ["id-0"] and ei.value.stats["batches"][0]["attempts"] == 1
+
+    assert pinecone_store._is_transient(_ApiError(429))
+    assert not pinecone_store._is_transient(_ApiError(413))
+    assert not pinecone_store._is_transient(ValueError("bad vector"))
+    assert pinecone_store._is_transient(type("ReadTimeoutError", (Exception,), {})())
@@ -0,0 +1,73 @@
+import time
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def test_requests_mode_samples_only_profiled_calls():
+    from visitassist_rag import profiling
+
+    profiling.start_profile(mode="requests", duration_s=10, interval_ms=2, rate=1.0, kinds=("query",))
+    try:
+        with profiling.profiled("ingest"):
+            _spin(0.05)
+        with profiling.profiled("query"):
+            _spin(0.2)
+    finally:
+        status = profiling.stop_profile()
+
+    assert status["profiled_calls"] == 1 and status["samples"] > 0
+    lines = profiling.collapsed_stacks().splitlines()
+    assert lines and all(line.startswith("query;") for line in lines)
+    assert any("_spin (visitassist_rag/tests/test_profiling.py" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_attach_samples_pool_threads_of_a_profiled_call():
+    import threading
+
+    from visitassist_rag import profiling
+
+    profiling.start_profile(mode="requests", duration_s=10, interval_ms=2, rate=1.0)
+    try:
+        with profiling.profiled("ingest"):
+            token = profiling.current()
+
+            def worker():
+                with profiling.attach(token):
+                    _spin(0.15)
+
+            t = threading.Thread(target=worker)
+            t.start()
+            t.join()
+    finally:
+        profiling.stop_profile()
+
+    assert token is not None
+    assert any(";worker (" in line for line in profiling.collapsed_stacks().splitlines())
+
+
+def test_profile_endpoints_reject_a_second_session(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from visitassist_rag.app import app
+    from visitassist_rag.settings import settings
+
+    monkeypatch.setattr(settings, "ENV", "dev")
+
+    client = TestClient(app)
+    assert client.post("/v1/admin/profile/start", json={"duration_s": 5, "interval_ms": 5}).status_code == 200
+    try:
+        assert client.post("/v1/admin/profile/start", json={}).status_code == 409
+        assert client.get("/v1/admin/profile").json()["running"]["mode"] == "window"
+    finally:
+        assert client.post("/v1/admin/profile/stop").status_code == 200
+    resp = client.get("/v1/admin/profile/collapsed")
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/plain")
+    assert client.post("/v1/admin/profile/stop").status_code == 409
@@ -0,0 +1,34 @@
+def test_grounding_prefix_is_static_and_per_profile():
+    from visitassist_rag.rag.mode_profiles import get_mode_profile
+    from visitassist_rag.rag.prompts import grounding_prompt, grounding_user_message
+
+    chat = get_mode_profile("tourist_chat")
+    a = grounding_prompt(chat, "explicative", "pt")
+    b = grounding_prompt(chat, "explicative", "pt")
+    assert a is b  # compiled once
+    m1 = a.messages(grounding_user_message("Que horas abre?", ["[S1] Parque\nAbre às 9h."]))
+    m2 = a.messages(grounding_user_message("Quanto custa?", ["[S1] Parque\nAbre às 9h."]))
+    assert m1[0] == m2[0] and m1[0]["role"] == "system"
+    # Question last: same sources share the whole prefix up to the question.
+    assert m1[1]["content"].endswith("Que horas abre?")
+    assert m1[1]["content"].split("Question:")[0] == m2[1]["content"].split("Question:")[0]
+
+    events = grounding_prompt(get_mode_profile("events"), "explicative", "pt")
+    assert events.prefix_sha256 != a.prefix_sha256
+    assert "do NOT infer or synthesize a comparison" in events.system
+    strict = grounding_prompt(chat, "strict", "pt")
+    assert "STRICT" in strict.system and strict.debug()["version"] == a.debug()["version"]
+
+
+def test_usage_summary_reports_cached_tokens():
+    from types import SimpleNamespace
+
+    from visitassist_rag.rag.prompts import usage_summary
+
+    resp = SimpleNamespace(usage=SimpleNamespace(
+        prompt_tokens=2100, completion_tokens=80, prompt_tokens_details=SimpleNamespace(cached_tokens=1920),
+    ))
+    assert usage_summary(resp) == {"prompt_tokens": 2100, "completion_tokens": 80, "cached_tokens": 1920}
+    resp = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=10, completion_tokens=2, prompt_tokens_details=None))
+    assert usage_summary(resp)["cached_tokens"] == 0
+    assert usage_summary(SimpleNamespace()) is None
@@ -146,3 +146,41 @@ def test_question_constraint_guard_blocks_question_only_entities_and_time():
     assert "século XIX" not in out
     assert "Isto fez com que o café se deslocasse" in out
     assert out.endswith("Fonte: [S1]")
+
+
+def test_query_batch_embeds_once_and_isolates_item_failures(monkeypatch):
+    import json
+
+    import numpy as np
+    from fastapi.testclient import TestClient
+
+    from visitassist_rag.app import app
+    from visitassist_rag.models.schemas import QueryResponse
+    from visitassist_rag.rag import batch_query
+
+    embed_calls = []
+
+    def fake_embed_texts(texts):
+        embed_calls.append(list(texts))
+        return np.arange(len(texts), dtype=np.float32).reshape(-1, 1)
+
+    def fake_rag_query(*, question, query_vector, answer_style, **kwargs):
+        if question == "boom":
+            raise RuntimeError("grounding failed")
+        return QueryResponse(answer=f"{question}:{int(query_vector[0])}:{answer_style}", snippets=[])
+
+    monkeypatch.setattr(batch_query, "embed_texts", fake_embed_texts)
+    monkeypatch.setattr(batch_query, "rag_query", fake_rag_query)
+
+    client = TestClient(app)
+    payload = {"items": [{"question": "a"}, {"question": "boom"}, {"question": "c"}], "answer_style": "strict"}
+    resp = client.post("/v1/kb/kb1/query/batch", json=payload)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = sorted((json.loads(ln) for ln in resp.text.splitlines() if ln.strip()), key=lambda r: r["index"])
+    assert embed_calls == [["a", "boom", "c"]]
+    assert [r["ok"] for r in rows] == [True, False, True]
+    assert rows[0]["result"]["answer"] == "a:0:strict"
+    assert rows[2]["result"]["answer"] == "c:2:strict"
+    assert "grounding failed" in rows[1]["error"]
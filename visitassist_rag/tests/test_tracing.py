@@ -0,0 +1,116 @@
+import json
+
+
+def _fake_pipeline(monkeypatch):
+    from visitassist_rag.rag import engine
+
+    cand = {"id": "c1", "score": 0.9, "metadata": {"chunk_text": "Aberto das 9h às 17h.", "doc_title": "Horários"}}
+    monkeypatch.setattr(engine, "embed_query", lambda q: [0.1, 0.2])
+    monkeypatch.setattr(engine, "pinecone_query", lambda q, k, f, namespace=None, vector=None: [dict(cand)])
+    monkeypatch.setattr(engine, "llm_rerank", lambda q, cands, top_n=8, usage_out=None: cands)
+    monkeypatch.setattr(engine, "grounded_answer", lambda q, cands, **kw: ("Das 9h às 17h.\n\nFonte: [S1]", cands, {}))
+    return engine
+
+
+def _names(span):
+    return [span["name"], *[n for c in span.get("children", []) for n in _names(c)]]
+
+
+def test_slow_query_is_logged_with_span_tree(monkeypatch, tmp_path):
+    from visitassist_rag import tracing
+
+    engine = _fake_pipeline(monkeypatch)
+    log_path = tmp_path / "slow.jsonl"
+    monkeypatch.setattr(tracing, "SLOW_QUERY_MS", 0.0)
+    monkeypatch.setattr(tracing, "SLOW_QUERY_LOG", str(log_path))
+    monkeypatch.setattr(tracing, "_slow_logger", None)
+
+    with tracing.request_context("req-slow"):
+        engine.rag_query("Qual o horário?", kb_id="kb")
+
+    trace = tracing.get_trace("req-slow")
+    assert trace is not None and trace["slow"] is True
+    assert trace["attrs"]["grounding_ids"] == ["c1"] and trace["attrs"]["kb_id"] == "kb"
+    names = _names(trace["spans"])
+    assert names[0] == "rag_query"
+    for name in ("embed", "retrieval_fine", "rerank", "grounding", "guards", "snippets"):
+        assert name in names
+
+    logged = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert logged[-1]["request_id"] == "req-slow" and logged[-1]["spans"]["name"] == "rag_query"
+
+
+def test_fast_unsampled_trace_is_dropped(monkeypatch):
+    from visitassist_rag import tracing
+
+    engine = _fake_pipeline(monkeypatch)
+    monkeypatch.setattr(tracing, "SLOW_QUERY_MS", 60_000.0)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+
+    with tracing.request_context("req-fast"):
+        engine.rag_query("Qual o horário?", kb_id="kb")
+    assert tracing.get_trace("req-fast") is None
+
+    with tracing.request_context("req-debug"):
+        resp = engine.rag_query("Qual o horário?", kb_id="kb", debug=True)
+    assert resp.debug["request_id"] == "req-debug"
+    assert tracing.get_trace("req-debug") is not None
+
+
+def test_spans_are_noops_outside_a_trace():
+    from visitassist_rag import tracing
+
+    with tracing.span("outside") as s:
+        s.set(ignored=True)
+    assert not tracing.active()
+
+
+def test_request_id_header_and_admin_trace_endpoint(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from visitassist_rag import tracing
+    from visitassist_rag.app import app
+    from visitassist_rag.settings import settings
+
+    _fake_pipeline(monkeypatch)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "SLOW_QUERY_MS", 60_000.0)
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "s3cret")
+    client = TestClient(app)
+
+    resp = client.post("/v1/kb/kb/query", json={"question": "Qual o horário?"}, headers={"X-Request-ID": "abc-123"})
+    assert resp.status_code == 200 and resp.headers["x-request-id"] == "abc-123"
+
+    assert client.get("/v1/admin/traces/abc-123").status_code == 401
+    auth = {"Authorization": "Bearer s3cret"}
+    trace = client.get("/v1/admin/traces/abc-123", headers=auth).json()
+    assert trace["spans"]["name"] == "rag_query"
+    assert client.get("/v1/admin/traces/missing", headers=auth).status_code == 404
+    assert client.get("/v1/admin/traces", headers=auth).json()["traces"][0]["request_id"] == "abc-123"
+
+
+def test_admin_endpoints_are_closed_without_token_unless_dev_is_explicit(monkeypatch):
+    import importlib
+
+    from fastapi.testclient import TestClient
+
+    from visitassist_rag import settings as settings_module
+    from visitassist_rag.api import routes_admin
+    from visitassist_rag.app import app
+
+    monkeypatch.delenv("VISITASSIST_ENV", raising=False)
+    monkeypatch.delenv("VISITASSIST_ADMIN_TOKEN", raising=False)
+    # Restored after the test; the reload below rebinds them.
+    monkeypatch.setattr(settings_module, "Settings", settings_module.Settings)
+    monkeypatch.setattr(settings_module, "settings", settings_module.settings)
+    fresh = importlib.reload(settings_module).settings
+    monkeypatch.setattr(routes_admin, "settings", fresh)
+    client = TestClient(app)
+
+    assert fresh.ENV == "prod" and not fresh.ADMIN_TOKEN
+    for path in ("/v1/admin/traces", "/v1/admin/memory", "/v1/admin/url-refresh"):
+        assert client.get(path).status_code == 403
+    assert client.post("/v1/admin/profile/start", json={}).status_code == 403
+
+    monkeypatch.setattr(fresh, "ENV", "dev")
+    assert client.get("/v1/admin/traces").status_code == 200
@@ -68,3 +68,178 @@ def test_ingest_url_paste_rejects_small_text():
     req = IngestUrlPasteRequest(url="https://example.com/x", text="too small")
     with pytest.raises(HTTPException):
         ingest_url_paste("kb", req)
+
+
+def test_confirm_reuses_cached_preview(monkeypatch):
+    from visitassist_rag.rag import url_ingest
+
+    html = "<html><head><title>T</title></head><body><main><p>" + "palavra " * 100 + "</p></main></body></html>"
+    calls = []
+
+    def fake_fetch_url_result(url, *, timeout_s=15.0, user_agent=None, etag=None, last_modified=None):
+        calls.append(etag)
+        if etag == '"v1"':
+            return url_ingest.FetchResult("", url, etag, None, not_modified=True)
+        return url_ingest.FetchResult(html, url, etag='"v1"')
+
+    monkeypatch.setattr(url_ingest, "fetch_url_result", fake_fetch_url_result)
+    url_ingest.clear_preview_cache()
+
+    preview, token = url_ingest.build_url_preview_cached("https://Example.com/page?utm_source=x")
+    again, source = url_ingest.resolve_confirmed_preview(
+        "https://example.com/page", preview_token=token, content_hash=preview.content_hash
+    )
+    assert source == "cache" and again.text == preview.text
+    assert len(calls) == 1
+
+    # Tokens are single-use; a stale token falls back to a full fetch that keeps the validators.
+    refetched, source = url_ingest.resolve_confirmed_preview("https://example.com/page", preview_token=token)
+    assert source == "fetched" and refetched.etag == '"v1"' and len(calls) == 2
+
+    _, token = url_ingest.build_url_preview_cached("https://example.com/page")
+    _, source = url_ingest.resolve_confirmed_preview("https://example.com/page", preview_token=token, revalidate=True)
+    assert source == "revalidated" and calls[-1] == '"v1"'
+
+
+def test_confirm_refetches_when_content_hash_differs(monkeypatch):
+    from visitassist_rag.rag import url_ingest
+
+    html = "<html><body><main><p>" + "palavra " * 100 + "</p></main></body></html>"
+    monkeypatch.setattr(
+        url_ingest, "fetch_url_result",
+        lambda url, **kw: url_ingest.FetchResult(html, url, etag='"v2"', last_modified="Mon, 05 Oct 2026 10:00:00 GMT"),
+    )
+    url_ingest.clear_preview_cache()
+
+    _, token = url_ingest.build_url_preview_cached("https://example.com/a")
+    preview, source = url_ingest.resolve_confirmed_preview("https://example.com/a", preview_token=token, content_hash="other")
+    assert source == "fetched"
+    assert preview.etag == '"v2"' and preview.last_modified == "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+class _FakeResponse:
+    def __init__(self, body: bytes, headers: dict, status_code: int = 200, url: str = "https://example.com/p"):
+        from requests.structures import CaseInsensitiveDict
+
+        self.body = body
+        self.headers = CaseInsensitiveDict(headers)
+        self.status_code = status_code
+        self.url = url
+        self.chunks_read = 0
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            self.chunks_read += 1
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def _with_response(monkeypatch, resp):
+    from visitassist_rag import clients
+
+    class FakeSession:
+        def get(self, url, **kwargs):
+            assert kwargs["stream"] is True
+            return resp
+
+    monkeypatch.setattr(clients, "_clients", {"http": FakeSession()})
+
+
+def test_fetch_url_result_caps_bytes_and_reports_stats(monkeypatch):
+    from visitassist_rag.rag import url_ingest
+
+    body = ("<html><body>" + "é" * 200_000 + "</body></html>").encode("utf-8")
+    resp = _FakeResponse(body, {"content-type": "text/html; charset=utf-8"})
+    _with_response(monkeypatch, resp)
+
+    res = url_ingest.fetch_url_result("https://example.com/p", max_bytes=100_000)
+    assert res.truncated and res.bytes_read == 100_000
+    assert res.html.startswith("<html><body>é")
+    assert resp.chunks_read <= 2  # stopped reading at the cap
+
+
+def test_fetch_url_result_rejects_oversized_and_binary(monkeypatch):
+    from visitassist_rag.rag import url_ingest
+
+    _with_response(monkeypatch, _FakeResponse(b"x" * 10, {"content-type": "text/html", "content-length": "999999"}))
+    with pytest.raises(url_ingest.UrlIngestError, match="too large"):
+        url_ingest.fetch_url_result("https://example.com/p", max_bytes=1000)
+
+    _with_response(monkeypatch, _FakeResponse(b"%PDF\x00\x01\x02", {}))
+    with pytest.raises(url_ingest.UrlIngestError, match="binary"):
+        url_ingest.fetch_url_result("https://example.com/p")
+
+
+def test_fetch_url_result_uses_meta_charset(monkeypatch):
+    from visitassist_rag.rag import url_ingest
+
+    body = '<html><head><meta charset="iso-8859-1"></head><body>São Paulo</body></html>'.encode("latin-1")
+    _with_response(monkeypatch, _FakeResponse(body, {"content-type": "text/html"}))
+    assert "São Paulo" in url_ingest.fetch_url_result("https://example.com/p").html
+
+
+_PARITY_PAGES = [
+    "<html><head><title>My Page</title></head><body><header>H</header><nav><a href='/x'>Menu</a></nav>"
+    "<main><h1>Heading</h1><p>Hello <b>world</b>.</p><a href='https://example.com'>link</a></main>"
+    "<footer>F</footer></body></html>",
+    # No <main>: body text; nested noise containers; entities and comments.
+    "<html><head><title> Spaced \n title </title><script>var x = '<p>no</p>';</script></head><body>"
+    "<div id='cookie-banner'><div class='inner'><a href='#'>Accept</a></div></div>"
+    "<div class='content'><p>Caf&eacute; &amp; p&atilde;o<!-- hidden --> depois</p><br/><p>Linha 2</p></div>"
+    "<div class='sidebar-right'><p>Lateral</p></div></body></html>",
+    # No <body>/<html>: whole document; unclosed tags and stray end tags.
+    "<title>Frag</title><p>Um<p>Dois</span><ul><li>Três<li>Quatro</ul></div>Cinco",
+    # Noise class on <body> removes everything in it.
+    "<html><head><title>T</title></head><body class='menu-open'><main>x</main></body><p>after</p></html>",
+    # Title with markup (no .string) and an <svg><title>.
+    "<html><head><title>A<b>B</b></title></head><body><svg><title>Icon</title></svg><main>Texto</main></body></html>",
+]
+
+
+def _random_pages(n: int):
+    import random
+
+    rnd = random.Random(7)
+    tags = ["div", "p", "span", "a", "main", "body", "nav", "section", "li", "br", "img", "script", "title", "header", "td", "svg"]
+    attrs = ["", ' class="menu-top"', ' id="content"', ' class="x sidebar"', ' id="cookie-bar"', ' href="/x"']
+    words = ["Olá", "mundo", "&amp;", "caf&eacute;", "  ", "\n", "Itaipu", "<!-- c -->"]
+    for _ in range(n):
+        parts = []
+        for _ in range(rnd.randint(5, 60)):
+            r = rnd.random()
+            if r < 0.35:
+                parts.append(f"<{rnd.choice(tags)}{rnd.choice(attrs)}>")
+            elif r < 0.6:
+                parts.append(f"</{rnd.choice(tags)}>")
+            elif r < 0.65:
+                parts.append(f"<{rnd.choice(tags)}/>")
+            else:
+                parts.append(rnd.choice(words))
+        yield "".join(parts)
+
+
+def test_stream_extractor_matches_bs4_extractor():
+    from visitassist_rag.rag.html_extract import extract_main_text_stream
+    from visitassist_rag.rag.url_ingest import extract_main_text_bs4
+
+    for html in [*_PARITY_PAGES, *_random_pages(500)]:
+        assert extract_main_text_stream(html) == extract_main_text_bs4(html), html
+
+
+def test_extract_links_resolves_and_dedupes():
+    from visitassist_rag.rag.html_extract import extract_links
+
+    html = """
+    <html><head><base href="https://example.com/pt/"></head><body>
+      <nav><a href="roteiros">Roteiros</a><a href="/contato#form">Contato</a></nav>
+      <a href="roteiros">again</a><a href="mailto:x@example.com">mail</a>
+      <a href="https://other.org/a?b=1">other</a><a>no href</a>
+    </body></html>
+    """
+    assert extract_links(html, "https://example.com/pt/index.html") == [
+        "https://example.com/pt/roteiros",
+        "https://example.com/contato",
+        "https://other.org/a?b=1",
+    ]
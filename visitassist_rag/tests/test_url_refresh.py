@@ -0,0 +1,200 @@
+def _row(**kw):
+    row = {
+        "kb_id": "kb", "source_uri": "https://example.com/a", "doc_id": "old", "title": "A", "language": "pt",
+        "doc_date": None, "doc_year": 2024, "etag": '"v1"', "last_modified": None, "content_hash": "h1", "failures": 0,
+    }
+    row.update(kw)
+    return row
+
+
+def _page(text):
+    return f"<html><head><title>A</title></head><body><main><p>{text}</p></main></body></html>"
+
+
+def test_refresh_sends_validators_and_skips_unchanged(monkeypatch):
+    from visitassist_rag.rag import url_refresh
+    from visitassist_rag.rag.url_ingest import FetchResult, preview_from_html
+
+    body = "Horário de funcionamento: das 9h às 17h. " * 20
+    calls = []
+
+    def fake_fetch(url, *, timeout_s=15.0, etag=None, last_modified=None, **kw):
+        calls.append(etag)
+        if etag == '"v1"':
+            return FetchResult("", url, etag, last_modified, not_modified=True)
+        return FetchResult(_page(body), url, etag='"v2"')
+
+    def fail_ingest(*a, **kw):
+        raise AssertionError("unchanged content must not be re-ingested")
+
+    monkeypatch.setattr(url_refresh, "fetch_url_result", fake_fetch)
+    monkeypatch.setattr(url_refresh, "ingest_text_documents", fail_ingest)
+
+    outcome, row = url_refresh.refresh_url_source(_row())
+    assert outcome == "not_modified" and calls == ['"v1"']
+    assert row["doc_id"] == "old" and row["next_check_at"] > row["checked_at"]
+
+    same_hash = preview_from_html("https://example.com/a", _page(body), "https://example.com/a").content_hash
+    outcome, row = url_refresh.refresh_url_source(_row(etag=None, content_hash=same_hash))
+    assert outcome == "unchanged" and row["etag"] == '"v2"' and row["doc_id"] == "old"
+
+
+def test_refresh_reingests_changed_page_then_deletes_old_doc(monkeypatch):
+    from visitassist_rag.models.schemas import BulkIngestItemResult, BulkIngestResponse
+    from visitassist_rag.rag import url_refresh
+    from visitassist_rag.rag.url_ingest import FetchResult
+
+    events = []
+
+    def fake_ingest(kb_id, docs, *, on_stage=None):
+        events.append(("ingest", docs[0]["title"], docs[0]["doc_year"]))
+        return BulkIngestResponse(results=[BulkIngestItemResult(index=0, success=True, doc_id="new")])
+
+    monkeypatch.setattr(url_refresh, "fetch_url_result", lambda url, **kw: FetchResult(_page("Novo horário: 8h às 18h. " * 30), url, etag='"v2"'))
+    monkeypatch.setattr(url_refresh, "ingest_text_documents", fake_ingest)
+    monkeypatch.setattr(url_refresh, "delete_documents", lambda kb_id, ids: events.append(("delete", ids)) or 3)
+
+    outcome, row = url_refresh.refresh_url_source(_row())
+    assert outcome == "changed"
+    assert events == [("ingest", "A", 2024), ("delete", ["old"])]
+    assert row["doc_id"] == "new" and row["etag"] == '"v2"' and row["content_hash"] != "h1"
+
+
+def test_refresh_keeps_new_doc_when_deleting_the_old_one_fails(monkeypatch):
+    from visitassist_rag.models.schemas import BulkIngestItemResult, BulkIngestResponse
+    from visitassist_rag.rag import url_refresh
+    from visitassist_rag.rag.url_ingest import FetchResult
+
+    ingests = []
+
+    def fake_ingest(kb_id, docs, *, on_stage=None):
+        ingests.append(docs[0]["source_uri"])
+        return BulkIngestResponse(results=[BulkIngestItemResult(index=0, success=True, doc_id="new")])
+
+    def failing_delete(kb_id, ids):
+        raise RuntimeError("supabase timeout")
+
+    body = _page("Novo horário: 8h às 18h. " * 30)
+    monkeypatch.setattr(url_refresh, "fetch_url_result", lambda url, **kw: FetchResult(body, url, etag='"v2"'))
+    monkeypatch.setattr(url_refresh, "ingest_text_documents", fake_ingest)
+    monkeypatch.setattr(url_refresh, "delete_documents", failing_delete)
+
+    outcome, row = url_refresh.refresh_url_source(_row())
+    assert outcome == "changed"
+    assert row["doc_id"] == "new" and row["failures"] == 0 and row["last_error"] is None
+
+    # The row now has the new hash: the next run does not ingest the page again.
+    outcome, _ = url_refresh.refresh_url_source({**row, "etag": None})
+    assert outcome == "unchanged" and len(ingests) == 1
+
+
+def test_refresh_errors_back_off(monkeypatch):
+    from visitassist_rag.rag import url_refresh
+    from visitassist_rag.rag.url_ingest import UrlIngestError
+
+    def fake_fetch(url, **kw):
+        raise UrlIngestError("URL fetch failed with HTTP 503")
+
+    monkeypatch.setattr(url_refresh, "fetch_url_result", fake_fetch)
+    _, first = url_refresh.refresh_url_source(_row())
+    outcome, second = url_refresh.refresh_url_source(first)
+    assert outcome == "error" and second["failures"] == 2 and "HTTP 503" in second["last_error"]
+    assert second["next_check_at"] > first["next_check_at"]
+
+
+def test_run_defers_while_queries_are_running(monkeypatch):
+    from visitassist_rag.rag import url_refresh
+    from visitassist_rag.rag.query_load import track_query
+
+    monkeypatch.setattr(url_refresh, "get_due_url_sources", lambda now, limit: [_row(), _row(source_uri="https://example.com/b")])
+    monkeypatch.setattr(url_refresh, "upsert_url_sources", lambda rows: None)
+    monkeypatch.setattr(url_refresh, "refresh_url_source", lambda row: ("not_modified", row))
+
+    with track_query():
+        out = url_refresh.run_url_refresh(idle_s=0, defer_max_s=0.05)
+    assert out["checked"] == 0 and out["deferred"] == 2
+
+    out = url_refresh.run_url_refresh(idle_s=0, fetch_interval_s=0)
+    assert out["checked"] == 2 and out["not_modified"] == 2 and out["deferred"] == 0
+
+
+def test_wait_until_idle_sees_queries_in_other_processes(monkeypatch, tmp_path):
+    import time
+
+    from visitassist_rag.rag import query_load
+    from visitassist_rag.stores import job_store
+
+    db = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(query_load, "_shared_db", db)
+    monkeypatch.setattr(query_load, "_last_finished", 0.0)
+    job_store.record_query_activity("other-host:1", active=1, last_query_at=time.time(), db_path=db)
+    assert query_load.wait_until_idle(idle_s=0, max_wait_s=0) is False
+
+    job_store.record_query_activity("other-host:1", active=0, last_query_at=time.time() - 5, db_path=db)
+    assert query_load.wait_until_idle(idle_s=1, max_wait_s=0) is True
+
+    # This process's own row is published but not counted against itself.
+    with query_load.track_query():
+        query_load._publish()
+        assert job_store.query_activity(db_path=db)[0] == 1
+    assert query_load.wait_until_idle(idle_s=0, max_wait_s=0) is True
+
+
+def test_enqueue_unique_allows_one_pending_job(tmp_path):
+    from visitassist_rag.stores import job_store
+
+    db = str(tmp_path / "jobs.sqlite3")
+    first = job_store.enqueue_unique("url_refresh", "*", {}, db_path=db)
+    assert first is not None
+    assert job_store.enqueue_unique("url_refresh", "*", {}, db_path=db) is None
+    job = job_store.claim_next(db_path=db)
+    job_store.finish(job["job_id"], attempt=job["attempts"], result={"checked": 1}, db_path=db)
+    assert job_store.latest_job("url_refresh", db_path=db)["result"] == {"checked": 1}
+    assert job_store.enqueue_unique("url_refresh", "*", {}, db_path=db) is not None
+
+
+def test_ingesting_a_registered_url_again_keeps_one_document(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from visitassist_rag.app import app
+    from visitassist_rag.bench.fakes import ServiceProfile, install_fakes
+    from visitassist_rag.clients import reset_clients
+    from visitassist_rag.rag import crawler, url_ingest
+    from visitassist_rag.rag.url_ingest import FetchResult
+
+    pages = {"https://example.com/a": _page("Horário de funcionamento: das 9h às 17h. " * 20)}
+
+    def fake_fetch(url, *, timeout_s=15.0, etag=None, last_modified=None, **kw):
+        return FetchResult(pages[url], url, etag='"v1"')
+
+    monkeypatch.setattr(url_ingest, "fetch_url_result", fake_fetch)
+    monkeypatch.setattr(crawler, "fetch_url_result", fake_fetch)
+    instant = ServiceProfile(0, 0)
+    services = install_fakes({k: instant for k in ("embeddings", "rerank", "grounding", "pinecone", "supabase")}, dim=64)
+    try:
+        client = TestClient(app)
+        confirm = {"url": "https://example.com/a", "language": "pt"}
+        first = client.post("/v1/kb/kb/ingest/url/confirm", json=confirm).json()
+        vectors = services.pinecone_index.vector_count("kb")
+
+        again = client.post("/v1/kb/kb/ingest/url/confirm", json=confirm).json()
+        assert again["doc_id"] == first["doc_id"] and "unchanged" in again["message"]
+        crawled = crawler.crawl_site("kb", "https://example.com/a", max_depth=0, respect_robots=False, host_interval_s=0)
+        assert crawled["skipped"] == {"unchanged": 1} and crawled["documents"] == []
+        assert len(services.supabase.tables["rag_docs"]) == 1
+        assert services.pinecone_index.vector_count("kb") == vectors
+
+        pages["https://example.com/a"] = _page("Horário de funcionamento: das 8h às 18h. " * 20)
+        changed = client.post("/v1/kb/kb/ingest/url/confirm", json=confirm).json()
+        docs = services.supabase.tables["rag_docs"]
+        assert [d["doc_id"] for d in docs] == [changed["doc_id"]] != [first["doc_id"]]
+        sources = services.supabase.tables["rag_url_sources"]
+        assert len(sources) == 1 and sources[0]["doc_id"] == changed["doc_id"]
+        assert services.pinecone_index.vector_count("kb") == vectors
+
+        pages["https://example.com/a"] = _page("Horário de funcionamento: das 10h às 16h. " * 20)
+        crawled = crawler.crawl_site("kb", "https://example.com/a", max_depth=0, respect_robots=False, host_interval_s=0)
+        assert [d["doc_id"] for d in services.supabase.tables["rag_docs"]] == [crawled["documents"][0]["doc_id"]]
+        assert services.supabase.tables["rag_url_sources"][0]["doc_id"] == crawled["documents"][0]["doc_id"]
+    finally:
+        reset_clients()
@@ -0,0 +1,319 @@
+"""Request tracing: span trees for queries, a recent-trace buffer and a slow-query log.
+
+`rag_query` opens a trace; stages, `grounded_answer`, `llm_rerank`, embedding
+calls and Pinecone queries add nested spans to it through a context variable.
+Code outside a trace (ingest, scripts) pays one ContextVar lookup per span.
+
+Spans are always recorded while tracing is on; the policy decides which finished
+traces are kept:
+- every trace slower than VISITASSIST_SLOW_QUERY_MS, or that raised, is kept and
+  also appended to the rotating slow-query log (JSON lines);
+- `debug` queries are kept;
+- other traces are kept with probability VISITASSIST_TRACE_SAMPLE_RATE.
+Kept traces stay in a per-process ring buffer and can be fetched by request id
+(the X-Request-ID header of the response).
+"""
+
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from visitassist_rag.memory import register_cache
+
+TRACING = os.getenv("VISITASSIST_TRACING", "on").strip().lower() not in ("0", "off", "false", "no")
+TRACE_SAMPLE_RATE = float(os.getenv("VISITASSIST_TRACE_SAMPLE_RATE", "0.05"))
+TRACE_BUFFER_SIZE = int(os.getenv("VISITASSIST_TRACE_BUFFER_SIZE", "500"))
+SLOW_QUERY_MS = float(os.getenv("VISITASSIST_SLOW_QUERY_MS", "5000"))
+# Empty disables the file; slow traces still go to the buffer.
+SLOW_QUERY_LOG = os.getenv("VISITASSIST_SLOW_QUERY_LOG", "visitassist_slow_queries.jsonl")
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("VISITASSIST_SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("VISITASSIST_SLOW_QUERY_LOG_BACKUPS", "5"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+_request_id: ContextVar[Optional[str]] = ContextVar("visitassist_request_id", default=None)
+_trace: ContextVar[Optional["Trace"]] = ContextVar("visitassist_trace", default=None)
+_span: ContextVar[Optional["Span"]] = ContextVar("visitassist_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "attrs", "children", "error")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs: dict[str, Any] = {}
+        self.children: list["Span"] = []
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: float) -> dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        out: dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000.0, 2),
+            "duration_ms": round((end - self.start) * 1000.0, 2),
+        }
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.error:
+            out["error"] = self.error
+        if self.children:
+            out["children"] = [c.to_dict(origin) for c in self.children]
+        return out
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    def __init__(self, name: str, request_id: str):
+        self.request_id = request_id
+        self.started_at = time.time()
+        self.root = Span(name)
+        self.attrs: dict[str, Any] = {}
+        self.force_keep = False
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        return round((end - self.root.start) * 1000.0, 2)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "name": self.root.name,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started_at)),
+            "duration_ms": self.duration_ms,
+            "error": self.root.error,
+            "attrs": self.attrs,
+            "spans": self.root.to_dict(self.root.start),
+        }
+
+
+_buffer: "OrderedDict[str, dict[str, Any]]" = OrderedDict()
+_buffer_lock = threading.Lock()
+_slow_logger: Optional[logging.Logger] = None
+_slow_logger_lock = threading.Lock()
+
+
+register_cache("trace_buffer", lambda: {"items": len(_buffer), "max_items": TRACE_BUFFER_SIZE})
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """Bind a request id for the code below (worker threads start without one)."""
+    rid = request_id or new_request_id()
+    token = _request_id.set(rid)
+    try:
+        yield rid
+    finally:
+        _request_id.reset(token)
+
+
+def active() -> bool:
+    return _trace.get() is not None
+
+
+def current_trace_id() -> Optional[str]:
+    """Request id the current trace is stored under (None outside a trace)."""
+    t = _trace.get()
+    return t.request_id if t is not None else None
+
+
+def annotate(**attrs: Any) -> None:
+    """Attach attributes (candidate ids, prompt hashes...) to the current trace."""
+    t = _trace.get()
+    if t is not None:
+        t.attrs.update(attrs)
+
+
+def keep() -> None:
+    """Keep the current trace regardless of sampling (e.g. debug queries)."""
+    t = _trace.get()
+    if t is not None:
+        t.force_keep = True
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    parent = _span.get()
+    if parent is None:
+        yield NULL_SPAN
+        return
+    s = Span(name)
+    if attrs:
+        s.attrs.update(attrs)
+    parent.children.append(s)
+    token = _span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end = time.perf_counter()
+        _span.reset(token)
+
+
+@contextmanager
+def start_trace(name: str, **attrs: Any) -> Iterator[Any]:
+    """Open a trace, or just a span when a trace is already active."""
+    if not TRACING or _trace.get() is not None:
+        with span(name, **attrs) as s:
+            yield s
+        return
+    t = Trace(name, _request_id.get() or new_request_id())
+    t.root.attrs.update(attrs)
+    t_token = _trace.set(t)
+    s_token = _span.set(t.root)
+    try:
+        yield t.root
+    except BaseException as e:
+        t.root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        t.root.end = time.perf_counter()
+        _span.reset(s_token)
+        _trace.reset(t_token)
+        _finish(t)
+
+
+def traced(name: str, *, root: bool = False):
+    """Decorator: run the function in a span (or a new trace with `root=True`)."""
+
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if root:
+                with start_trace(name):
+                    return fn(*args, **kwargs)
+            if _span.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
+
+def _finish(t: Trace) -> None:
+    slow = t.duration_ms >= SLOW_QUERY_MS
+    if not (slow or t.root.error or t.force_keep or random.random() < TRACE_SAMPLE_RATE):
+        return
+    record = t.to_dict()
+    record["slow"] = slow
+    with _buffer_lock:
+        _buffer[t.request_id] = record
+        _buffer.move_to_end(t.request_id)
+        while len(_buffer) > TRACE_BUFFER_SIZE:
+            _buffer.popitem(last=False)
+    if slow:
+        _log_slow(record)
+
+
+def _log_slow(record: dict[str, Any]) -> None:
+    global _slow_logger
+    if not SLOW_QUERY_LOG:
+        return
+    with _slow_logger_lock:
+        if _slow_logger is None:
+            lg = logging.getLogger("visitassist_rag.slow_queries")
+            lg.propagate = False
+            lg.setLevel(logging.INFO)
+            for old in list(lg.handlers):
+                lg.removeHandler(old)
+                old.close()
+            try:
+                handler = logging.handlers.RotatingFileHandler(
+                    SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_MAX_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, encoding="utf-8"
+                )
+            except OSError as e:
+                logging.getLogger(__name__).warning("slow-query log disabled: %s", e)
+                handler = logging.NullHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            lg.addHandler(handler)
+            _slow_logger = lg
+    _slow_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def get_trace(request_id: str) -> Optional[dict[str, Any]]:
+    with _buffer_lock:
+        return _buffer.get(request_id)
+
+
+def recent_traces(limit: int = 50, *, slow_only: bool = False) -> list[dict[str, Any]]:
+    """Newest first; summaries only (no span tree)."""
+    with _buffer_lock:
+        records = list(_buffer.values())
+    out = []
+    for r in reversed(records):
+        if slow_only and not r.get("slow"):
+            continue
+        out.append({k: r[k] for k in ("request_id", "name", "started_at", "duration_ms", "error", "slow")})
+        if len(out) >= limit:
+            break
+    return out
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: bind X-Request-ID (or a new id) to the request and echo it back."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = None
+        for key, value in scope.get("headers") or []:
+            if key == REQUEST_ID_HEADER:
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_RE.match(candidate):
+                    rid = candidate
+                break
+        rid = rid or new_request_id()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (REQUEST_ID_HEADER, rid.encode("latin-1"))]
+            await send(message)
+
+        token = _request_id.set(rid)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request_id.reset(token)